@@ -0,0 +1,298 @@
+"""
+Parallel atlas builder.
+
+The charts of an atlas are built and rendered in a pool of worker processes. Every chart is rendered in its own
+temporary folder, the number of concurrent XeLaTeX runs is bounded, failed renders are retried, and the chart PDFs
+are finally merged into a single atlas PDF.
+
+Rendered charts are cached under a hash of everything that goes into them, so rebuilding an atlas only renders the
+charts that changed.
+"""
+import os
+import pickle
+import shutil
+import hashlib
+import logging
+import tempfile
+import functools
+import subprocess
+import multiprocessing
+
+from skymap.tikz.tikz import BASEDIR, TEX_OUTPUT_FOLDER
+
+
+SKYMAP_FOLDER = os.path.join(BASEDIR, "skymap")
+PAGE_CACHE_FOLDER = os.path.join(BASEDIR, "cache", "pages")
+
+logger = logging.getLogger(__name__)
+
+# Semaphore limiting the number of concurrent XeLaTeX runs, set in every worker process
+_xelatex_slots = None
+
+
+class ChartJob(object):
+    """
+    A chart to build.
+
+    Args:
+        name (str): the name of the chart, used for the tex and PDF files
+        build (callable): module level function that creates the chart page, called with the name, the output folder
+            and the extra arguments, and returning the Tikz object to render
+        args (tuple): the extra arguments for the build function, which must be picklable
+        catalogs (bool): whether the chart reads the star and object catalogs, so it depends on the catalog version
+    """
+
+    def __init__(self, name, build, args=(), catalogs=True):
+        self.name = name
+        self.build = build
+        self.args = args
+        self.catalogs = catalogs
+
+    def cache_key(self, catalog_version=None):
+        """
+        Returns the hash of all inputs of the chart: the name, the build function and its arguments, the catalog
+        version if the chart reads the catalogs, and the version of the code and document templates.
+
+        Args:
+            catalog_version (str): the version of the star and object catalogs used
+
+        Returns:
+            str: the hexadecimal hash
+        """
+        digest = hashlib.sha1()
+        digest.update(code_version().encode())
+        if self.catalogs:
+            digest.update(repr(catalog_version).encode())
+        digest.update(f"{self.build.__module__}.{self.build.__qualname__}".encode())
+        digest.update(self.name.encode())
+        digest.update(pickle.dumps(self.args, protocol=4))
+        return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Returns a hash of the source code of the skymap package, including the document templates."""
+    digest = hashlib.sha1()
+    for folder, dirnames, filenames in os.walk(SKYMAP_FOLDER):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if not filename.endswith((".py", ".j2")):
+                continue
+            path = os.path.join(folder, filename)
+            digest.update(os.path.relpath(path, SKYMAP_FOLDER).encode())
+            with open(path, "rb") as fp:
+                digest.update(fp.read())
+    return digest.hexdigest()
+
+
+def cache_file(source, destination):
+    """Copies the given file to the cache, writing to a temporary file first so no partial files are ever read."""
+    tempname = f"{destination}.{os.getpid()}.tmp"
+    shutil.copyfile(source, tempname)
+    os.replace(tempname, destination)
+
+
+def database_catalog_version():
+    """
+    Returns the version of the catalogs in the SkyMap database, as a checksum of its tables.
+
+    Returns:
+        str: the checksum, or None if the database is not available
+    """
+    try:
+        # Imported here, so the builder can be used without the MySQL connector
+        from skymap.database import SkyMapDatabase
+
+        db = SkyMapDatabase()
+    except Exception as exc:
+        logger.warning(
+            f"SkyMap database not available, caching charts without catalog version: {exc}"
+        )
+        return None
+
+    try:
+        return db.checksum()
+    finally:
+        db.close()
+
+
+def _init_worker(xelatex_slots):
+    global _xelatex_slots
+    _xelatex_slots = xelatex_slots
+
+
+def build_chart(
+    job,
+    output_folder,
+    work_folder=None,
+    retries=1,
+    cache_folder=None,
+    catalog_version=None,
+):
+    """
+    Builds and renders a single chart, in its own temporary folder.
+
+    When a cache folder is given, the chart PDF is copied from the cache if the chart was rendered before with the
+    same inputs. Otherwise the rendered .tex and .pdf files are stored in the cache.
+
+    Args:
+        job (ChartJob): the chart to build
+        output_folder (str): the folder to write the chart PDF to
+        work_folder (str): the folder in which to create the temporary folder
+        retries (int): the number of times to retry a failed XeLaTeX run
+        cache_folder (str): the folder with the rendered charts, or None to not cache them
+        catalog_version (str): the version of the catalogs, which is part of the cache key
+
+    Returns:
+        str: the path of the chart PDF
+    """
+    filepath = os.path.join(output_folder, f"{job.name}.pdf")
+
+    cached_pdf = None
+    if cache_folder is not None:
+        key = job.cache_key(catalog_version)
+        cached_pdf = os.path.join(cache_folder, f"{key}.pdf")
+        if os.path.exists(cached_pdf):
+            logger.info(f"Chart {job.name} is unchanged, using the cached PDF")
+            shutil.copyfile(cached_pdf, filepath)
+            return filepath
+
+    job_folder = tempfile.mkdtemp(prefix=f"{job.name}-", dir=work_folder)
+    page = job.build(job.name, job_folder, *job.args)
+
+    for attempt in range(retries + 1):
+        try:
+            if _xelatex_slots is None:
+                page.render(filepath)
+            else:
+                with _xelatex_slots:
+                    page.render(filepath)
+            break
+        except subprocess.CalledProcessError:
+            if attempt == retries:
+                logger.error(f"Rendering chart {job.name} failed, see {job_folder}")
+                raise
+            logger.warning(f"Rendering chart {job.name} failed, retrying")
+
+    if cached_pdf is not None:
+        os.makedirs(cache_folder, exist_ok=True)
+        texfile = os.path.join(job_folder, page.texfile_name)
+        cache_file(texfile, os.path.join(cache_folder, f"{key}.tex"))
+        cache_file(filepath, cached_pdf)
+
+    shutil.rmtree(job_folder, ignore_errors=True)
+    return filepath
+
+
+def _build_chart(args):
+    return build_chart(*args)
+
+
+def merge_pdfs(filenames, filepath, work_folder=None):
+    """
+    Merges the given PDF files into a single PDF file, keeping the size of every page.
+
+    The files are merged with the pdfpages package, so only XeLaTeX is needed.
+
+    Args:
+        filenames (list): the PDF files to merge
+        filepath (str): the path of the merged PDF file
+        work_folder (str): the folder in which to create the temporary folder
+    """
+    folder = tempfile.mkdtemp(prefix="merge-", dir=work_folder)
+    lines = ["\\documentclass{article}", "\\usepackage{pdfpages}", "\\begin{document}"]
+    for filename in filenames:
+        path = os.path.abspath(filename).replace(os.sep, "/")
+        lines.append(f"\\includepdf[pages=-,fitpaper]{{{path}}}")
+    lines.append("\\end{document}")
+    with open(os.path.join(folder, "merge.tex"), "w") as fp:
+        fp.write("\n".join(lines) + "\n")
+
+    subprocess.check_output(
+        ["xelatex", "-halt-on-error", "-interaction", "batchmode", "merge.tex"],
+        cwd=folder,
+    )
+    shutil.move(os.path.join(folder, "merge.pdf"), filepath)
+    shutil.rmtree(folder, ignore_errors=True)
+
+
+def build_atlas(
+    jobs,
+    output_folder,
+    atlas_file=None,
+    processes=None,
+    max_xelatex=None,
+    retries=1,
+    work_folder=TEX_OUTPUT_FOLDER,
+    cache_folder=PAGE_CACHE_FOLDER,
+    catalog_version=None,
+):
+    """
+    Builds and renders the given charts in a pool of worker processes, and optionally merges them into one PDF.
+
+    Charts that fail are reported after all other charts are done, in which case no atlas PDF is made. Charts that
+    were rendered before with the same inputs are copied from the cache instead.
+
+    Args:
+        jobs (list): the ChartJobs to build
+        output_folder (str): the folder to write the chart PDFs to
+        atlas_file (str): the path of the merged atlas PDF, or None to not merge the charts
+        processes (int): the number of worker processes; None for one per CPU, 1 to run in-process
+        max_xelatex (int): the maximum number of concurrent XeLaTeX runs; None for one per process
+        retries (int): the number of times to retry a failed XeLaTeX run
+        work_folder (str): the folder for the temporary folders of the charts
+        cache_folder (str): the folder with the rendered charts, or None to render all charts
+        catalog_version (str): the version of the catalogs, so charts that read the catalogs are rendered again
+            when the catalogs change; by default the checksum of the SkyMap database, which is only determined when
+            one of the charts reads the catalogs
+
+    Returns:
+        list: the paths of the chart PDFs, in the order of the jobs
+    """
+    for folder in (output_folder, work_folder):
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    if (
+        cache_folder is not None
+        and catalog_version is None
+        and any(job.catalogs for job in jobs)
+    ):
+        catalog_version = database_catalog_version()
+
+    arguments = [
+        (job, output_folder, work_folder, retries, cache_folder, catalog_version)
+        for job in jobs
+    ]
+    if processes is None:
+        processes = os.cpu_count()
+    if max_xelatex is None:
+        max_xelatex = processes
+
+    results = []
+    failures = []
+    if processes == 1 or len(jobs) < 2:
+        for job, args in zip(jobs, arguments):
+            try:
+                results.append(_build_chart(args))
+            except Exception as exc:
+                failures.append((job.name, exc))
+    else:
+        slots = multiprocessing.Semaphore(max_xelatex)
+        with multiprocessing.Pool(
+            processes, initializer=_init_worker, initargs=(slots,)
+        ) as pool:
+            pending = [pool.apply_async(_build_chart, (args,)) for args in arguments]
+            for job, result in zip(jobs, pending):
+                try:
+                    results.append(result.get())
+                except Exception as exc:
+                    failures.append((job.name, exc))
+
+    if failures:
+        names = ", ".join(name for name, _ in failures)
+        raise RuntimeError(f"Building charts {names} failed") from failures[0][1]
+
+    if atlas_file is not None:
+        merge_pdfs(results, atlas_file, work_folder)
+    return results
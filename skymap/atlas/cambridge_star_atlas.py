@@ -1,5 +1,9 @@
 import os
+import copy
+
+from skymap.atlas.build import ChartJob, build_atlas
 from skymap.tikz import Tikz, PaperMargin, PaperSize, PDF_FOLDER
+from skymap.tikz.tikz import TEX_OUTPUT_FOLDER
 from skymap.map import (
     MapLegend,
     MapArea,
@@ -19,13 +23,15 @@ LEGEND_WIDTH = 16
 
 
 class CambridgeStarAtlasPage(Tikz):
-    def __init__(self, name="none"):
+    def __init__(self, name="none", output_folder=TEX_OUTPUT_FOLDER):
         Tikz.__init__(
             self,
             name=name,
             papersize=PaperSize(width=304, height=228),
             margins=PaperMargin(left=12, bottom=14, right=12, top=20),
             normalsize=10,
+            output_folder=output_folder,
+            precision=2,
         )
 
 
@@ -65,10 +71,15 @@ def latitude_range_func(longitude, min_latitude, max_latitude):
         return min_latitude, max_latitude - offset
 
 
-if __name__ == "__main__":
-    if not os.path.exists(OUTPUT_FOLDER):
-        os.makedirs(OUTPUT_FOLDER)
+def chart_configs():
+    """
+    Generates the map configuration of every chart.
+
+    The configuration is adjusted from chart to chart, so every chart inherits the settings of the previous charts.
 
+    Returns:
+        generator: tuples of the chart number and a copy of its map configuration
+    """
     p = CambridgeStarAtlasPage()
 
     cc = CoordinateGridConfig()
@@ -95,12 +106,6 @@ if __name__ == "__main__":
     mc.clip_at_border = True
 
     for chart_number in range(1, 21):
-        name = f"{chart_number:02d}"
-        print()
-        print(f"Chart {name}")
-        p = p.new(name)
-        CambridgeStarAtlasLegend(p, chart_number)
-
         if chart_number < 2:
             # North pole azimuthal
             mc.horizontal_stretch = 1.0
@@ -180,5 +185,25 @@ if __name__ == "__main__":
             mc.coordinate_grid_config.parallel_internal_labels = True
             mc.coordinate_grid_config.parallel_marked_tick_interval = 10
 
-        MapArea(p, mc)
-        p.render(os.path.join(OUTPUT_FOLDER, f"{name}.pdf"))
+        yield chart_number, copy.deepcopy(mc)
+
+
+def build_chart(name, output_folder, chart_number, mc):
+    """Creates the page for the given chart, in the given output folder."""
+    print()
+    print(f"Chart {name}")
+    p = CambridgeStarAtlasPage(name, output_folder)
+    CambridgeStarAtlasLegend(p, chart_number)
+    MapArea(p, mc)
+    return p
+
+
+if __name__ == "__main__":
+    jobs = [
+        ChartJob(
+            f"{chart_number:02d}", build_chart, (chart_number, mc), catalogs=False
+        )
+        for chart_number, mc in chart_configs()
+    ]
+    atlas_file = os.path.join(OUTPUT_FOLDER, "cambridge_star_atlas.pdf")
+    build_atlas(jobs, OUTPUT_FOLDER, atlas_file)
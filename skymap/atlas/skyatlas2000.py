@@ -1,5 +1,9 @@
 import os
+import copy
+
+from skymap.atlas.build import ChartJob, build_atlas
 from skymap.tikz import Tikz, PaperMargin, PaperSize, PDF_FOLDER
+from skymap.tikz.tikz import TEX_OUTPUT_FOLDER
 from skymap.map import (
     MapLegend,
     MapArea,
@@ -19,13 +23,15 @@ GALACTIC_DASH_PATTERN = "densely dash dot"
 
 
 class SkyAtlas2000Page(Tikz):
-    def __init__(self, name="none"):
+    def __init__(self, name="none", output_folder=TEX_OUTPUT_FOLDER):
         Tikz.__init__(
             self,
             name=name,
             papersize=PaperSize(width=465, height=343),
             margins=PaperMargin(left=17, bottom=8, right=17, top=10),
             normalsize=10,
+            output_folder=output_folder,
+            precision=2,
         )
 
 
@@ -69,10 +75,15 @@ def latitude_range_func(longitude, min_latitude, max_latitude):
         return min_latitude, max_latitude - offset
 
 
-if __name__ == "__main__":
-    if not os.path.exists(OUTPUT_FOLDER):
-        os.makedirs(OUTPUT_FOLDER)
+def chart_configs():
+    """
+    Generates the map configuration of every chart.
+
+    The configuration is adjusted from chart to chart, so every chart inherits the settings of the previous charts.
 
+    Returns:
+        generator: tuples of the chart number and a copy of its map configuration
+    """
     p = SkyAtlas2000Page()
 
     cc = CoordinateGridConfig()
@@ -101,12 +112,6 @@ if __name__ == "__main__":
     mc.clip_at_border = True
 
     for chart_number in range(1, 27):
-        name = f"{chart_number:02d}"
-        print()
-        print(f"Chart {name}")
-        p = p.new(name)
-        SkyAtlas2000Legend(p, chart_number)
-
         if chart_number < 4:
             # North pole conics
             mc.center_longitude = 90 + (chart_number - 1) * 120 + 0.8485
@@ -164,5 +169,24 @@ if __name__ == "__main__":
             mc.origin = mc.map_llcorner + Point(mc.map_width - 132, 0.5 * mc.map_height)
             mc.coordinate_grid_config.polar_tick = True
 
-        MapArea(p, mc)
-        p.render(os.path.join(OUTPUT_FOLDER, f"{name}.pdf"))
+        yield chart_number, copy.deepcopy(mc)
+
+
+def build_chart(name, output_folder, chart_number, mc):
+    """Creates the page for the given chart, in the given output folder."""
+    print()
+    print(f"Chart {name}")
+    p = SkyAtlas2000Page(name, output_folder)
+    SkyAtlas2000Legend(p, chart_number)
+    MapArea(p, mc)
+    return p
+
+
+if __name__ == "__main__":
+    jobs = [
+        ChartJob(
+            f"{chart_number:02d}", build_chart, (chart_number, mc), catalogs=False
+        )
+        for chart_number, mc in chart_configs()
+    ]
+    build_atlas(jobs, OUTPUT_FOLDER, os.path.join(OUTPUT_FOLDER, "skyatlas2000.pdf"))
@@ -3,7 +3,9 @@ import copy
 from astropy.coordinates import Longitude
 import astropy.units as u
 
+from skymap.atlas.build import ChartJob, build_atlas
 from skymap.tikz import Tikz, PaperMargin, PaperSize, PDF_FOLDER
+from skymap.tikz.tikz import TEX_OUTPUT_FOLDER
 from skymap.map import (
     MapLegend,
     MapArea,
@@ -114,13 +116,19 @@ CONICS = [
 
 
 class UranometriaPage(Tikz):
-    def __init__(self, name="none", left=True):
+    def __init__(self, name="none", left=True, output_folder=TEX_OUTPUT_FOLDER):
         if left:
             margins = LEFT_PAGE_MARGINS
         else:
             margins = RIGHT_PAGE_MARGINS
         Tikz.__init__(
-            self, name=name, papersize=PAPERSIZE, margins=margins, normalsize=10
+            self,
+            name=name,
+            papersize=PAPERSIZE,
+            margins=margins,
+            normalsize=10,
+            output_folder=output_folder,
+            precision=2,
         )
 
 
@@ -203,10 +211,16 @@ def conic_config(chart_number):
         n += cur_n
 
 
-if __name__ == "__main__":
-    if not os.path.exists(OUTPUT_FOLDER):
-        os.makedirs(OUTPUT_FOLDER)
+def chart_configs():
+    """
+    Generates the map configuration of every chart.
+
+    The configuration is adjusted from chart to chart, so every chart inherits the settings of the previous charts.
 
+    Returns:
+        generator: tuples of the chart name, the chart number, whether it is a left page, and a copy of its map
+            configuration
+    """
     lp = UranometriaPage(left=True)
     rp = UranometriaPage(left=False)
 
@@ -243,16 +257,12 @@ if __name__ == "__main__":
     for chart_number in range(1, 221):
         for subchart_number in ["A", "B"]:
             name = f"{chart_number:02d}{subchart_number}"
-            print()
-            print(f"Chart {name}")
             left = subchart_number == "A"
 
             if left:
-                p = lp.new(name)
+                p = lp
             else:
-                p = rp.new(name)
-
-            UranometriaLegend(p, chart_number, left=left)
+                p = rp
 
             if chart_number == 1:
                 # North pole maps
@@ -469,5 +479,22 @@ if __name__ == "__main__":
                     LEGEND_WIDTH, mc.latitude_range * MM_PER_DEGREE
                 )
 
-            MapArea(p, mc, True)
-            p.render(os.path.join(OUTPUT_FOLDER, f"{name}.pdf"))
+            yield name, chart_number, left, copy.deepcopy(mc)
+
+
+def build_chart(name, output_folder, chart_number, left, mc):
+    """Creates the page for the given chart, in the given output folder."""
+    print()
+    print(f"Chart {name}")
+    p = UranometriaPage(name, left, output_folder)
+    UranometriaLegend(p, chart_number, left=left)
+    MapArea(p, mc, True)
+    return p
+
+
+if __name__ == "__main__":
+    jobs = [
+        ChartJob(name, build_chart, (chart_number, left, mc), catalogs=False)
+        for name, chart_number, left, mc in chart_configs()
+    ]
+    build_atlas(jobs, OUTPUT_FOLDER, os.path.join(OUTPUT_FOLDER, "uranometria.pdf"))
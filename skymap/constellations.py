@@ -1,10 +1,11 @@
 import math
 import random
+import numpy
 
 from astropy.coordinates import get_constellation
 from astroquery.vizier import Vizier
 from skymap.database import SkyMapDatabase
-from skymap.geometry import ensure_angle_range, SkyCoordDeg, TOLERANCE
+from skymap.geometry import ensure_angle_range, SkyCoordDeg, Polyline, TOLERANCE
 
 
 CONSTELLATIONS = {
@@ -188,11 +189,16 @@ class ConstellationBoundaryEdge(object):
         self.coord2 = p2
         self.interpolated_points = []
 
+        # The end points in the original epoch, and the frame the edge was precessed to
+        self.original_coords = (p1, p2)
+        self.frame = None
+
         if abs(self.coord1.ra.degree - self.coord2.ra.degree) < TOLERANCE:
             self.direction = "parallel"
         elif abs(self.coord1.dec.degree - self.coord2.dec.degree) < TOLERANCE:
             self.direction = "meridian"
-        raise ValueError("Edge is slanted")
+        else:
+            raise ValueError("Edge is slanted")
 
     def __eq__(self, other):
         eq = self.coord1 == other.coord1 and self.coord2 == other.coord2
@@ -268,6 +274,69 @@ class ConstellationBoundaryEdge(object):
             self.interpolated_points = [SkyCoordDeg(fixed_value, v) for v in new_values]
         return self.interpolated_points
 
+    def edge_coordinates(self, fractions):
+        """Returns the coordinates of the points at the given fractions along the edge, in the precessed frame.
+
+        Args:
+            fractions (numpy.ndarray): the fractions along the edge, from 0 at the first to 1 at the second point
+
+        Returns:
+            tuple: arrays with the longitudes and latitudes of the points, in degrees
+        """
+        p1, p2 = self.original_coords
+        if self.direction == "parallel":
+            fixed_value = p1.ra.degree
+            v1 = p1.dec.degree
+            v2 = p2.dec.degree
+        else:
+            fixed_value = p1.dec.degree
+            v1 = p1.ra.degree
+            v2 = p2.ra.degree
+
+        # Take the shortest way around for edges crossing zero (assuming edges never exceed 180)
+        d = v2 - v1
+        if abs(d) >= 180:
+            d -= math.copysign(360, d)
+
+        values = v1 + numpy.asarray(fractions, dtype=float) * d
+        fixed_values = numpy.full_like(values, fixed_value)
+        if self.direction == "parallel":
+            coords = SkyCoordDeg(fixed_values, values)
+        else:
+            coords = SkyCoordDeg(values, fixed_values)
+
+        if self.frame is not None:
+            coords = coords.transform_to(self.frame)
+        return coords.ra.degree, coords.dec.degree
+
+    def polyline(self, projection, tolerance=None):
+        """Returns the edge projected on the map, as a Polyline.
+
+        Without a tolerance, the polyline runs through the interpolated points. Otherwise, the edge is sampled as
+        densely as needed for the polyline to stay within the tolerance of the projected edge, so the number of points
+        depends on the map scale instead of on the interpolation step.
+
+        Args:
+            projection (skymap.map.Projection): the map projection
+            tolerance (float): the maximum distance between the polyline and the projected edge, in mm
+
+        Returns:
+            skymap.geometry.Polyline: the projected edge
+        """
+        if tolerance is not None:
+            return Polyline.adaptive(
+                lambda t: projection.project_coordinates(*self.edge_coordinates(t)),
+                0,
+                1,
+                tolerance,
+            )
+
+        if not self.interpolated_points:
+            self.interpolate_points()
+        longitudes = [p.ra.degree for p in self.interpolated_points]
+        latitudes = [p.dec.degree for p in self.interpolated_points]
+        return Polyline(projection.project_coordinates(longitudes, latitudes))
+
     def precess(self, frame="icrs"):
         if not self.interpolated_points:
             self.interpolate_points()
@@ -277,6 +346,7 @@ class ConstellationBoundaryEdge(object):
             precessed_points.append(p.transform_to(frame))
 
         self.epoch = precessed_points[0].frame
+        self.frame = frame
         self.coord1 = precessed_points[0]
         self.coord2 = precessed_points[-1]
         self.interpolated_points = precessed_points
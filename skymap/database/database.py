@@ -4,6 +4,7 @@ SkyMap database.
 Thin wrapper around the MySQL connector, specifically designed for a local MySQL database
 """
 
+import hashlib
 import mysql.connector
 DATA_TYPES = {int: "INT", str: "VARCHAR(512)", float: "DOUBLE"}
 
@@ -103,6 +104,22 @@ class SkyMapDatabase(object):
         except IndexError:
             return None
 
+    def checksum(self):
+        """
+        Returns a checksum of the contents of all tables in the database, which changes whenever a catalog is updated.
+
+        Returns:
+            str: the hexadecimal checksum
+        """
+        q = """SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA=%s ORDER BY TABLE_NAME"""
+        tables = [row["TABLE_NAME"] for row in self.query(q, (self.database,))]
+        digest = hashlib.sha1()
+        if tables:
+            q = """CHECKSUM TABLE {}""".format(", ".join("`{}`".format(t) for t in tables))
+            for row in self.query(q):
+                digest.update("{}:{}\n".format(row["Table"], row["Checksum"]).encode())
+        return digest.hexdigest()
+
     def commit_query(self, q, params=()):
         self.cursor.execute(q, params)
         self.conn.commit()
@@ -374,6 +374,182 @@ class Polygon(object):
         return s
 
 
+class Polyline(object):
+    """A 2D curve through a sequence of points, stored as an (N, 2) array of coordinates.
+
+    Unlike a Polygon, a Polyline does not create Point and Line objects for its vertices, so long curves like grid
+    lines and constellation boundaries can be transformed, clipped, simplified and serialized with array operations.
+
+    Args:
+        points: an (N, 2) array of coordinates, or a list of points
+    """
+
+    def __init__(self, points):
+        if not isinstance(points, np.ndarray):
+            points = [tuple(p) for p in points]
+        self.xy = np.array(points, dtype=float).reshape(-1, 2)
+        self.closed = False
+
+    def __str__(self):
+        return f"Polyline({len(self)} points)"
+
+    @classmethod
+    def adaptive(cls, func, t1, t2, tolerance, nsamples=9, max_depth=12):
+        """Creates a polyline approximating a parametric curve within the given tolerance.
+
+        The curve is sampled at evenly spaced parameter values first. Intervals whose chord deviates more than the
+        tolerance from the curve halfway the interval are subdivided, until all chords are within the tolerance or the
+        maximum depth is reached. Finally, the vertices that are not needed to stay within the tolerance are dropped.
+        Both steps get half of the tolerance.
+
+        Args:
+            func (callable): function returning an (N, 2) array of coordinates for an array of N parameter values
+            t1 (float): the parameter value at the start of the curve
+            t2 (float): the parameter value at the end of the curve
+            tolerance (float): the maximum distance between the polyline and the curve
+            nsamples (int): the number of initial samples
+            max_depth (int): the maximum number of times an interval is subdivided
+
+        Returns:
+            skymap.geometry.Polyline: the polyline
+        """
+        t = np.linspace(t1, t2, nsamples)
+        xy = np.asarray(func(t), dtype=float).reshape(-1, 2)
+        for _ in range(max_depth):
+            tm = 0.5 * (t[:-1] + t[1:])
+            xym = np.asarray(func(tm), dtype=float).reshape(-1, 2)
+
+            # Distance between the curve halfway each interval and the chord of the interval
+            p = xy[:-1]
+            d = xy[1:] - p
+            v = xym - p
+            length = np.hypot(d[:, 0], d[:, 1])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                error = np.where(
+                    length > 0,
+                    np.abs(d[:, 0] * v[:, 1] - d[:, 1] * v[:, 0]) / length,
+                    np.hypot(v[:, 0], v[:, 1]),
+                )
+            split = error > 0.5 * tolerance
+            if not split.any():
+                break
+
+            # Insert the midpoints of the intervals to split
+            positions = np.flatnonzero(split) + 1
+            t = np.insert(t, positions, tm[split])
+            xy = np.insert(xy, positions, xym[split], axis=0)
+
+        return cls(xy).simplify(0.5 * tolerance)
+
+    def __len__(self):
+        return len(self.xy)
+
+    @property
+    def points(self):
+        """Returns the vertices as Point objects."""
+        return [Point(x, y) for x, y in self.xy.tolist()]
+
+    @property
+    def p1(self):
+        return Point(*self.xy[0].tolist())
+
+    @property
+    def p2(self):
+        return Point(*self.xy[-1].tolist())
+
+    @property
+    def angle(self):
+        """Returns the angle between the line from the first to the last point and the positive x axis."""
+        d = self.xy[-1] - self.xy[0]
+        return math.degrees(math.atan2(d[1], d[0]))
+
+    @property
+    def length(self):
+        """Returns the length of the curve."""
+        return float(np.hypot(*np.diff(self.xy, axis=0).T).sum())
+
+    def transform(self, matrix=None, offset=None):
+        """Returns a copy of the polyline, transformed with the given matrix and then shifted over the given offset.
+
+        Args:
+            matrix (np.ndarray): the 2x2 transformation matrix
+            offset (skymap.geometry.Point): the offset
+        """
+        xy = self.xy
+        if matrix is not None:
+            xy = xy @ np.asarray(matrix, dtype=float).T
+        if offset is not None:
+            xy = xy + tuple(offset)
+        return Polyline(xy)
+
+    def translate(self, offset):
+        """Returns a copy of the polyline, shifted over the given offset.
+
+        Args:
+            offset (skymap.geometry.Point): the offset
+        """
+        return self.transform(offset=offset)
+
+    def rotate(self, angle, origin=None):
+        """Returns a copy of the polyline, rotated the given angle around the origin.
+
+        Args:
+            angle (float): the angle in degrees
+            origin (skymap.geometry.Point): the point around which to rotate
+        """
+        if origin is None:
+            origin = Point(0, 0)
+        a = math.radians(angle)
+        matrix = [[math.cos(a), -math.sin(a)], [math.sin(a), math.cos(a)]]
+        return self.translate(-1 * origin).transform(matrix, origin)
+
+    def reverse(self):
+        return Polyline(self.xy[::-1])
+
+    def simplify(self, tolerance):
+        """Returns a copy of the polyline without the points that lie within the tolerance of the simplified curve.
+
+        Uses the Douglas-Peucker algorithm. The first and last points are always kept.
+
+        Args:
+            tolerance (float): the maximum distance between the original and the simplified curve
+        """
+        n = len(self.xy)
+        if n < 3:
+            return Polyline(self.xy)
+
+        keep = np.zeros(n, dtype=bool)
+        keep[[0, -1]] = True
+        stack = [(0, n - 1)]
+        while stack:
+            i, j = stack.pop()
+            if j - i < 2:
+                continue
+
+            # Distances of the intermediate points to the line (or to the first point, for a closed curve)
+            p = self.xy[i]
+            d = self.xy[j] - p
+            v = self.xy[i + 1 : j] - p
+            length = math.hypot(*d)
+            if length > 0:
+                distance = np.abs(d[0] * v[:, 1] - d[1] * v[:, 0]) / length
+            else:
+                distance = np.hypot(v[:, 0], v[:, 1])
+
+            k = int(np.argmax(distance))
+            if distance[k] > tolerance:
+                keep[i + 1 + k] = True
+                stack.append((i, i + 1 + k))
+                stack.append((i + 1 + k, j))
+        return Polyline(self.xy[keep])
+
+    @property
+    def path(self):
+        """Returns the TikZ path string for the polyline."""
+        xy = np.where(np.abs(self.xy) < 1e-4, 0.0, self.xy)
+        return "--".join(f"({x}mm,{y}mm)" for x, y in xy.tolist())
+
+
 class Circle(object):
     """A circle in the 2D plane.
 
@@ -735,24 +911,161 @@ class Clipper(object):
         line = Line(p1, p2)
         return [line], [(border1, border2)]
 
+    def clip_segments(self, segments):
+        """Clips a batch of line segments to the map area at once, with the Liang-Barsky algorithm.
+
+        Args:
+            segments (np.ndarray): an (N, 4) array with the x1, y1, x2, y2 coordinates of the segments
+
+        Returns:
+            tuple: an (N, 4) array with the clipped segments, and a boolean array that is True for the segments that
+                (partly) lie inside the map area. The clipped coordinates of the other segments are undefined.
+        """
+        segments = np.asarray(segments, dtype=float).reshape(-1, 4)
+        x1, y1, x2, y2 = segments.T
+        dx = x2 - x1
+        dy = y2 - y1
+
+        t0 = np.zeros(len(segments))
+        t1 = np.ones(len(segments))
+        keep = np.ones(len(segments), dtype=bool)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for p, q in (
+                (-dx, x1 - self.minx),
+                (dx, self.maxx - x1),
+                (-dy, y1 - self.miny),
+                (dy, self.maxy - y1),
+            ):
+                # Segments parallel to a border are either completely inside or outside of it
+                parallel = p == 0
+                keep &= ~(parallel & (q < 0))
+                r = q / p
+                t0 = np.where(p < 0, np.maximum(t0, r), t0)
+                t1 = np.where(p > 0, np.minimum(t1, r), t1)
+
+        # Segments that only touch the map area are dropped, like in clip_line
+        keep &= t0 < t1
+
+        # Keep the original end points exactly where they are not clipped
+        clipped = np.empty_like(segments)
+        clipped[:, 0] = np.where(t0 > 0, x1 + t0 * dx, x1)
+        clipped[:, 1] = np.where(t0 > 0, y1 + t0 * dy, y1)
+        clipped[:, 2] = np.where(t1 < 1, x1 + t1 * dx, x2)
+        clipped[:, 3] = np.where(t1 < 1, y1 + t1 * dy, y2)
+        return clipped, keep
+
+    def point_borders(self, x, y, tolerance=1e-6):
+        """Returns the names of the borders the given points lie on, or None for points that are not on a border.
+
+        Args:
+            x (np.ndarray): the x coordinates of the points
+            y (np.ndarray): the y coordinates of the points
+            tolerance (float): the maximum distance between a point and a border
+
+        Returns:
+            np.ndarray: an object array with the border names
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        result = np.full(x.shape, None, dtype=object)
+        for bordername, border in self.borderdict.items():
+            cross = border.vector.x * (y - border.p1.y) - border.vector.y * (
+                x - border.p1.x
+            )
+            distance = np.abs(cross) / border.length
+            result[(distance < tolerance) & np.equal(result, None)] = bordername
+        return result
+
     def clip_polygon(self, polygon):
-        new_lines = []
-        border1 = None
-        border2 = None
-
-        for l in polygon.lines:
-            lines, borders = self.clip_line(l)
-            for nl in lines:
-                if nl is not None:
-                    new_lines.append(nl)
-                    if border1 is None:
-                        border1 = borders[0][0]
-                    border2 = borders[0][1]
-        if not new_lines:
+        if not polygon.lines:
             return [], []
-        points = [l.p1 for l in new_lines]
-        points.append(new_lines[-1].p2)
-        return [Polygon(points, closed=False)], [(border1, border2)]
+
+        segments = np.array([(l.p1.x, l.p1.y, l.p2.x, l.p2.y) for l in polygon.lines])
+        clipped, keep = self.clip_segments(segments)
+        clipped = clipped[keep]
+        if not len(clipped):
+            return [], []
+
+        points = [Point(x, y) for x, y in clipped[:, :2].tolist()]
+        points.append(Point(*clipped[-1, 2:].tolist()))
+        borders = self.point_borders(
+            [clipped[0, 0], clipped[-1, 2]], [clipped[0, 1], clipped[-1, 3]]
+        )
+        return [Polygon(points, closed=False)], [tuple(borders)]
+
+    def clip_polyline(self, polyline):
+        """Clips the given polyline to the map area.
+
+        Args:
+            polyline (skymap.geometry.Polyline): the polyline to clip
+
+        Returns:
+            tuple: a list with a Polyline for every part of the polyline inside the map area, and a list with the pair
+                of borders at the ends of each part
+        """
+        if len(polyline) < 2:
+            return [], []
+
+        xy = polyline.xy
+        clipped, keep = self.clip_segments(np.hstack([xy[:-1], xy[1:]]))
+        indices = np.flatnonzero(keep)
+        if not len(indices):
+            return [], []
+        clipped = clipped[indices]
+
+        # A new part starts where a kept segment does not continue the previous kept segment
+        continued = np.all(clipped[1:, :2] == clipped[:-1, 2:], axis=1)
+        breaks = (np.diff(indices) != 1) | ~continued
+        starts = np.concatenate([[0], np.flatnonzero(breaks) + 1])
+        stops = np.concatenate([starts[1:], [len(clipped)]])
+
+        ends = np.concatenate([clipped[starts, :2], clipped[stops - 1, 2:]])
+        borders = self.point_borders(ends[:, 0], ends[:, 1])
+
+        parts = []
+        part_borders = []
+        for n, (i, j) in enumerate(zip(starts, stops)):
+            parts.append(Polyline(np.vstack([clipped[i:j, :2], clipped[j - 1, 2:]])))
+            part_borders.append((borders[n], borders[len(starts) + n]))
+        return parts, part_borders
+
+    def clip_polygon_area(self, points):
+        """Clips the area of a closed polygon to the map area, with the Sutherland-Hodgman algorithm.
+
+        Unlike clip_polygon, which clips the outline of a polygon, this returns the closed polygon covering the part
+        of the area inside the map area, for filling.
+
+        Args:
+            points (np.ndarray): an (N, 2) array with the vertices of the polygon
+
+        Returns:
+            np.ndarray: an (M, 2) array with the vertices of the clipped polygon, which is empty if the polygon lies
+                outside the map area
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        for axis, limit, sign in (
+            (0, self.minx, 1),
+            (0, self.maxx, -1),
+            (1, self.miny, 1),
+            (1, self.maxy, -1),
+        ):
+            if not len(points):
+                break
+            following = np.roll(points, -1, axis=0)
+            inside = sign * (points[:, axis] - limit) >= 0
+            crossing = inside != np.roll(inside, -1)
+
+            # The intersection of each edge crossing the border, following its start vertex if that is inside
+            delta = following - points
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t = (limit - points[:, axis]) / delta[:, axis]
+                intersections = points + t[:, np.newaxis] * delta
+            intersections[:, axis] = limit
+
+            candidates = np.stack([points, intersections], axis=1).reshape(-1, 2)
+            mask = np.stack([inside, crossing], axis=1).reshape(-1)
+            points = candidates[mask]
+        return points
 
     def circle_intersect_borders(self, circle):
         crossings = []
@@ -810,6 +1123,8 @@ class Clipper(object):
             return self.clip_circle(item)
         elif isinstance(item, Polygon):
             return self.clip_polygon(item)
+        elif isinstance(item, Polyline):
+            return self.clip_polyline(item)
         else:
             raise NotImplementedError
 
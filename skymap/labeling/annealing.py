@@ -0,0 +1,269 @@
+import math
+import random
+import time
+
+from skymap.labeling.common import apply_assignment, extend_assigned_points
+from skymap.labeling.arrays import build_conflict_graph
+
+
+class SimulatedAnnealingLabeler(object):
+    """Labeler using simulated annealing, following Christensen, Marks & Shieber (1995).
+
+    Starting from a random assignment, a single label is moved to another candidate position at a
+    time. The change in penalty is determined incrementally from the conflict graph, so every move
+    costs only the number of conflicts of the old and new candidate. The temperature is lowered
+    after a fixed number of tried or accepted moves, and the run stops when a temperature stage
+    does not accept any move, or when the time budget is exceeded.
+
+    When warm starting from a previous solution, the labels of the initial assignment are used instead of random
+    ones, and only the labels of the free points are moved.
+
+    The best assignment is stored at the end of every temperature stage and when the run stops, and restored at the
+    end, so the labeler can be stopped at any time by the time budget or a target penalty. With a drop penalty, labels
+    may also be left out: leaving out the label of a point costs the drop penalty times the priority of the point, so
+    low priority labels are dropped first when they cannot be placed without a higher penalty.
+
+    With extra candidates enabled, the points still in conflict after annealing get extra candidates (see
+    LabelableObject.extend_labels), which are added to the conflict graph, after which those points are annealed
+    again, starting at the final temperature. So the extra candidates only cost memory and evaluations for the
+    points that need them.
+
+    Args:
+        points (list): the points to label
+        bounding_box (BoundingBox): the bounding box of the map
+        time_budget (float): the maximum run time in seconds, or None for no limit
+        seed: the seed for the random number generator
+        initial_assignment (dict): the candidate index to start from for each point key
+        free_points (list): the points whose labels may be moved; all labeled points by default
+        extra_candidates (bool): whether to generate extra candidates for the points in conflict
+        drop_penalty (float): the penalty for leaving out a label of priority 1, or None to place all labels
+        target_penalty (float): the total penalty at which to stop, or None to run the full schedule
+    """
+
+    def __init__(
+        self,
+        points,
+        bounding_box,
+        time_budget=None,
+        seed=None,
+        initial_assignment=None,
+        free_points=None,
+        extra_candidates=False,
+        drop_penalty=None,
+        target_penalty=None,
+    ):
+        self.points = points
+        self.bounding_box = bounding_box
+        self.time_budget = time_budget
+        self.random = random.Random(seed)
+        self.initial_assignment = initial_assignment
+        self.extra_candidates = extra_candidates
+        self.drop_penalty = drop_penalty
+        self.target_penalty = target_penalty
+
+        self.labeled_points = [p for p in self.points if p.text]
+        if free_points is None:
+            self.free_points = self.labeled_points
+        else:
+            free_points = set(free_points)
+            self.free_points = [p for p in self.labeled_points if p in free_points]
+        self.free = set(self.free_points)
+
+        # Annealing schedule
+        self.initial_temperature = 1 / math.log(3)
+        self.cooling_factor = 0.9
+        self.max_stages = 50
+        self.tries_per_point = 20
+        self.moves_per_point = 5
+        self.temperature = self.initial_temperature
+
+        # The extra candidates of the initial assignment must be part of the conflict graph
+        if self.initial_assignment is not None:
+            extend_assigned_points(self.labeled_points, self.initial_assignment)
+
+        self.label_candidates = []
+        for lp in self.labeled_points:
+            self.label_candidates.extend(lp.label_candidates)
+
+        self.conflict_graph = build_conflict_graph(
+            self.label_candidates, self.points, self.bounding_box
+        )
+
+    def label_penalty(self, label):
+        """Returns the penalty of the given candidate, given the labels currently selected."""
+        penalty = label.penalty
+        for other, overlap in label.conflicts.items():
+            if other.selected:
+                # Each label-label overlap is counted for both labels
+                penalty += 2 * overlap
+        return penalty
+
+    def point_penalty(self, point, label):
+        """Returns the penalty of the given candidate, or of leaving out the label of the point if None."""
+        if label is None:
+            return self.drop_penalty * point.priority
+        return self.label_penalty(label)
+
+    def energy(self):
+        """Returns the total penalty of the current assignment."""
+        energy = 0
+        for lp in self.labeled_points:
+            label = lp.label
+            if label is None:
+                energy += self.drop_penalty * lp.priority
+                continue
+            energy += label.penalty
+            energy += sum(o for other, o in label.conflicts.items() if other.selected)
+        return energy
+
+    def run(self):
+        if self.time_budget is not None:
+            deadline = time.perf_counter() + self.time_budget
+        else:
+            deadline = None
+
+        unassigned = self.labeled_points
+        if self.initial_assignment is not None:
+            unassigned = apply_assignment(self.labeled_points, self.initial_assignment)
+        for lp in unassigned:
+            self.random.choice(lp.label_candidates).select()
+
+        if not self.free_points:
+            return
+
+        # Points whose label is in conflict with another label are tried more often
+        self.conflicting = []
+        self.conflicting_positions = {}
+        for lp in self.free_points:
+            if self.in_conflict(lp.label):
+                self.add_conflicting(lp)
+
+        self.current_energy = self.energy()
+        self.best_energy = None
+        self.checkpoint()
+
+        completed = self.anneal(self.free_points, self.initial_temperature, deadline)
+        if completed and self.extra_candidates and self.conflicting:
+            points = list(self.conflicting)
+            new_candidates = []
+            for lp in points:
+                new_candidates.extend(lp.extend_labels())
+            self.conflict_graph.extend(new_candidates)
+            self.label_candidates.extend(new_candidates)
+
+            self.anneal(points, self.temperature, deadline)
+
+        self.checkpoint()
+        for lp, label_index in zip(self.labeled_points, self.best_assignment):
+            lp.label_index = label_index
+
+    def checkpoint(self):
+        """Stores the current assignment, if it is the best so far."""
+        if self.best_energy is None or self.current_energy < self.best_energy:
+            self.best_energy = self.current_energy
+            self.best_assignment = [lp.label_index for lp in self.labeled_points]
+
+    def anneal(self, points, temperature, deadline):
+        """Anneals the labels of the given points, starting at the given temperature.
+
+        Returns:
+            bool: whether the annealing completed, before the deadline or reaching the target penalty
+        """
+        tries_per_stage = self.tries_per_point * len(points)
+        moves_per_stage = self.moves_per_point * len(points)
+
+        for stage in range(self.max_stages):
+            self.temperature = temperature
+            accepted = 0
+            for i in range(tries_per_stage):
+                if i % 100 == 0:
+                    # The current assignment is stored by the caller when stopping early
+                    if deadline is not None and time.perf_counter() > deadline:
+                        return False
+                    if (
+                        self.target_penalty is not None
+                        and self.current_energy <= self.target_penalty
+                    ):
+                        return False
+
+                if self.conflicting and self.random.random() < 0.5:
+                    lp = self.random.choice(self.conflicting)
+                else:
+                    lp = self.random.choice(points)
+
+                old_label = lp.label
+                if self.drop_penalty is None:
+                    new_label = self.random.choice(lp.label_candidates)
+                else:
+                    k = self.random.randrange(len(lp.label_candidates) + 1)
+                    if k < len(lp.label_candidates):
+                        new_label = lp.label_candidates[k]
+                    else:
+                        new_label = None
+                if new_label is old_label:
+                    continue
+
+                delta = self.point_penalty(lp, new_label) - self.point_penalty(
+                    lp, old_label
+                )
+                if delta > 0 and self.random.random() >= math.exp(-delta / temperature):
+                    continue
+
+                if new_label is None:
+                    lp.label_index = None
+                else:
+                    new_label.select()
+                accepted += 1
+                self.current_energy += delta
+                self.update_conflicts(lp, old_label, new_label)
+
+                if accepted >= moves_per_stage:
+                    break
+
+            self.checkpoint()
+            if accepted == 0:
+                break
+            temperature *= self.cooling_factor
+        return True
+
+    @staticmethod
+    def in_conflict(label):
+        if label is None:
+            return False
+        return any(other.selected for other in label.conflicts)
+
+    def add_conflicting(self, point):
+        if point in self.free and point not in self.conflicting_positions:
+            self.conflicting_positions[point] = len(self.conflicting)
+            self.conflicting.append(point)
+
+    def discard_conflicting(self, point):
+        i = self.conflicting_positions.pop(point, None)
+        if i is None:
+            return
+        # Swap the last point into the freed position, so removal is O(1)
+        last = self.conflicting.pop()
+        if last is not point:
+            self.conflicting[i] = last
+            self.conflicting_positions[last] = i
+
+    def update_conflicts(self, point, old_label, new_label):
+        """Updates the list of points in conflict, after moving the label of a point."""
+        for label in (old_label, new_label):
+            if label is None:
+                continue
+            for other in label.conflicts:
+                if not other.selected:
+                    continue
+                if self.in_conflict(other):
+                    self.add_conflicting(other.point)
+                else:
+                    self.discard_conflicting(other.point)
+
+        if self.in_conflict(new_label):
+            self.add_conflicting(point)
+        else:
+            self.discard_conflicting(point)
+
+    def result(self):
+        return [p.label_index for p in self.points if p.label_index is not None]
@@ -0,0 +1,332 @@
+import numpy as np
+
+from skymap.labeling.common import POINT_PENALTY, BBOX_PENALTY
+
+
+def overlap_areas(minx1, miny1, maxx1, maxy1, minx2, miny2, maxx2, maxy2):
+    """Calculates the overlap areas of pairs of rectangles.
+
+    All arguments are arrays of equal length, or scalars.
+
+    Returns:
+        numpy.ndarray: the overlap area of each pair, zero for rectangles that do not overlap
+    """
+    w = np.minimum(maxx1, maxx2) - np.maximum(minx1, minx2)
+    h = np.minimum(maxy1, maxy2) - np.maximum(miny1, miny2)
+    return np.where((w > 0) & (h > 0), w * h, 0.0)
+
+
+class BoxGrid(object):
+    """Uniform grid index for a set of boxes, queried for many boxes at once.
+
+    Boxes are binned on their lower left corner, using a cell size equal to the largest box width and
+    height. Boxes intersecting a query box can then only be found in a small range of cells around
+    it, which is searched for all query boxes at once. This avoids a Python level call per query box,
+    as needed for an R-tree.
+
+    Args:
+        minx (numpy.ndarray): the minimum x coordinate of each box
+        miny (numpy.ndarray): the minimum y coordinate of each box
+        maxx (numpy.ndarray): the maximum x coordinate of each box
+        maxy (numpy.ndarray): the maximum y coordinate of each box
+    """
+
+    def __init__(self, minx, miny, maxx, maxy):
+        self.minx = minx
+        self.miny = miny
+        self.maxx = maxx
+        self.maxy = maxy
+
+        if len(minx) == 0:
+            return
+
+        self.cell_width = max(float((maxx - minx).max()), 1e-9)
+        self.cell_height = max(float((maxy - miny).max()), 1e-9)
+        self.x0 = float(minx.min())
+        self.y0 = float(miny.min())
+
+        cx = ((minx - self.x0) // self.cell_width).astype(np.int64)
+        cy = ((miny - self.y0) // self.cell_height).astype(np.int64)
+        self.nx = int(cx.max()) + 1
+        self.ny = int(cy.max()) + 1
+
+        keys = cx * self.ny + cy
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+
+    def intersection(self, minx, miny, maxx, maxy):
+        """Finds the boxes intersecting (or touching) each of the given query boxes.
+
+        Returns:
+            tuple: two arrays with, for each intersection found, the number of the query box and the
+                number of the intersecting box
+        """
+        empty = np.empty(0, dtype=np.int64)
+        if len(self.minx) == 0 or len(minx) == 0:
+            return empty, empty
+
+        # Range of cells that can contain the lower left corner of an intersecting box
+        cx0 = np.floor((minx - self.cell_width - self.x0) / self.cell_width)
+        cx1 = np.floor((maxx - self.x0) / self.cell_width)
+        cy0 = np.floor((miny - self.cell_height - self.y0) / self.cell_height)
+        cy1 = np.floor((maxy - self.y0) / self.cell_height)
+        cx0 = np.clip(cx0, 0, self.nx - 1).astype(np.int64)
+        cx1 = np.clip(cx1, -1, self.nx - 1).astype(np.int64)
+        cy0 = np.clip(cy0, 0, self.ny - 1).astype(np.int64)
+        cy1 = np.clip(cy1, -1, self.ny - 1).astype(np.int64)
+
+        queries = []
+        items = []
+        for dx in range(int((cx1 - cx0).max()) + 1):
+            for dy in range(int((cy1 - cy0).max()) + 1):
+                q = np.nonzero((cx0 + dx <= cx1) & (cy0 + dy <= cy1))[0]
+                keys = (cx0[q] + dx) * self.ny + cy0[q] + dy
+                lo = np.searchsorted(self.sorted_keys, keys, "left")
+                counts = np.searchsorted(self.sorted_keys, keys, "right") - lo
+
+                # Expand the ranges of matching boxes into one array
+                offsets = np.repeat(lo - np.cumsum(counts) + counts, counts)
+                queries.append(np.repeat(q, counts))
+                items.append(self.order[np.arange(counts.sum()) + offsets])
+
+        if not queries:
+            return empty, empty
+        queries = np.concatenate(queries)
+        items = np.concatenate(items)
+
+        keep = (
+            (self.minx[items] <= maxx[queries])
+            & (self.maxx[items] >= minx[queries])
+            & (self.miny[items] <= maxy[queries])
+            & (self.maxy[items] >= miny[queries])
+        )
+        return queries[keep], items[keep]
+
+
+class LabelCandidateArrays(object):
+    """Structure-of-arrays representation of the label candidates of a labeling problem.
+
+    The boxes of the candidates, the points they belong to and their positions are stored as NumPy
+    arrays, so overlaps can be calculated for all candidate pairs returned by a BoxGrid index at
+    once, instead of one pair at a time through the Label and Point objects.
+
+    Args:
+        label_candidates (list): the label candidates
+        points (list): all points on the map
+        bounding_box (BoundingBox): the bounding box of the map
+    """
+
+    def __init__(self, label_candidates, points, bounding_box):
+        self.label_candidates = list(label_candidates)
+        self.points = list(points)
+        self.bounding_box = bounding_box
+
+        point_ids = {p: i for i, p in enumerate(self.points)}
+        boxes = np.array([lc.box for lc in self.label_candidates], dtype=float)
+        self.minx, self.miny, self.maxx, self.maxy = boxes.reshape(-1, 4).T
+        self.point_id = np.array(
+            [point_ids[lc.point] for lc in self.label_candidates], dtype=np.int64
+        )
+        self.base_penalty = np.array(
+            [lc.base_penalty for lc in self.label_candidates], dtype=float
+        )
+
+        self.point_x = np.array([p.x for p in self.points], dtype=float)
+        self.point_y = np.array([p.y for p in self.points], dtype=float)
+        self.point_radius = np.array([p.radius for p in self.points], dtype=float)
+
+        self.border_boxes = np.array([b.box for b in bounding_box.borders], dtype=float)
+
+        self.grid = BoxGrid(*self.boxes)
+        self._label_pairs = None
+        self._point_pairs = None
+
+    @property
+    def boxes(self):
+        return self.minx, self.miny, self.maxx, self.maxy
+
+    def label_pairs(self):
+        """Determines all pairs of overlapping candidates that belong to different points.
+
+        Each pair is included in both orders.
+
+        Returns:
+            tuple: arrays of the first candidate, the second candidate and the overlap area
+        """
+        if self._label_pairs is None:
+            i, j = self.grid.intersection(*self.boxes)
+            keep = self.point_id[i] != self.point_id[j]
+            i = i[keep]
+            j = j[keep]
+
+            overlap = overlap_areas(
+                self.minx[i], self.miny[i], self.maxx[i], self.maxy[i],
+                self.minx[j], self.miny[j], self.maxx[j], self.maxy[j],
+            )
+            keep = overlap > 0
+            self._label_pairs = i[keep], j[keep], overlap[keep]
+        return self._label_pairs
+
+    def point_pairs(self):
+        """Determines all pairs of candidates and points other than their own, whose boxes intersect.
+
+        Returns:
+            tuple: arrays of the candidate and the point
+        """
+        if self._point_pairs is None:
+            r = self.point_radius
+            k, i = self.grid.intersection(
+                self.point_x - r, self.point_y - r, self.point_x + r, self.point_y + r
+            )
+            keep = self.point_id[i] != k
+            self._point_pairs = i[keep], k[keep]
+        return self._point_pairs
+
+    def point_penalties(self):
+        """Returns the penalty for the overlap of each candidate with points other than its own."""
+        penalties = np.zeros(len(self.label_candidates))
+
+        i, k = self.point_pairs()
+
+        # Distance from the point center to the nearest point of the box
+        x = self.point_x[k]
+        y = self.point_y[k]
+        r = self.point_radius[k]
+        dx = x - np.clip(x, self.minx[i], self.maxx[i])
+        dy = y - np.clip(y, self.miny[i], self.maxy[i])
+        overlaps = dx * dx + dy * dy < r * r
+
+        np.add.at(penalties, i[overlaps], POINT_PENALTY)
+        return penalties
+
+    def border_penalties(self):
+        """Returns the penalty for candidates overlapping the bounding box border."""
+        b = self.border_boxes
+        overlap = overlap_areas(
+            self.minx[:, None], self.miny[:, None], self.maxx[:, None], self.maxy[:, None],
+            b[None, :, 0], b[None, :, 1], b[None, :, 2], b[None, :, 3],
+        )
+        return np.where((overlap > 0).any(axis=1), BBOX_PENALTY, 0.0)
+
+    def static_penalties(self):
+        """Returns the penalty of each candidate for its position and overlap with points and border."""
+        return (
+            self.base_penalty
+            + self.point_penalties()
+            + self.border_penalties()
+        )
+
+    def penalties(self):
+        """Returns the penalty of each candidate, including its overlap with all candidates of
+        other points."""
+        i, j, overlap = self.label_pairs()
+        label_penalties = np.bincount(
+            i, weights=overlap, minlength=len(self.label_candidates)
+        )
+        return self.static_penalties() + label_penalties
+
+
+def evaluate_label_candidates(label_candidates, points, bounding_box):
+    """Evaluates the penalty of all label candidates, like evaluate_labels, but vectorized.
+
+    Besides setting the penalty of each candidate, the overlapping candidates are recorded in the
+    overlapping attribute.
+
+    Args:
+        label_candidates (list): the label candidates to evaluate
+        points (list): all points on the map
+        bounding_box (BoundingBox): the bounding box of the map
+
+    Returns:
+        list: the penalty for each candidate
+    """
+    arrays = LabelCandidateArrays(label_candidates, points, bounding_box)
+    penalties = arrays.penalties().tolist()
+
+    for lc, penalty in zip(arrays.label_candidates, penalties):
+        lc.penalty = penalty
+        lc.overlapping = []
+
+    i, j, overlap = arrays.label_pairs()
+    for a, b in zip(i.tolist(), j.tolist()):
+        arrays.label_candidates[a].overlapping.append(arrays.label_candidates[b])
+
+    return penalties
+
+
+class ConflictGraph(object):
+    """Conflict graph of label candidates, which can be extended with new candidates.
+
+    Each candidate gets a static penalty (its position and its overlap with points and the bounding box border) and
+    a dict of conflicting candidates of other points, mapped to the overlap area.
+
+    The candidates are indexed in batches: the initial candidates and every set of added candidates. Adding
+    candidates only indexes the new ones, which are looked up in the indexes of the existing batches.
+
+    Args:
+        label_candidates (list): the label candidates to consider
+        points (list): all points on the map
+        bounding_box (BoundingBox): the bounding box of the map
+    """
+
+    def __init__(self, label_candidates, points, bounding_box):
+        self.points = points
+        self.bounding_box = bounding_box
+        self.batches = []
+        self.extend(label_candidates)
+
+    def extend(self, new_candidates):
+        """Adds the given candidates to the conflict graph.
+
+        The new candidates get their static penalty and conflicts. Their conflicts with the existing candidates are
+        also added to the conflicts of those candidates, so the graph stays symmetric.
+
+        Args:
+            new_candidates (list): the label candidates to add
+        """
+        if not new_candidates:
+            return
+
+        new = LabelCandidateArrays(new_candidates, self.points, self.bounding_box)
+        penalties = new.static_penalties().tolist()
+        for lc, penalty in zip(new.label_candidates, penalties):
+            lc.penalty = penalty
+            lc.conflicts = {}
+
+        i, j, overlap = new.label_pairs()
+        for a, b, o in zip(i.tolist(), j.tolist(), overlap.tolist()):
+            new.label_candidates[a].conflicts[new.label_candidates[b]] = o
+
+        for existing in self.batches:
+            i, j = existing.grid.intersection(*new.boxes)
+            keep = new.point_id[i] != existing.point_id[j]
+            i = i[keep]
+            j = j[keep]
+            overlap = overlap_areas(
+                new.minx[i], new.miny[i], new.maxx[i], new.maxy[i],
+                existing.minx[j], existing.miny[j], existing.maxx[j], existing.maxy[j],
+            )
+            keep = overlap > 0
+
+            pairs = zip(i[keep].tolist(), j[keep].tolist(), overlap[keep].tolist())
+            for a, b, o in pairs:
+                lc1 = new.label_candidates[a]
+                lc2 = existing.label_candidates[b]
+                lc1.conflicts[lc2] = o
+                lc2.conflicts[lc1] = o
+
+        self.batches.append(new)
+
+
+def build_conflict_graph(label_candidates, points, bounding_box):
+    """Builds the conflict graph for the given label candidates.
+
+    Args:
+        label_candidates (list): the label candidates to consider
+        points (list): all points on the map
+        bounding_box (BoundingBox): the bounding box of the map
+
+    Returns:
+        ConflictGraph: the conflict graph, which can be extended with new candidates
+    """
+    return ConflictGraph(label_candidates, points, bounding_box)
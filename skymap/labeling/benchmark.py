@@ -0,0 +1,379 @@
+"""
+Benchmark for the labelers.
+
+Every labeler is run on a matrix of synthetic problems of different sizes and label densities, and optionally on real
+star fields exported from the star database. For each run, the setup and run time, the peak memory use, the number of
+penalty evaluations and the final penalty are written to a JSON report, which can be compared between versions.
+"""
+import io
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import datetime
+import contextlib
+import tracemalloc
+
+import numpy as np
+
+from skymap.geometry import ensure_angle_range
+from skymap.stars.magnitude_to_size import magnitude_to_size
+from skymap.labeling import common, arrays
+from skymap.labeling.common import (
+    Point,
+    BoundingBox,
+    RandomLabeler,
+    evaluate,
+    POINT_RADIUS,
+)
+from skymap.labeling.greedy import GreedyLabeler, AdvancedGreedyLabeler
+from skymap.labeling.grasp import GraspLabeler
+from skymap.labeling.genetic import CachedGeneticLabeler
+from skymap.labeling.annealing import SimulatedAnnealingLabeler
+from skymap.labeling.partition import PartitionedLabeler
+
+
+# Labelers by name, with the keyword arguments to use. Labelers run in-process and seeded, so runs are reproducible.
+LABELERS = {
+    "random": (RandomLabeler, {}),
+    "greedy": (GreedyLabeler, {}),
+    "advanced_greedy": (AdvancedGreedyLabeler, {}),
+    "grasp": (GraspLabeler, {"processes": 1, "seed": 1}),
+    "genetic": (CachedGeneticLabeler, {"ngenerations": 50, "nindividuals": 100}),
+    "annealing": (SimulatedAnnealingLabeler, {"seed": 1}),
+    "partitioned": (
+        PartitionedLabeler,
+        {"processes": 1, "labeler_kwargs": {"seed": 1}},
+    ),
+}
+
+# Largest problem per labeler; the genetic labeler stores a penalty for every pair of candidates
+MAX_LABELS = {"genetic": 200}
+
+# Number of labels in the synthetic problems
+SIZES = (100, 400, 1600)
+
+# Map area per label for the synthetic problems
+DENSITIES = {"sparse": 20000, "dense": 5000}
+
+# Number of points per label in the synthetic problems
+POINTS_PER_LABEL = 5
+
+# Functions counted as penalty evaluations. Vectorized evaluation of all candidates counts as a single evaluation.
+EVALUATION_FUNCTIONS = (
+    (common, "evaluate_label"),
+    (common, "candidate_penalty"),
+    (common, "evaluate"),
+    (arrays, "evaluate_label_candidates"),
+    (arrays, "build_conflict_graph"),
+    (SimulatedAnnealingLabeler, "label_penalty"),
+    (CachedGeneticLabeler, "evaluate_fitness"),
+)
+
+
+class LabelingProblem(object):
+    """
+    Reproducible labeling problem.
+
+    The problem is stored as plain data, so fresh Point objects can be created for every labeler run.
+
+    Args:
+        name (str): the name of the problem
+        bounding_box (BoundingBox): the bounding box of the map
+        point_data (list): an (x, y, radius, text) tuple for each point; text is None for unlabeled points
+    """
+
+    def __init__(self, name, bounding_box, point_data):
+        self.name = name
+        self.bounding_box = bounding_box
+        self.point_data = point_data
+
+    @property
+    def npoints(self):
+        return len(self.point_data)
+
+    @property
+    def nlabels(self):
+        return len([p for p in self.point_data if p[3]])
+
+    def points(self):
+        """Returns new Point objects for the problem."""
+        return [Point(x, y, radius, text) for x, y, radius, text in self.point_data]
+
+    @classmethod
+    def synthetic(
+        cls,
+        nlabels,
+        area_per_label,
+        points_per_label=POINTS_PER_LABEL,
+        seed=1,
+        name=None,
+    ):
+        """
+        Creates a problem with uniformly distributed points on a square map.
+
+        Args:
+            nlabels (int): the number of labeled points
+            area_per_label (float): the map area per label, which determines the label density
+            points_per_label (int): the total number of points per labeled point
+            seed: the seed for the random number generator
+
+        Returns:
+            LabelingProblem: the problem
+        """
+        rng = random.Random(seed)
+        size = math.sqrt(nlabels * area_per_label)
+        npoints = nlabels * points_per_label
+
+        point_data = []
+        labeled = set(rng.sample(range(npoints), nlabels))
+        for i in range(npoints):
+            x = size * rng.random()
+            y = size * rng.random()
+            text = f"Label for point {i}" if i in labeled else None
+            point_data.append((x, y, POINT_RADIUS, text))
+
+        if name is None:
+            name = f"synthetic-{nlabels}-{area_per_label}"
+        return cls(name, BoundingBox(0, 0, size, size), point_data)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as fp:
+            data = json.load(fp)
+        point_data = [tuple(p) for p in data["points"]]
+        return cls(data["name"], BoundingBox(*data["bounding_box"]), point_data)
+
+    def save(self, filename):
+        data = {
+            "name": self.name,
+            "bounding_box": list(self.bounding_box),
+            "points": [list(p) for p in self.point_data],
+        }
+        with open(filename, "w") as fp:
+            json.dump(data, fp, ensure_ascii=False)
+
+
+def export_star_field(
+    filename,
+    center_ra,
+    center_dec,
+    width,
+    height,
+    magnitude,
+    label_magnitude,
+    scale=100,
+):
+    """
+    Exports the stars in a region of the sky as a labeling problem.
+
+    The stars are projected with a simple equirectangular projection around the center, with the right ascension
+    increasing to the left. Stars brighter than the label magnitude that have a proper name or Bayer designation are
+    labeled.
+
+    Args:
+        filename (str): the JSON file to write the problem to
+        center_ra (float): the right ascension of the center of the field, in degrees
+        center_dec (float): the declination of the center of the field, in degrees
+        width (float): the width of the field, in degrees
+        height (float): the height of the field, in degrees
+        magnitude (float): the faintest magnitude to include
+        label_magnitude (float): the faintest magnitude to label
+        scale (float): the number of map units per degree
+    """
+    # Only needed for exporting, so the benchmark itself runs without the star database
+    from skymap.stars.stars import select_stars
+
+    cos_dec = math.cos(math.radians(center_dec))
+    ra_range = (
+        center_ra - 0.5 * width / cos_dec,
+        center_ra + 0.5 * width / cos_dec,
+    )
+    dec_range = (center_dec - 0.5 * height, center_dec + 0.5 * height)
+
+    point_data = []
+    for star in select_stars(magnitude, ra_range=ra_range, dec_range=dec_range):
+        ra = ensure_angle_range(star.right_ascension, center_ra)
+        x = scale * (0.5 * width - (ra - center_ra) * cos_dec)
+        y = scale * (star.declination - dec_range[0])
+        radius = 0.5 * magnitude_to_size(star.magnitude, mm_per_degree=scale)
+
+        text = None
+        if star.magnitude <= label_magnitude:
+            text = star.proper_name or star.bayer or None
+        point_data.append((x, y, radius, text))
+
+    name = f"stars-{center_ra}-{center_dec}-{magnitude}"
+    bounding_box = BoundingBox(0, 0, scale * width, scale * height)
+    LabelingProblem(name, bounding_box, point_data).save(filename)
+
+
+@contextlib.contextmanager
+def count_calls(functions):
+    """
+    Counts the calls of the given functions within the context.
+
+    The functions are replaced by counting wrappers in their owner, and in all labeling modules that imported them.
+
+    Args:
+        functions (list): (owner, function name) pairs, where the owner is a module or a class
+
+    Yields:
+        list: a list containing the number of calls, updated in place
+    """
+    counter = [0]
+    patched = []
+
+    def wrap(original):
+        def wrapper(*args, **kwargs):
+            counter[0] += 1
+            return original(*args, **kwargs)
+
+        return wrapper
+
+    modules = [
+        m for name, m in sys.modules.items() if name.startswith("skymap.labeling")
+    ]
+    for owner, name in functions:
+        original = getattr(owner, name)
+        wrapper = wrap(original)
+        for namespace in [owner] + modules:
+            for attribute, value in list(vars(namespace).items()):
+                if value is original:
+                    patched.append((namespace, attribute, original))
+                    setattr(namespace, attribute, wrapper)
+    try:
+        yield counter
+    finally:
+        for namespace, attribute, original in reversed(patched):
+            setattr(namespace, attribute, original)
+
+
+def run_labeler(labeler_name, problem, instrument=False):
+    """
+    Runs a labeler on the given problem.
+
+    Args:
+        labeler_name (str): the name of the labeler in LABELERS
+        problem (LabelingProblem): the problem to solve
+        instrument (bool): whether to measure peak memory and count penalty evaluations, which slows down the run
+
+    Returns:
+        dict: the results of the run
+    """
+    labeler_class, kwargs = LABELERS[labeler_name]
+    points = problem.points()
+
+    # Some labelers use the global random number generator
+    random.seed(1)
+
+    if instrument:
+        tracemalloc.start()
+    calls = contextlib.nullcontext([None])
+    if instrument:
+        calls = count_calls(EVALUATION_FUNCTIONS)
+
+    with calls as counter, contextlib.redirect_stdout(io.StringIO()):
+        t1 = time.perf_counter()
+        labeler = labeler_class(points, problem.bounding_box, **kwargs)
+        t2 = time.perf_counter()
+        labeler.run()
+        t3 = time.perf_counter()
+
+    peak_memory = None
+    if instrument:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "labeler": labeler_name,
+        "problem": problem.name,
+        "points": problem.npoints,
+        "labels": problem.nlabels,
+        "setup_time": t2 - t1,
+        "run_time": t3 - t2,
+        "peak_memory": peak_memory,
+        "evaluations": counter[0],
+        "penalty": evaluate(points, problem.bounding_box),
+        "labeled": len([p for p in points if p.label is not None]),
+    }
+
+
+def run_benchmark(problems, labelers=None, verbose=False):
+    """
+    Runs the labelers on all problems.
+
+    Each combination is run twice: once for the timing, and once instrumented for the memory use and the number of
+    evaluations.
+
+    Args:
+        problems (list): the LabelingProblems to solve
+        labelers (list): the names of the labelers to run; all labelers by default
+        verbose (bool): whether to print the results to stdout
+
+    Returns:
+        dict: the report, containing the environment and a list of results
+    """
+    if labelers is None:
+        labelers = list(LABELERS)
+
+    results = []
+    for problem in problems:
+        for labeler_name in labelers:
+            if problem.nlabels > MAX_LABELS.get(labeler_name, problem.nlabels):
+                continue
+
+            result = run_labeler(labeler_name, problem)
+            instrumented = run_labeler(labeler_name, problem, instrument=True)
+            result["peak_memory"] = instrumented["peak_memory"]
+            result["evaluations"] = instrumented["evaluations"]
+            results.append(result)
+
+            if verbose:
+                print(
+                    f"{problem.name:30} {labeler_name:16} "
+                    f"{result['setup_time'] + result['run_time']:8.2f} s "
+                    f"{result['peak_memory'] / 1e6:8.1f} MB "
+                    f"{result['evaluations']:10} evaluations "
+                    f"penalty {result['penalty']:10.1f}"
+                )
+
+    return {
+        "created": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "results": results,
+    }
+
+
+def synthetic_problems(sizes=SIZES, densities=DENSITIES):
+    """Returns the matrix of synthetic problems, for the given numbers of labels and densities."""
+    return [
+        LabelingProblem.synthetic(
+            nlabels, area_per_label, name=f"synthetic-{nlabels}-{density}"
+        )
+        for nlabels in sizes
+        for density, area_per_label in densities.items()
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the labelers")
+    parser.add_argument("output", help="the JSON file to write the report to")
+    parser.add_argument("--labelers", nargs="+", choices=list(LABELERS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=SIZES)
+    parser.add_argument(
+        "--star-fields", nargs="+", default=[], help="exported star fields to include"
+    )
+    args = parser.parse_args()
+
+    problems = synthetic_problems(args.sizes)
+    problems.extend(LabelingProblem.load(f) for f in args.star_fields)
+
+    report = run_benchmark(problems, args.labelers, verbose=True)
+    with open(args.output, "w") as fp:
+        json.dump(report, fp, indent=2)
@@ -1,6 +1,5 @@
 import math
 import random
-import time
 from rtree.index import Index
 
 
@@ -14,6 +13,16 @@ CHAR_HEIGHT = 1.5 * MM_PER_POINT * POINTSIZE
 POINT_PENALTY = 10
 BBOX_PENALTY = 20
 POSITION_WEIGHT = 0.1
+SLIDE_WEIGHT = 0.2
+STEP_WEIGHT = 0.2
+
+# Extra label candidates: slides along the side of the point, as a fraction of the label size, and offset steps
+LABEL_SLIDES = (-0.5, -0.25, 0.25, 0.5)
+LABEL_STEPS = (1,)
+LABEL_STEP_SIZE = 0.5 * CHAR_HEIGHT
+
+# Number of decimals of the position in the key of a point without identifier
+KEY_DECIMALS = 2
 
 
 def create_bounding_box_borders(bounding_box):
@@ -46,13 +55,10 @@ def create_bounding_box_borders(bounding_box):
     return [BoundingBoxBorder(b) for b in border_boxes]
 
 
-def evaluate_label(label, items, idx, selected_only=False):
-    penalty = POSITION_WEIGHT * label.position
-    intersecting_item_ids = idx.intersection(label.box)
+def evaluate_label(label, index, selected_only=False):
+    penalty = label.base_penalty
     bbox_counted = False
-    for item_id in intersecting_item_ids:
-        item = items[item_id]
-
+    for item in index.intersection(label.box):
         if item == label or item == label.point:
             continue
 
@@ -72,90 +78,178 @@ def evaluate_label(label, items, idx, selected_only=False):
     return penalty
 
 
-def evaluate_labels(labels, points, bounding_box):
-    items = []
-    items.extend(labels)
-    items.extend(points)
-    items.extend(bounding_box.borders)
-
-    t1 = time.perf_counter()
-    idx = Index()
+def evaluate_labels(labels, points, bounding_box, index=None):
+    """Evaluates the penalty of each of the given labels.
 
-    for i, item in enumerate(items):
-        item.index = i
-        idx.insert(i, item.box)
+    Args:
+        labels (list): the labels to evaluate
+        points (list): all points on the map
+        bounding_box (BoundingBox): the bounding box of the map
+        index (LabelIndex): an existing index containing the labels, points and bounding box borders
 
-    t2 = time.perf_counter()
-    # print(f"Index creation: {t2-t1}")
+    Returns:
+        list: the penalty for each label
+    """
+    if index is None:
+        index = LabelIndex(labels, points, bounding_box)
 
     # Update penalties for overlap with other objects
-    penalties = [evaluate_label(l, items, idx) for l in labels]
+    return [evaluate_label(l, index) for l in labels]
 
-    t3 = time.perf_counter()
-    # print(f"Overlap checking: {t3 - t2}")
 
-    print(f"Total time: {t3 - t1}")
-    return penalties
-
-
-def evaluate(points, bounding_box):
+def evaluate(points, bounding_box, drop_penalty=None):
     labels = [p.label for p in points if p.label]
     penalties = evaluate_labels(labels, points, bounding_box)
 
     total_penalty = sum(penalties)
 
+    # Labels left out by a labeler that may drop labels
+    if drop_penalty is not None:
+        total_penalty += sum(
+            drop_penalty * p.priority for p in points if p.text and not p.label
+        )
+
     return total_penalty
 
 
-def local_search(points, bounding_box, iterations):
-    labeled_points = [p for p in points if p.text]
+def label_priority(magnitude, proper_name=False, faintest_magnitude=10):
+    """Returns the label priority for a star: brighter stars, and stars with a proper name, get a higher priority.
+
+    Args:
+        magnitude (float): the magnitude of the star
+        proper_name (bool): whether the label is the proper name of the star
+        faintest_magnitude (float): the magnitude that gets priority 1
 
-    items = []
-    items.extend([p.label for p in labeled_points])
-    items.extend(points)
-    items.extend(bounding_box.borders)
+    Returns:
+        float: the priority
+    """
+    priority = 1 + max(0, faintest_magnitude - magnitude)
+    if proper_name:
+        priority *= 2
+    return priority
 
-    idx = Index()
-    for i, item in enumerate(items):
-        item.index = i
-        idx.insert(item.index, item.box)
+
+def candidate_penalty(label, index):
+    """Returns the penalty of the given candidate, for its position and overlap with the indexed items."""
+    penalty = label.base_penalty
+
+    # Check overlap with other labels and points
+    for item in index.intersection(label.box):
+        if hasattr(item, "point") and label.point == item.point:
+            continue
+        penalty += item.overlap(label)
+    return penalty
+
+
+def local_search(points, bounding_box, iterations, free_points=None):
+    labeled_points = [p for p in points if p.text]
+    index = LabelIndex([p.label for p in labeled_points], points, bounding_box)
+
+    # Only move the labels of the free points, if given
+    if free_points is not None:
+        labeled_points = [p for p in labeled_points if p in free_points]
 
     for i in range(iterations):
         for lp in labeled_points:
             best_candidate = None
             min_penalty = None
             for lc1 in lp.label_candidates:
-                penalty = POSITION_WEIGHT * lc1.position
-
-                # Check overlap with other labels and points
-                intersecting_item_ids = idx.intersection(lc1.box)
-                for item_id in intersecting_item_ids:
-                    item = items[item_id]
-                    if hasattr(item, "point") and lc1.point == item.point:
-                        continue
-                    penalty += item.overlap(lc1)
-
+                penalty = candidate_penalty(lc1, index)
                 if min_penalty is None or penalty < min_penalty:
                     min_penalty = penalty
                     best_candidate = lc1
 
-            # Remove the old label from the index
-            idx.delete(lp.label.index, lp.label.box)
-
-            # Select the new label
+            # Move the label in the index to the new candidate
+            old_label = lp.label
             best_candidate.select()
+            index.replace(old_label, best_candidate)
+
 
-            # Add the new label to the index and item list
-            idx.insert(len(items), lp.label.box)
-            items.append(lp.label)
+def extend_assigned_points(points, assignment):
+    """Generates the extra candidates of the points that have an extra candidate in the given assignment.
+
+    The extra candidates are generated in a fixed order, so they get the same index again. Labelers that build a
+    conflict graph or penalty cache must do this before building it, so the extra candidates are part of it.
+
+    Args:
+        points (list): the points on the map
+        assignment (dict): the selected candidate index for each point key
+
+    Returns:
+        list: the new label candidates
+    """
+    new_candidates = []
+    for p in points:
+        if not p.text:
+            continue
+        label_index = assignment.get(p.key)
+        if label_index is not None and label_index >= len(p.label_candidates):
+            new_candidates.extend(p.extend_labels())
+    return new_candidates
+
+
+def apply_assignment(points, assignment):
+    """Selects the labels of the given assignment.
+
+    Args:
+        points (list): the points on the map
+        assignment (dict): the selected candidate index for each point key
+
+    Returns:
+        list: the labeled points that are not in the assignment
+    """
+    extend_assigned_points(points, assignment)
+    unassigned = []
+    for p in points:
+        if not p.text:
+            continue
+        label_index = assignment.get(p.key)
+        if label_index is None:
+            unassigned.append(p)
+            continue
+        p.label_candidates[label_index].select()
+    return unassigned
 
 
 class Label(object):
-    def __init__(self, point, text, position, offset, fontsize=POINTSIZE, fill="white", angle=0, color="black"):
+    """Label candidate for a point.
+
+    The position (0-7) is the direction of the label from the point, counterclockwise starting at the right. Labels
+    to the right, left, top or bottom of the point can be slid along that side, by a fraction of the label size, and
+    all labels can be moved away from the point in steps.
+
+    Args:
+        point (LabelableObject): the point to label
+        text (str): the label text
+        position (int): the position of the label around the point
+        offset (float): the distance between the point and the label
+        slide (float): the fraction of the label size to slide the label along the side of the point
+        step (int): the number of steps to move the label away from the point
+    """
+
+    def __init__(
+        self,
+        point,
+        text,
+        position,
+        offset,
+        fontsize=POINTSIZE,
+        fill="white",
+        angle=0,
+        color="black",
+        slide=0,
+        step=0,
+    ):
         self.index = None
+        self.candidate_index = None
         self.point = point
         self.text = text
         self.position = position
+        self.slide = slide
+        self.step = step
+        self.base_penalty = (
+            POSITION_WEIGHT * position + SLIDE_WEIGHT * abs(slide) + STEP_WEIGHT * step
+        )
         self.fontsize = fontsize
         self.fill = fill
         self.angle = angle
@@ -163,9 +257,11 @@ class Label(object):
         self.penalty = position
         self.overlapping = []
         self.label_penalties = None
+        self.conflicts = {}
 
         width = AVG_CHAR_WIDTH * len(text)
         height = CHAR_HEIGHT
+        offset += step * LABEL_STEP_SIZE
         angle_offset = offset / math.sqrt(2)
 
         if position == 0:
@@ -209,6 +305,14 @@ class Label(object):
             self.miny = self.point.y - self.point.radius - angle_offset - height
             self.maxy = self.point.y - self.point.radius - angle_offset
 
+        if slide:
+            if position in (0, 4):
+                self.miny += slide * height
+                self.maxy += slide * height
+            elif position in (2, 6):
+                self.minx += slide * width
+                self.maxx += slide * width
+
     def overlap(self, other, record=False):
         left = max(self.minx, other.box[0])
         right = min(self.maxx, other.box[2])
@@ -228,7 +332,7 @@ class Label(object):
             if other not in self.overlapping:
                 self.overlapping.append(other)
             if self not in other.overlapping:
-                other.overlapping.append(other)
+                other.overlapping.append(self)
 
         return w * h
 
@@ -239,11 +343,11 @@ class Label(object):
         return (self.maxx - self.minx) * (self.maxy - self.miny)
 
     def select(self):
-        self.point.label_index = self.position
+        self.point.label_index = self.candidate_index
 
     @property
     def selected(self):
-        return self.point.label_index == self.position
+        return self.point.label_index == self.candidate_index
 
     @property
     def box(self):
@@ -263,6 +367,7 @@ class LabelableObject(object):
 
         self.label_candidates = []
         self.label_index = None
+        self.extended = False
 
         if text:
             self.build_labels()
@@ -277,19 +382,64 @@ class LabelableObject(object):
             return self.label_candidates[self.label_index]
         return None
 
+    def add_label(self, position, slide=0, step=0):
+        label = Label(
+            self, self.text, position, self.label_offset, slide=slide, step=step
+        )
+        label.candidate_index = len(self.label_candidates)
+        self.label_candidates.append(label)
+        return label
+
     def build_labels(self):
         for i in range(8):
-            self.label_candidates.append(Label(self, self.text, i, self.label_offset))
+            self.add_label(i)
+
+    def extend_labels(self, slides=LABEL_SLIDES, steps=LABEL_STEPS):
+        """Adds extra label candidates, slid along the sides of the point and further away from it.
+
+        Extra candidates are only generated once, so they can be added on demand for points in conflict.
+
+        Returns:
+            list: the new label candidates
+        """
+        if self.extended or not self.text:
+            return []
+        self.extended = True
+
+        labels = []
+        for position in (0, 2, 4, 6):
+            for slide in slides:
+                labels.append(self.add_label(position, slide=slide))
+        for step in steps:
+            for position in range(8):
+                labels.append(self.add_label(position, step=step))
+        return labels
 
 
 class Point(LabelableObject):
-    def __init__(self, x, y, radius, text=None, label_offset=0):
+    def __init__(
+        self, x, y, radius, text=None, label_offset=0, identifier=None, priority=1
+    ):
         self.x = x
         self.y = y
         self.radius = radius
+        self.identifier = identifier
+        self.priority = priority
 
         LabelableObject.__init__(self, text, label_offset)
 
+    @property
+    def key(self):
+        """Returns the key identifying the point between runs: its identifier, or else its label text and rounded
+        position, as the same text (like a Bayer letter) can label several points."""
+        if self.identifier is not None:
+            return self.identifier
+        if self.text is None:
+            return None
+        x = round(self.x, KEY_DECIMALS)
+        y = round(self.y, KEY_DECIMALS)
+        return f"{self.text}@{x!r},{y!r}"
+
     @property
     def box(self):
         return (
@@ -338,6 +488,9 @@ class BoundingBox(tuple):
     def __new__(self, x1, y1, x2, y2):
         return tuple.__new__(BoundingBox, (x1, y1, x2, y2))
 
+    def __getnewargs__(self):
+        return tuple(self)
+
     @property
     def box(self):
         return self
@@ -364,6 +517,50 @@ class BoundingBoxBorder(object):
         return 0
 
 
+class LabelIndex(object):
+    """R-tree index of the objects in a labeling problem: labels, points and bounding box borders.
+
+    The index is bulk loaded using the rtree stream loader. Each item gets a stable id, which is
+    stored in its index attribute. A label can be replaced in place by another one (typically another
+    candidate for the same point), which takes over its id.
+
+    Args:
+        labels (list): the labels to index
+        points (list): all points on the map
+        bounding_box (BoundingBox): the bounding box of the map
+    """
+
+    def __init__(self, labels, points, bounding_box):
+        self.items = []
+        self.items.extend(labels)
+        self.items.extend(points)
+        self.items.extend(bounding_box.borders)
+
+        for i, item in enumerate(self.items):
+            item.index = i
+
+        self.idx = Index((i, item.box, None) for i, item in enumerate(self.items))
+
+    def intersection(self, box):
+        """Returns the items whose bounding box intersects the given box."""
+        return [self.items[i] for i in self.idx.intersection(box)]
+
+    def update(self, item, old_box):
+        """Moves the item in the index, after its box has changed from the given old box."""
+        self.idx.delete(item.index, old_box)
+        self.idx.insert(item.index, item.box)
+
+    def replace(self, old_item, new_item):
+        """Replaces the given item by a new item, which takes over its id."""
+        if new_item is old_item:
+            return
+        i = old_item.index
+        self.idx.delete(i, old_item.box)
+        self.items[i] = new_item
+        new_item.index = i
+        self.idx.insert(i, new_item.box)
+
+
 class RandomLabeler(object):
     def __init__(self, points, bounding_box):
         self.points = points
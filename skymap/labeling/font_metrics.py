@@ -0,0 +1,259 @@
+import os
+import functools
+
+from fontTools.ttLib import TTFont
+from fontTools.pens.boundsPen import BoundsPen
+
+from skymap.tikz.tikz import BASEDIR
+
+
+FONT_FOLDER = os.path.join(BASEDIR, "resources", "font")
+MM_PER_POINT = 25.4 / 72.27
+
+# Point sizes of the LaTeX fontsize commands, per class option, as set by the article class and tikz_base.j2
+LATEX_FONTSIZES = {
+    10: {
+        "nano": 3,
+        "miniscule": 4,
+        "tiny": 5,
+        "scriptsize": 7,
+        "footnotesize": 8,
+        "small": 9,
+        "normalsize": 10,
+        "large": 12,
+        "Large": 14.4,
+        "LARGE": 17.28,
+        "huge": 20.74,
+        "Huge": 24.88,
+        "HUGE": 45,
+    },
+    11: {
+        "nano": 4,
+        "miniscule": 5,
+        "tiny": 6,
+        "scriptsize": 8,
+        "footnotesize": 9,
+        "small": 10,
+        "normalsize": 10.95,
+        "large": 12,
+        "Large": 14.4,
+        "LARGE": 17.28,
+        "huge": 20.74,
+        "Huge": 24.88,
+    },
+    12: {
+        "nano": 4,
+        "miniscule": 5,
+        "tiny": 6,
+        "scriptsize": 8,
+        "footnotesize": 10,
+        "small": 10.95,
+        "normalsize": 12,
+        "large": 14.4,
+        "Large": 17.28,
+        "LARGE": 20.74,
+        "huge": 24.88,
+        "Huge": 24.88,
+    },
+}
+
+# Replacements done by fontspec's Ligatures=TeX
+TEX_LIGATURES = (("---", "—"), ("--", "–"), ("``", "“"), ("''", "”"))
+
+
+def latex_fontsize(fontsize, normalsize=11):
+    """
+    Returns the point size for the given LaTeX fontsize name.
+
+    Args:
+        fontsize (str): the LaTeX fontsize name, or 'normal' for normalsize
+        normalsize (int): the point size of the document class option (10, 11 or 12)
+
+    Returns:
+        float: the point size
+    """
+    if fontsize == "normal":
+        fontsize = "normalsize"
+    return LATEX_FONTSIZES[normalsize][fontsize]
+
+
+def find_font(family, style="Regular", folder=FONT_FOLDER):
+    """
+    Finds the font file for the given font family and style in the given folder.
+
+    Args:
+        family (str): the font family name, as used by fontspec
+        style (str): the style name
+        folder (str): the folder containing the font files
+
+    Returns:
+        str: the path of the font file
+    """
+    for filename in sorted(os.listdir(folder)):
+        if not filename.lower().endswith((".otf", ".ttf")):
+            continue
+        path = os.path.join(folder, filename)
+        names = TTFont(path, lazy=True)["name"]
+        font_style = names.getDebugName(2)
+        families = [names.getDebugName(1)]
+
+        # The typographic family and subfamily, e.g. Myriad Pro and Bold SemiCondensed, give the full family name
+        # without abbreviations, e.g. Myriad Pro SemiCondensed
+        typographic_family = names.getDebugName(16)
+        typographic_style = names.getDebugName(17)
+        if typographic_family and typographic_style:
+            width = typographic_style
+            if width.startswith(font_style):
+                width = width[len(font_style) :]
+            families.append(f"{typographic_family} {width.strip()}".strip())
+
+        if family in families and font_style == style:
+            return path
+    raise ValueError(f"Font {family} {style} not found in {folder}")
+
+
+@functools.lru_cache(maxsize=None)
+def font_metrics(family, style="Regular"):
+    """Returns the (cached) FontMetrics for the given font family and style."""
+    return FontMetrics(find_font(family, style))
+
+
+class FontMetrics(object):
+    """
+    Text metrics for an OpenType font, for determining label sizes without running XeLaTeX.
+
+    The width of a text is the sum of the glyph advances, adjusted by the pair kerning in the GPOS table. The height
+    and depth are determined from the bounding boxes of the glyphs, like XeTeX does. The default ligatures and the
+    proportional lining numbers used in tikz_base.j2 are applied first. Glyph metrics are cached, so measuring many
+    labels only costs a few dict lookups per character.
+
+    Args:
+        filename (str): the path of the font file
+        features (tuple): the GSUB features to apply
+    """
+
+    def __init__(self, filename, features=("lnum", "pnum", "liga")):
+        self.font = TTFont(filename)
+        self.units_per_em = self.font["head"].unitsPerEm
+        self.cmap = self.font.getBestCmap()
+        self.hmtx = self.font["hmtx"]
+        self.glyph_set = self.font.getGlyphSet()
+
+        self.single_substitutions = {}
+        self.ligatures = {}
+        for lookup in self._lookups("GSUB", features):
+            for subtable in self._subtables(lookup):
+                if lookup.LookupType == 1:
+                    for glyph, substitute in subtable.mapping.items():
+                        self.single_substitutions.setdefault(glyph, substitute)
+                elif lookup.LookupType == 4:
+                    for glyph, ligatures in subtable.ligatures.items():
+                        self.ligatures.setdefault(glyph, []).extend(ligatures)
+
+        self.kerning_subtables = [
+            subtable
+            for lookup in self._lookups("GPOS", ("kern",))
+            for subtable in self._subtables(lookup)
+            if lookup.LookupType == 2
+        ]
+
+        self._bounds = {}
+        self._kerning = {}
+
+    def _lookups(self, tag, features):
+        if tag not in self.font:
+            return []
+        table = self.font[tag].table
+        indices = set()
+        for record in table.FeatureList.FeatureRecord:
+            if record.FeatureTag in features:
+                indices.update(record.Feature.LookupListIndex)
+        return [table.LookupList.Lookup[i] for i in sorted(indices)]
+
+    @staticmethod
+    def _subtables(lookup):
+        for subtable in lookup.SubTable:
+            # Unwrap extension subtables
+            yield getattr(subtable, "ExtSubTable", subtable)
+
+    def glyphs(self, text):
+        """Returns the glyph names for the given text, after applying the substitutions."""
+        for tex, char in TEX_LIGATURES:
+            text = text.replace(tex, char)
+
+        glyphs = []
+        for c in text:
+            glyph = self.cmap.get(ord(c), ".notdef")
+            glyphs.append(self.single_substitutions.get(glyph, glyph))
+
+        result = []
+        i = 0
+        while i < len(glyphs):
+            for ligature in self.ligatures.get(glyphs[i], []):
+                n = len(ligature.Component)
+                if glyphs[i + 1 : i + 1 + n] == ligature.Component:
+                    result.append(ligature.LigGlyph)
+                    i += n + 1
+                    break
+            else:
+                result.append(glyphs[i])
+                i += 1
+        return result
+
+    def bounds(self, glyph):
+        """Returns the bounding box of the given glyph in font units, or None for an empty glyph."""
+        if glyph not in self._bounds:
+            pen = BoundsPen(self.glyph_set)
+            self.glyph_set[glyph].draw(pen)
+            self._bounds[glyph] = pen.bounds
+        return self._bounds[glyph]
+
+    def kerning(self, left, right):
+        """Returns the kerning between the given glyphs in font units."""
+        pair = (left, right)
+        if pair not in self._kerning:
+            self._kerning[pair] = self._find_kerning(left, right)
+        return self._kerning[pair]
+
+    def _find_kerning(self, left, right):
+        for subtable in self.kerning_subtables:
+            if left not in subtable.Coverage.glyphs:
+                continue
+            if subtable.Format == 1:
+                pair_set = subtable.PairSet[subtable.Coverage.glyphs.index(left)]
+                for record in pair_set.PairValueRecord:
+                    if record.SecondGlyph == right:
+                        return getattr(record.Value1, "XAdvance", 0) or 0
+            elif subtable.Format == 2:
+                class1 = subtable.ClassDef1.classDefs.get(left, 0)
+                class2 = subtable.ClassDef2.classDefs.get(right, 0)
+                record = subtable.Class1Record[class1].Class2Record[class2]
+                return getattr(record.Value1, "XAdvance", 0) or 0
+        return 0
+
+    def text_size(self, text, pointsize):
+        """
+        Calculates the size of the box of the given text.
+
+        Args:
+            text (str): the text
+            pointsize (float): the font size in (TeX) points
+
+        Returns:
+            tuple: the width, height above the baseline and depth below the baseline of the text, in mm
+        """
+        glyphs = self.glyphs(text)
+
+        width = sum(self.hmtx[g][0] for g in glyphs)
+        width += sum(self.kerning(g1, g2) for g1, g2 in zip(glyphs[:-1], glyphs[1:]))
+
+        height = 0
+        depth = 0
+        for g in glyphs:
+            b = self.bounds(g)
+            if b is not None:
+                height = max(height, b[3])
+                depth = max(depth, -b[1])
+
+        scale = pointsize * MM_PER_POINT / self.units_per_em
+        return width * scale, height * scale, depth * scale
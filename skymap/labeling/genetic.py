@@ -1,16 +1,16 @@
 import random
 import numpy
 from deap import base, creator, tools, algorithms
-from rtree.index import Index
 import matplotlib.pyplot as plt
 
 from skymap.labeling.common import (
     evaluate_label,
-    POSITION_WEIGHT,
     BoundingBoxBorder,
     Label,
+    LabelIndex,
     local_search,
     evaluate,
+    extend_assigned_points,
 )
 
 
@@ -184,31 +184,44 @@ def eaSimpleStop(
 
 
 class BaseGeneticLabeler(object):
-    def __init__(self, points, bounding_box):
+    def __init__(
+        self,
+        points,
+        bounding_box,
+        ngenerations=300,
+        nindividuals=400,
+        initial_assignment=None,
+    ):
         self.points = points
         self.bounding_box = bounding_box
         self.labeled_points = [p for p in self.points if p.text]
         for i, lp in enumerate(self.labeled_points):
             lp.labeled_point_index = i
 
+        # The extra candidates of the initial assignment must be part of the penalty cache
+        if initial_assignment is not None:
+            extend_assigned_points(self.labeled_points, initial_assignment)
+
         # DEAP parameters
-        self.ngenerations = 300
+        self.ngenerations = ngenerations
         self.stopn = 10
-        self.nindividuals = 400
+        self.nindividuals = nindividuals
+        self.initial_assignment = initial_assignment
+        self.seeded_fraction = 0.1
         self.mutation_prob = 0.35
         self.crossover_prob = 0.9
 
         creator.create("FitnessMax", base.Fitness, weights=(1.0,))
         creator.create("Individual", list, fitness=creator.FitnessMax)
 
+        # The highest candidate index of every point, which differs for points with extra candidates
+        self.max_label_indices = [
+            len(lp.label_candidates) - 1 for lp in self.labeled_points
+        ]
+
         self.toolbox = base.Toolbox()
-        self.toolbox.register("attr_bool", random.randint, 0, 7)
         self.toolbox.register(
-            "individual",
-            tools.initRepeat,
-            creator.Individual,
-            self.toolbox.attr_bool,
-            len(self.labeled_points),
+            "individual", tools.initIterate, creator.Individual, self.random_assignment
         )
         self.toolbox.register(
             "population", tools.initRepeat, list, self.toolbox.individual
@@ -216,11 +229,23 @@ class BaseGeneticLabeler(object):
 
         self.toolbox.register("evaluate", self.evaluate_fitness)
         self.toolbox.register("mate", tools.cxTwoPoint)
-        self.toolbox.register("mutate", tools.mutUniformInt, low=0, up=7, indpb=0.05)
+        self.toolbox.register(
+            "mutate",
+            tools.mutUniformInt,
+            low=0,
+            up=self.max_label_indices,
+            indpb=0.05,
+        )
         self.toolbox.register("select", tools.selTournament, tournsize=3)
 
+    def random_assignment(self):
+        """Returns a random candidate index for every labeled point."""
+        return [random.randint(0, up) for up in self.max_label_indices]
+
     def run(self):
         pop = self.toolbox.population(n=self.nindividuals)
+        if self.initial_assignment is not None:
+            self.seed_population(pop)
         hof = tools.HallOfFame(1)
         stats = tools.Statistics(lambda ind: ind.fitness.values)
         stats.register("avg", numpy.mean)
@@ -251,6 +276,20 @@ class BaseGeneticLabeler(object):
         local_search(self.points, self.bounding_box, 5)
         print("Penalty after local search: ", evaluate(self.points, self.bounding_box))
 
+    def seed_population(self, population):
+        """Replaces part of the population by (mutations of) the initial assignment."""
+        initial = []
+        for lp in self.labeled_points:
+            label_index = self.initial_assignment.get(lp.key)
+            if label_index is None:
+                label_index = random.randrange(len(lp.label_candidates))
+            initial.append(label_index)
+        nseeded = max(1, int(self.seeded_fraction * len(population)))
+        for i, individual in enumerate(population[:nseeded]):
+            individual[:] = initial
+            if i > 0:
+                self.toolbox.mutate(individual)
+
     def plot(self, logbook):
         gen = logbook.select("gen")
         fit_mins = logbook.select("min")
@@ -306,33 +345,31 @@ class BaseGeneticLabeler(object):
 
 
 class CachedGeneticLabeler(BaseGeneticLabeler):
-    def __init__(self, points, bounding_box):
-        BaseGeneticLabeler.__init__(self, points, bounding_box)
+    def __init__(
+        self,
+        points,
+        bounding_box,
+        ngenerations=300,
+        nindividuals=400,
+        initial_assignment=None,
+    ):
+        BaseGeneticLabeler.__init__(
+            self, points, bounding_box, ngenerations, nindividuals, initial_assignment
+        )
         self.build_cache()
 
     def build_cache(self):
         label_candidates = []
         for p in self.points:
             label_candidates.extend(p.label_candidates)
-        items = []
-        items.extend(label_candidates)
-        items.extend(self.points)
-        items.extend(self.bounding_box.borders)
-
-        idx = Index()
-        for i, item in enumerate(items):
-            item.index = i
-            idx.insert(i, item.box)
+        index = LabelIndex(label_candidates, self.points, self.bounding_box)
 
         for lc in label_candidates:
-            lc.penalty = POSITION_WEIGHT * lc.position
+            lc.penalty = lc.base_penalty
             lc.label_penalties = [0 for i in range(len(label_candidates))]
-            intersecting_item_ids = idx.intersection(lc.box)
             bbox_counted = False
 
-            for item_id in intersecting_item_ids:
-                item = items[item_id]
-
+            for item in index.intersection(lc.box):
                 if item == lc or item == lc.point:
                     continue
 
@@ -1,12 +1,133 @@
-from skymap.labeling.greedy import AdvancedGreedyLabeler
-from skymap.labeling.common import local_search
+import random
+from multiprocessing import Pool
 
+from skymap.labeling.greedy import GreedyLabeler
+from skymap.labeling.common import local_search, evaluate
 
-class GraspLabeler(AdvancedGreedyLabeler):
-    def __init__(self, points, bounding_box, iterations=5):
-        AdvancedGreedyLabeler.__init__(self, points, bounding_box)
+
+# Problem data for the worker processes, set once per worker by the pool initializer
+_worker_points = None
+_worker_bounding_box = None
+_worker_penalties = None
+
+
+def _init_worker(points, bounding_box, penalties):
+    global _worker_points, _worker_bounding_box, _worker_penalties
+    _worker_points = points
+    _worker_bounding_box = bounding_box
+    _worker_penalties = penalties
+
+
+def _run_restart(args):
+    seed, alpha, iterations = args
+    return grasp_restart(
+        _worker_points, _worker_bounding_box, _worker_penalties, seed, alpha, iterations
+    )
+
+
+def grasp_restart(points, bounding_box, penalties, seed, alpha, iterations):
+    """Performs a single GRASP iteration: a randomized greedy construction followed by local search.
+
+    The construction is greedy on the candidate penalties, but each penalty is perturbed by a random
+    factor between 1 and 1 + alpha, so every restart explores a different greedy order.
+
+    Args:
+        points (list): the points to label
+        bounding_box (BoundingBox): the bounding box of the map
+        penalties (list): the evaluated penalty of each label candidate of the labeled points
+        seed: the seed for the random number generator of this restart
+        alpha (float): the amount of randomization; 0 gives the plain greedy solution
+        iterations (int): the number of local search iterations
+
+    Returns:
+        tuple: the total penalty and the selected candidate index for each labeled point
+    """
+    rng = random.Random(seed)
+    labeled_points = [p for p in points if p.text]
+
+    label_candidates = []
+    for lp in labeled_points:
+        lp.label_index = None
+        label_candidates.extend(lp.label_candidates)
+
+    keys = []
+    for lc, penalty in zip(label_candidates, penalties):
+        keys.append((penalty * (1 + alpha * rng.random()), rng.random(), lc))
+
+    keys.sort(key=lambda k: k[:2])
+    for key in keys:
+        lc = key[2]
+        if lc.point.label_index is None:
+            lc.select()
+
+    local_search(points, bounding_box, iterations)
+
+    penalty = evaluate(points, bounding_box)
+    return penalty, [lp.label_index for lp in labeled_points]
+
+
+class GraspLabeler(GreedyLabeler):
+    """Labeler using a greedy randomized adaptive search procedure (GRASP).
+
+    A number of independent restarts, each consisting of a randomized greedy construction and a
+    local search, are run in a pool of worker processes. The best solution found is kept. Results
+    only depend on the seed, not on the number of processes.
+
+    Args:
+        points (list): the points to label
+        bounding_box (BoundingBox): the bounding box of the map
+        iterations (int): the number of local search iterations per restart
+        restarts (int): the number of restarts
+        alpha (float): the amount of randomization in the greedy construction
+        processes (int): the number of worker processes; None for one per CPU, 1 to run in-process
+        seed: the seed for the random number generator
+    """
+
+    def __init__(
+        self,
+        points,
+        bounding_box,
+        iterations=5,
+        restarts=16,
+        alpha=0.3,
+        processes=None,
+        seed=None,
+    ):
+        GreedyLabeler.__init__(self, points, bounding_box)
         self.iterations = iterations
+        self.restarts = restarts
+        self.alpha = alpha
+        self.processes = processes
+        self.seed = seed
+
+        # Evaluation of the final solution overwrites the candidate penalties, so keep a copy
+        self.penalties = [
+            lc.penalty for p in self.points if p.text for lc in p.label_candidates
+        ]
 
     def run(self):
-        AdvancedGreedyLabeler.run(self)
-        local_search(self.points, self.bounding_box, self.iterations)
+        rng = random.Random(self.seed)
+        jobs = [
+            (rng.getrandbits(64), self.alpha, self.iterations)
+            for i in range(self.restarts)
+        ]
+
+        if self.processes == 1:
+            results = [
+                grasp_restart(self.points, self.bounding_box, self.penalties, *job)
+                for job in jobs
+            ]
+        else:
+            with Pool(
+                self.processes,
+                initializer=_init_worker,
+                initargs=(self.points, self.bounding_box, self.penalties),
+            ) as pool:
+                results = pool.map(_run_restart, jobs)
+
+        # The first best restart wins, so ties do not depend on scheduling
+        best_penalty, best_assignment = min(results, key=lambda r: r[0])
+
+        labeled_points = [p for p in self.points if p.text]
+        for lp, i in zip(labeled_points, best_assignment):
+            lp.label_candidates[i].select()
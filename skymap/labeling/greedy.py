@@ -1,6 +1,6 @@
-import random
+import heapq
 from operator import attrgetter
-from skymap.labeling.common import evaluate_labels
+from skymap.labeling.arrays import evaluate_label_candidates
 
 
 class GreedyLabeler(object):
@@ -12,7 +12,7 @@ class GreedyLabeler(object):
         for lp in self.points:
             self.label_candidates.extend(lp.label_candidates)
 
-        evaluate_labels(self.label_candidates, self.points, self.bounding_box)
+        evaluate_label_candidates(self.label_candidates, self.points, self.bounding_box)
 
     def run(self):
         sorted_label_candidates = sorted(
@@ -28,21 +28,37 @@ class GreedyLabeler(object):
 
 
 class AdvancedGreedyLabeler(GreedyLabeler):
+    """Greedy labeler that updates the candidate penalties after each selection.
+
+    Candidates are kept in a heap keyed on penalty. When a label is selected, the other candidates
+    of its point are discarded, and the penalties of the candidates they overlap are lowered. Such a
+    candidate is pushed again with its new penalty; outdated heap entries are skipped when popped.
+    """
+
     def __init__(self, points, bounding_box):
         GreedyLabeler.__init__(self, points, bounding_box)
 
     def run(self):
-        unassigned_labeled_points = [p for p in self.points if (p.text and not p.label)]
+        unassigned_labeled_points = {p for p in self.points if (p.text and not p.label)}
 
-        while unassigned_labeled_points:
-            best_label = None
-            for l in self.label_candidates:
-                if l.point not in unassigned_labeled_points:
-                    continue
-                if not best_label or l.penalty < best_label.penalty:
-                    best_label = l
+        # The candidate order breaks ties between equal penalties
+        order = {}
+        heap = []
+        for i, l in enumerate(self.label_candidates):
+            order[l] = i
+            if l.point in unassigned_labeled_points:
+                heap.append((l.penalty, i, l))
+        heapq.heapify(heap)
 
+        while unassigned_labeled_points and heap:
+            penalty, i, best_label = heapq.heappop(heap)
             labeled_point = best_label.point
+            if labeled_point not in unassigned_labeled_points:
+                continue
+            if penalty != best_label.penalty:
+                # Outdated entry, the label has been pushed again with its new penalty
+                continue
+
             unassigned_labeled_points.remove(labeled_point)
             best_label.select()
 
@@ -50,4 +66,7 @@ class AdvancedGreedyLabeler(GreedyLabeler):
                 if l == best_label:
                     continue
                 for ll in l.overlapping:
+                    if ll.point not in unassigned_labeled_points:
+                        continue
                     ll.penalty -= l.overlap(ll)
+                    heapq.heappush(heap, (ll.penalty, order[ll], ll))
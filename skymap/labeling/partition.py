@@ -0,0 +1,186 @@
+from multiprocessing import Pool
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from skymap.labeling.common import Point
+from skymap.labeling.arrays import LabelCandidateArrays
+from skymap.labeling.annealing import SimulatedAnnealingLabeler
+
+
+class LabelingComponent(object):
+    """Independent part of a labeling problem.
+
+    Args:
+        labeled_points (list): the points to label, whose candidates only conflict with each other
+        context_points (list): the other points that overlap with any of the candidates
+    """
+
+    def __init__(self, labeled_points, context_points):
+        self.labeled_points = labeled_points
+        self.context_points = context_points
+
+    def __len__(self):
+        return len(self.labeled_points)
+
+    @property
+    def points(self):
+        return self.labeled_points + self.context_points
+
+
+def conflict_components(points, bounding_box, arrays=None):
+    """Splits the labeling problem into the connected components of the conflict graph.
+
+    Two labeled points are connected when a label candidate of one overlaps a candidate of the
+    other. The labels of different components can be placed independently. Points other than the
+    labeled points of a component, that overlap any of its candidates, are included as unlabeled
+    context points, so the penalties within a component are the same as for the whole problem.
+
+    Args:
+        points (list): all points on the map
+        bounding_box (BoundingBox): the bounding box of the map
+        arrays (LabelCandidateArrays): the candidate arrays for the problem, if already available
+
+    Returns:
+        list: a LabelingComponent for each connected component
+    """
+    if arrays is None:
+        label_candidates = [lc for p in points if p.text for lc in p.label_candidates]
+        arrays = LabelCandidateArrays(label_candidates, points, bounding_box)
+
+    npoints = len(arrays.points)
+    i, j, overlap = arrays.label_pairs()
+    graph = coo_matrix(
+        (np.ones(len(i)), (arrays.point_id[i], arrays.point_id[j])),
+        shape=(npoints, npoints),
+    )
+    ncomponents, component = connected_components(graph, directed=False)
+
+    component = component.tolist()
+    labeled = np.zeros(npoints, dtype=bool)
+    labeled[arrays.point_id] = True
+
+    components = {}
+    for k in np.nonzero(labeled)[0].tolist():
+        components.setdefault(component[k], ([], set()))[0].append(arrays.points[k])
+
+    # Points overlapping a candidate of a component, but not labeled within that component
+    i, k = arrays.point_pairs()
+    for p, k in set(zip(arrays.point_id[i].tolist(), k.tolist())):
+        c = component[p]
+        if not labeled[k] or component[k] != c:
+            components[c][1].add(k)
+
+    result = []
+    for c in sorted(components):
+        labeled_points, context = components[c]
+        context_points = [
+            Point(p.x, p.y, p.radius)
+            for p in (arrays.points[k] for k in sorted(context))
+        ]
+        result.append(LabelingComponent(labeled_points, context_points))
+    return result
+
+
+def solve_component(component, bounding_box, labeler_class, labeler_kwargs):
+    """Labels the points of a single component with the given labeler.
+
+    Returns:
+        list: the selected candidate index for each labeled point of the component
+    """
+    labeler = labeler_class(component.points, bounding_box, **labeler_kwargs)
+    labeler.run()
+    return [p.label_index for p in component.labeled_points]
+
+
+def _solve_component(args):
+    return solve_component(*args)
+
+
+class PartitionedLabeler(object):
+    """Labeler that splits the problem into independent components and solves those separately.
+
+    Components consisting of a single point are solved directly, by selecting the candidate with the
+    lowest penalty. The larger components are solved with the given labeler, in a pool of worker
+    processes. Labelers that use a process pool themselves, like the GraspLabeler, should be
+    configured to run in-process.
+
+    Args:
+        points (list): the points to label
+        bounding_box (BoundingBox): the bounding box of the map
+        labeler_class: the labeler to use for each component
+        labeler_kwargs (dict): extra keyword arguments for the labeler
+        processes (int): the number of worker processes; None for one per CPU, 1 to run in-process
+    """
+
+    def __init__(
+        self,
+        points,
+        bounding_box,
+        labeler_class=SimulatedAnnealingLabeler,
+        labeler_kwargs=None,
+        processes=None,
+    ):
+        self.points = points
+        self.bounding_box = bounding_box
+        self.labeler_class = labeler_class
+        self.labeler_kwargs = labeler_kwargs or {}
+        self.processes = processes
+
+        label_candidates = [
+            lc for p in self.points if p.text for lc in p.label_candidates
+        ]
+        self.arrays = LabelCandidateArrays(
+            label_candidates, self.points, self.bounding_box
+        )
+        self.components = conflict_components(
+            self.points, self.bounding_box, self.arrays
+        )
+
+    def run(self):
+        static_penalties = self.arrays.static_penalties()
+        candidate_ids = {lc: i for i, lc in enumerate(self.arrays.label_candidates)}
+
+        components = []
+        for component in self.components:
+            if len(component) > 1:
+                components.append(component)
+                continue
+
+            # Without conflicts, the best candidate is the one with the lowest penalty
+            lp = component.labeled_points[0]
+            best = min(
+                lp.label_candidates, key=lambda lc: static_penalties[candidate_ids[lc]]
+            )
+            best.select()
+
+        jobs = [
+            (c, self.bounding_box, self.labeler_class, self.labeler_kwargs)
+            for c in components
+        ]
+        if self.processes == 1 or len(jobs) < 2:
+            results = [solve_component(*job) for job in jobs]
+        else:
+            with Pool(self.processes) as pool:
+                # Large components first, so they do not end up last in the queue
+                order = sorted(range(len(jobs)), key=lambda k: -len(components[k]))
+                results = [None] * len(jobs)
+                for k, result in zip(
+                    order, pool.imap(_solve_component, [jobs[k] for k in order])
+                ):
+                    results[k] = result
+
+        for component, result in zip(components, results):
+            for lp, i in zip(component.labeled_points, result):
+                if i is None:
+                    # The labeler dropped the label
+                    lp.label_index = None
+                    continue
+                if i >= len(lp.label_candidates):
+                    # The labeler added extra candidates in the worker process
+                    lp.extend_labels()
+                lp.label_candidates[i].select()
+
+    def result(self):
+        return [p.label_index for p in self.points if p.label_index is not None]
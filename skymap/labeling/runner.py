@@ -1,13 +1,8 @@
 import time
-import random
 from PIL import Image, ImageDraw
 
-from skymap.labeling.common import Point, BoundingBox, RandomLabeler, evaluate, POSITION_WEIGHT, POINT_RADIUS
-from skymap.labeling.greedy import GreedyLabeler, AdvancedGreedyLabeler
-from skymap.labeling.grasp import GraspLabeler
-from skymap.labeling.genetic import CachedGeneticLabeler
-
-from deap import creator, base
+from skymap.labeling.common import evaluate
+from skymap.labeling.benchmark import LabelingProblem, LABELERS
 
 
 def draw(points, width, height):
@@ -30,7 +25,7 @@ def draw(points, width, height):
             x2 = p.label.maxx
             y1 = (height - p.label.maxy)
             y2 = (height - p.label.miny)
-            if p.label.penalty > POSITION_WEIGHT * p.label.position:
+            if p.label.penalty > p.label.base_penalty:
                 color = (256, 0, 0)
             else:
                 color = (200, 200, 200)
@@ -41,41 +36,14 @@ def draw(points, width, height):
 
 if __name__ == "__main__":
     print("Starting")
-    random.seed(1)
-
-    #creator.create("FitnessMax", base.Fitness, weights=(1.0,))
-    #creator.create("Individual", list, fitness=creator.FitnessMax)
 
-    npoints = 1000
-    nlabels = 200
-    mapwidth = 2000
-    mapheight = 2000
-    bounding_box = BoundingBox(0, 0, mapwidth, mapheight)
-
-    points = []
-    for i in range(npoints):
-        x = mapwidth * random.random()
-        y = mapheight * random.random()
-        if random.random() < float(nlabels) / npoints:
-            text = f"Label for point {i}"
-            p = Point(x, y, POINT_RADIUS, text, 0)
-        else:
-            p = Point(x, y, POINT_RADIUS)
-        points.append(p)
+    # See skymap.labeling.benchmark for comparing all labelers
+    problem = LabelingProblem.synthetic(200, 20000)
+    points = problem.points()
+    bounding_box = problem.bounding_box
 
-    method = 4
-    if method == 1:
-        g = GreedyLabeler(points, bounding_box)
-    elif method == 2:
-        g = AdvancedGreedyLabeler(points, bounding_box)
-    elif method == 3:
-        g = GraspLabeler(points, bounding_box)
-    # elif method == 4:
-    #     g = GeneticLabeler(points, bounding_box)
-    elif method == 4:
-        g = CachedGeneticLabeler(points, bounding_box)
-    else:
-        g = RandomLabeler(points, bounding_box)
+    labeler_class, kwargs = LABELERS["genetic"]
+    g = labeler_class(points, bounding_box, **kwargs)
 
     t1 = time.perf_counter()
 
@@ -85,4 +53,4 @@ if __name__ == "__main__":
     penalty = evaluate(g.points, g.bounding_box)
     print(f"Penalty: {penalty}")
 
-    draw(points, mapwidth, mapheight)
+    draw(points, int(bounding_box[2]), int(bounding_box[3]))
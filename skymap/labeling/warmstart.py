@@ -0,0 +1,200 @@
+import json
+import inspect
+
+import numpy as np
+
+from skymap.labeling.common import (
+    Point,
+    apply_assignment,
+    candidate_penalty,
+    local_search,
+    LabelIndex,
+)
+from skymap.labeling.arrays import BoxGrid
+
+
+def record_key(point):
+    """Returns the key of the point in a solution; unlabeled points without identifier are keyed on their position."""
+    if point.key is not None:
+        return point.key
+    return f"@{point.x!r},{point.y!r},{point.radius!r}"
+
+
+class LabelingSolution(object):
+    """
+    Labeling solution of a previous run, to warm start from.
+
+    For every point, the solution stores the point data as well as the selected candidate, so a later run can
+    determine which points changed.
+
+    Args:
+        records (dict): point key, (x, y, radius, text, label_offset, label_index) pairs
+    """
+
+    def __init__(self, records):
+        self.records = records
+
+    @classmethod
+    def from_points(cls, points):
+        records = {}
+        for p in points:
+            record = (p.x, p.y, p.radius, p.text, p.label_offset, p.label_index)
+            records[record_key(p)] = record
+        return cls(records)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as fp:
+            data = json.load(fp)
+        return cls({r[0]: tuple(r[1:]) for r in data["points"]})
+
+    def save(self, filename):
+        data = {"points": [[key] + list(r) for key, r in self.records.items()]}
+        with open(filename, "w") as fp:
+            json.dump(data, fp, ensure_ascii=False)
+
+    @property
+    def assignment(self):
+        """Returns the selected candidate index for each labeled point key."""
+        return {key: r[5] for key, r in self.records.items() if r[5] is not None}
+
+    def changes(self, points):
+        """
+        Determines the points that changed since the solution was made.
+
+        Args:
+            points (list): the current points
+
+        Returns:
+            tuple: the current points that are new or changed, and Point objects for the old versions of the changed
+                and removed points
+        """
+        changed = []
+        old = []
+        keys = set()
+        for p in points:
+            key = record_key(p)
+            keys.add(key)
+            record = self.records.get(key)
+            if record is None:
+                changed.append(p)
+            elif record[:5] != (p.x, p.y, p.radius, p.text, p.label_offset):
+                changed.append(p)
+                old.append(Point(*record[:5]))
+
+        for key, record in self.records.items():
+            if key not in keys:
+                old.append(Point(*record[:5]))
+        return changed, old
+
+
+def changed_neighborhood(points, solution):
+    """
+    Determines the labeled points whose labels should be re-optimized after the given solution was made.
+
+    These are the labeled points that are new or changed, and the labeled points of which a label candidate or the
+    point itself intersects the point or a label candidate of a new, changed or removed point.
+
+    Args:
+        points (list): the current points
+        solution (LabelingSolution): the previous solution
+
+    Returns:
+        set: the labeled points to re-optimize
+    """
+    changed, old = solution.changes(points)
+    labeled_points = [p for p in points if p.text]
+    result = {p for p in changed if p.text}
+
+    dirty_boxes = []
+    for p in changed + old:
+        dirty_boxes.append(p.box)
+        dirty_boxes.extend(lc.box for lc in p.label_candidates)
+    if not dirty_boxes:
+        return result
+
+    # Index the points and the candidates of all labeled points
+    boxes = []
+    owners = []
+    for p in labeled_points:
+        boxes.append(p.box)
+        owners.append(p)
+        for lc in p.label_candidates:
+            boxes.append(lc.box)
+            owners.append(p)
+
+    grid = BoxGrid(*np.array(boxes, dtype=float).reshape(-1, 4).T)
+    queries = np.array(dirty_boxes, dtype=float).T
+    _, items = grid.intersection(*queries)
+    result.update(owners[i] for i in set(items.tolist()))
+    return result
+
+
+class WarmStartLabeler(object):
+    """
+    Labeler that starts from a previous solution and only re-optimizes the labels around changed points.
+
+    The labels of the other points are kept as they were. The labels to re-optimize start at their previous position,
+    or at their best position given the kept labels for new points, and are then improved by local search. Any
+    labeler accepting an initial assignment, like the SimulatedAnnealingLabeler, can be used instead of the local
+    search. The free points are only passed to labelers that accept them; other labelers, like the
+    CachedGeneticLabeler, start from the previous solution but may move all labels.
+
+    Args:
+        points (list): the points to label
+        bounding_box (BoundingBox): the bounding box of the map
+        solution (LabelingSolution): the previous solution
+        iterations (int): the number of local search iterations
+        labeler_class: the labeler to use for re-optimizing, instead of the local search
+        labeler_kwargs (dict): extra keyword arguments for the labeler
+    """
+
+    def __init__(
+        self,
+        points,
+        bounding_box,
+        solution,
+        iterations=5,
+        labeler_class=None,
+        labeler_kwargs=None,
+    ):
+        self.points = points
+        self.bounding_box = bounding_box
+        self.solution = solution
+        self.iterations = iterations
+        self.labeler_class = labeler_class
+        self.labeler_kwargs = labeler_kwargs or {}
+
+        self.free_points = changed_neighborhood(self.points, self.solution)
+
+    def run(self):
+        assignment = self.solution.assignment
+        unassigned = apply_assignment(self.points, assignment)
+
+        if self.labeler_class is not None:
+            kwargs = dict(self.labeler_kwargs, initial_assignment=assignment)
+            if "free_points" in inspect.signature(self.labeler_class).parameters:
+                kwargs["free_points"] = self.free_points
+            labeler = self.labeler_class(self.points, self.bounding_box, **kwargs)
+            labeler.run()
+            return
+
+        # Place the new labels one by one, given the labels selected so far
+        for lp in unassigned:
+            lp.label_candidates[0].select()
+        labeled_points = [p for p in self.points if p.text]
+        index = LabelIndex(
+            [p.label for p in labeled_points], self.points, self.bounding_box
+        )
+        for lp in unassigned:
+            old_label = lp.label
+            best = min(
+                lp.label_candidates, key=lambda lc: candidate_penalty(lc, index)
+            )
+            best.select()
+            index.replace(old_label, best)
+
+        local_search(self.points, self.bounding_box, self.iterations, self.free_points)
+
+    def result(self):
+        return [p.label_index for p in self.points if p.label_index is not None]
@@ -10,7 +10,7 @@ from skymap.geometry import (
     Label,
     Circle,
     Arc,
-    Polygon,
+    Polyline,
     Clipper,
     SkyCoordDeg,
     ensure_angle_range,
@@ -69,6 +69,9 @@ class CoordinateGridConfig(object):
         self.unmarked_ticksize = 0.5
         self.fixed_tick_reach = True
 
+        # Maximum distance between curves and the polylines drawn for them, in mm
+        self.curve_tolerance = 0.05
+
         # Labels
         self.label_distance = 1.5 * self.marked_ticksize
 
@@ -459,6 +462,7 @@ class Parallel(GridLine):
 class Equator(object):
     LONGITUDES = {}
     LATITUDES = {}
+    POLES = {}
     GALACTIC_LONGITUDES = None
     GALACTIC_LATITUDES = None
     ECLIPTIC_LONGITUDES = None
@@ -481,6 +485,28 @@ class Equator(object):
         self.LONGITUDES[self.frame] = longitudes[i:] + longitudes[:i]
         self.LATITUDES[self.frame] = latitudes[i:] + latitudes[:i]
 
+        pole = SkyCoordDeg(0, 90, frame=self.frame).icrs
+        self.POLES[self.frame] = (pole.ra.degree, pole.dec.degree)
+
+    def latitudes(self, longitudes):
+        """Returns the exact latitudes of the equator at the given longitudes, both in ICRS coordinates.
+
+        The equator is the great circle 90 degrees from the pole of the frame, so no interpolation is needed.
+
+        Args:
+            longitudes: the longitudes, in degrees
+
+        Returns:
+            numpy.ndarray: the latitudes, in degrees
+        """
+        pole_longitude, pole_latitude = numpy.radians(self.POLES[self.frame])
+        longitudes = numpy.radians(numpy.asarray(longitudes, dtype=float))
+        latitudes = numpy.arctan2(
+            -numpy.cos(longitudes - pole_longitude) * numpy.cos(pole_latitude),
+            numpy.sin(pole_latitude),
+        )
+        return numpy.degrees(latitudes)
+
     def _latitude(self, longitude):
         longitude = ensure_angle_range(longitude)
         if longitude < self.LONGITUDES[self.frame][0]:
@@ -782,18 +808,31 @@ class CoordinateGridFactory(object):
         points = e.points_inside_area(
             self.min_longitude, self.max_longitude, self.min_latitude, self.max_latitude
         )
-        points = [self.projection.project(SkyCoordDeg(p[0], p[1])) for p in points]
         if not points:
             return None
-        polygon = Polygon(points, closed=False)
+
+        # Sample the projected equator between the end points as densely as needed for the output resolution
+        longitudes = numpy.array(points)[:, 0]
+        longitudes = numpy.degrees(numpy.unwrap(numpy.radians(longitudes)))
+
+        def func(t):
+            return self.projection.project_coordinates(t, e.latitudes(t))
+
+        polyline = Polyline.adaptive(
+            func,
+            longitudes[0],
+            longitudes[-1],
+            self.config.curve_tolerance,
+            nsamples=len(points),
+        )
 
         if self.clip_at_border:
-            polys, borders = self.clipper.clip(polygon)
-            if not polys:
+            polylines, borders = self.clipper.clip(polyline)
+            if not polylines:
                 return None
-            polygon = polys[0]
+            polyline = polylines[0]
 
-        return polygon
+        return polyline
 
     @property
     def galactic_equator(self):
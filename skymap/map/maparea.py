@@ -1,11 +1,20 @@
-from skymap.tikz import TikzPicture
-from skymap.geometry import Point, Line, Circle, Arc, Rectangle, Label, Polygon
+from skymap.tikz import DocumentPicture
+from skymap.geometry import (
+    Point,
+    Line,
+    Circle,
+    Arc,
+    Rectangle,
+    Label,
+    Polygon,
+    Polyline,
+)
 from skymap.map import CoordinateGridFactory, AzimuthalEquidistantProjection
 
 
-class MapLegend(TikzPicture):
+class MapLegend(DocumentPicture):
     def __init__(self, tikz, p1, p2):
-        TikzPicture.__init__(self, tikz, p1, p2, origin=p1, boxed=True)
+        super().__init__(tikz, p1, p2, origin=p1, boxed=True)
         self.draw()
 
     def draw(self):
@@ -97,7 +106,7 @@ class MapConfig(object):
         )
 
 
-class MapArea(TikzPicture):
+class MapArea(DocumentPicture):
     """Area on the paper used to plot a map.
 
     The outer area (including the border is defined by the points p1 and p2. The actual map is inset from this by
@@ -113,13 +122,16 @@ class MapArea(TikzPicture):
     The boundary can be provided with ticks and/or labels.
 
     The whole map including ticks and labels can be enclosed in a box.
+
+    The map is drawn with the backend of the page, so it can be rendered as PDF on a Tikz page or as SVG on an
+    SvgDocument.
     """
 
     def __init__(self, tikz, config, clip_points=None):
         """
 
         Args:
-            tikz: the tikz page to add the maparea to
+            tikz: the page to add the maparea to, like a Tikz page or an SvgDocument
             config: the MapConfig object specifying the map
             clip_points:
         """
@@ -137,8 +149,7 @@ class MapArea(TikzPicture):
         )
 
         # Initialize the picture from the inner map corners
-        TikzPicture.__init__(
-            self,
+        super().__init__(
             tikz,
             llcorner,
             urcorner,
@@ -267,6 +278,8 @@ class MapArea(TikzPicture):
             self.draw_label(item)
         elif isinstance(item, Polygon):
             self.draw_polygon(item)
+        elif isinstance(item, Polyline):
+            self.draw_polyline(item)
         else:
             raise NotImplementedError(f"Cannot draw {item}")
 
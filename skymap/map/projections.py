@@ -52,10 +52,35 @@ class Projection(object):
         """Convert the given location on the map to a sky coordinate."""
         raise NotImplementedError
 
+    def project_coordinates(self, longitudes, latitudes):
+        """Project arrays of longitudes and latitudes on the map.
+
+        Projections can override this with a vectorized version, to avoid creating a sky coordinate for every point.
+
+        Args:
+            longitudes: the longitudes, in degrees
+            latitudes: the latitudes, in degrees
+
+        Returns:
+            numpy.ndarray: an (N, 2) array with the map coordinates
+        """
+        points = [
+            tuple(self.project(SkyCoordDeg(longitude, latitude)))
+            for longitude, latitude in zip(longitudes, latitudes)
+        ]
+        return numpy.array(points, dtype=float).reshape(-1, 2)
+
     def reduce_longitude(self, longitude):
         """Return the longitude within +/- 180 degrees from the center longitude."""
         return ensure_angle_range(longitude, self.center_longitude)
 
+    def reduce_longitudes(self, longitudes):
+        """Return the longitudes within +/- 180 degrees from the center longitude, for an array of longitudes."""
+        longitudes = numpy.asarray(longitudes, dtype=float)
+        return (longitudes - self.center_longitude + 180.0) % 360.0 + (
+            self.center_longitude - 180.0
+        )
+
     def meridian(self, longitude, min_latitude, max_latitude):
         p1 = self.project(SkyCoordDeg(longitude, min_latitude))
         p2 = self.project(SkyCoordDeg(longitude, max_latitude))
@@ -80,6 +105,16 @@ class UnitProjection(Projection):
             latitude / self.reference_scale,
         )
 
+    def project_coordinates(self, longitudes, latitudes):
+        longitudes = self.reduce_longitudes(longitudes)
+        latitudes = numpy.asarray(latitudes, dtype=float)
+        x = (
+            self.horizontal_stretch
+            * (longitudes - self.center_longitude)
+            / self.reference_scale
+        )
+        return numpy.column_stack([x, latitudes / self.reference_scale])
+
     def inverse_project(self, point):
         longitude = (
             self.center_longitude
@@ -156,6 +191,19 @@ class AzimuthalEquidistantProjection(Projection):
             self.horizontal_stretch * rho * math.cos(theta), rho * math.sin(theta)
         )
 
+    def project_coordinates(self, longitudes, latitudes):
+        longitudes = self.reduce_longitudes(longitudes)
+        latitudes = numpy.asarray(latitudes, dtype=float)
+
+        rho = (self.center_latitude - latitudes) / self.reference_scale
+        theta = numpy.radians(longitudes - self.center_longitude)
+        if self.reverse_polar_direction:
+            theta *= -1
+
+        return numpy.column_stack(
+            [self.horizontal_stretch * rho * numpy.cos(theta), rho * numpy.sin(theta)]
+        )
+
     def backproject(self, point):
         rho = self.origin.distance(point)
         theta = ensure_angle_range(math.degrees(math.atan2(point.y, point.x)))
@@ -223,6 +271,19 @@ class EquidistantCylindricalProjection(Projection):
         y = latitude / self.reference_scale
         return Point(x, y)
 
+    def project_coordinates(self, longitudes, latitudes):
+        longitudes = self.reduce_longitudes(longitudes)
+        latitudes = numpy.asarray(latitudes, dtype=float)
+
+        x = (
+            self.horizontal_stretch
+            * (longitudes - self.center_longitude)
+            / self.reference_scale
+        )
+        if self.celestial:
+            x *= -1
+        return numpy.column_stack([x, latitudes / self.reference_scale])
+
     def backproject(self, point):
         if self.celestial:
             x = -point.x
@@ -322,6 +383,19 @@ class EquidistantConicProjection(Projection):
 
         return Point(x, y)
 
+    def project_coordinates(self, longitudes, latitudes):
+        longitudes = self.reduce_longitudes(longitudes)
+        latitudes = numpy.asarray(latitudes, dtype=float)
+
+        rho = (self.G - numpy.radians(latitudes)) / math.radians(self.reference_scale)
+        theta = numpy.radians(self.n * (longitudes - self.center_longitude))
+        if self.celestial:
+            theta *= -1
+
+        return numpy.column_stack(
+            [rho * numpy.sin(theta), self.rho_0 - rho * numpy.cos(theta)]
+        )
+
     def backproject(self, point):
         sign_n = numpy.sign(self.n)
         rho = (
@@ -1,4 +1,6 @@
 from .papersize import PaperSize, PaperMargin
 from .fontsize import FontSize
 from .tikz import Tikz, PDF_FOLDER
-from .tikz_picture import TikzPicture, DrawError
+from .picture import Picture, DocumentPicture, DrawError
+from .tikz_picture import TikzPicture
+from .svg import SvgDocument, SvgPicture
@@ -0,0 +1,273 @@
+"""
+Drawing backend interface.
+"""
+import functools
+
+import numpy as np
+
+from skymap.geometry import Point, Line, Rectangle, Circle, Polygon, Polyline, Clipper
+
+
+class DrawError(Exception):
+    pass
+
+
+class Picture(object):
+    """Part of a page that can be used for drawing, independent of the output format.
+
+    It is enclosed by an optional box, and has its own origin. The drawing primitives are implemented by the backends,
+    like the TikzPicture for print and the SvgPicture for previews.
+
+    Args:
+        document: the document object to add the picture to, like skymap.tikz.Tikz
+        p1 (skymap.geometry.Point): the lower left corner of the picture, in paper coordinates
+        p2 (skymap.geometry.Point): the upper right corner of the picture, in paper coordinates
+        origin (skymap.geometry.Point): the location of the origin of the picture's coordinate
+            system, in paper coordinates
+        boxed (bool): whether to draw a box around the picture
+        box_linewidth (float): the linewidth of the box, in points
+    """
+
+    def __init__(self, document, p1, p2, origin=None, boxed=True, box_linewidth=0.5):
+        # Make sure the p1 is lower left and p2 is upper right
+        self.p1 = Point(min(p1.x, p2.x), min(p1.y, p2.y))
+        self.p2 = Point(max(p1.x, p2.x), max(p1.y, p2.y))
+
+        if origin is None:
+            self.set_origin(0.5 * (p1 + p2))
+        else:
+            self.set_origin(origin)
+
+        # Calculate the picture coordinates of the corners
+        self.llcorner = Point(self.minx, self.miny)
+        self.lrcorner = Point(self.maxx, self.miny)
+        self.urcorner = Point(self.maxx, self.maxy)
+        self.ulcorner = Point(self.minx, self.maxy)
+
+        # Construct the borders of the picture
+        self.bottom_border = Line(self.llcorner, self.lrcorner)
+        self.right_border = Line(self.lrcorner, self.urcorner)
+        self.top_border = Line(self.urcorner, self.ulcorner)
+        self.left_border = Line(self.ulcorner, self.llcorner)
+        self.borderdict = {
+            "left": self.left_border,
+            "top": self.top_border,
+            "right": self.right_border,
+            "bottom": self.bottom_border,
+        }
+
+        self.clipper = Clipper(self.borderdict)
+
+        self.boxed = boxed
+        self.box_linewidth = box_linewidth
+
+        self.width = p2.x - p1.x
+        self.height = p2.y - p1.y
+
+        self.pen_style = None
+        self.linewidth = 0.5
+        self.color = "black"
+        self.opened = False
+        self.closed = False
+
+        document.add(self)
+
+    def set_origin(self, origin):
+        """
+        Sets the location of the origin of the coordinate system for the picture.
+        The minimum and maximum x and y values for the picture, as well as the bounding box, are determined as well.
+
+        Args:
+            origin (skymap.geometry.Point): the location in absolute paper coordinates
+        """
+        self.origin = origin
+        self.minx = self.p1.x - self.origin.x
+        self.maxx = self.p2.x - self.origin.x
+        self.miny = self.p1.y - self.origin.y
+        self.maxy = self.p2.y - self.origin.y
+
+        self.bounding_box = Rectangle(
+            Point(self.minx, self.miny), Point(self.maxx, self.maxy)
+        )
+
+    def _picture_to_paper(self, p):
+        return self.origin + p
+
+    def _paper_to_picture(self, p):
+        return p - self.origin
+
+    def open(self):
+        """Open the picture for writing."""
+        if self.opened:
+            return
+        if self.closed:
+            raise RuntimeError(f"You cannot re-open a {type(self).__name__}")
+
+        self.begin()
+        self.opened = True
+
+        if self.boxed:
+            self.draw_bounding_box()
+
+    def close(self):
+        """Close the picture for writing."""
+        if not self.opened or self.closed:
+            return
+
+        self.end()
+        self.closed = True
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    # Draw options
+    @property
+    def dotted(self):
+        return self.pen_style == "dotted"
+
+    @property
+    def dashed(self):
+        return self.pen_style == "dashed"
+
+    def solid_pen(self):
+        """Set the pen style to solid."""
+        self.pen_style = None
+
+    def dotted_pen(self):
+        """Set the pen style to dotted."""
+        self.pen_style = "dotted"
+
+    def densely_dotted_pen(self):
+        """Set the pen style to densely dotted."""
+        self.pen_style = "densely dotted"
+
+    def dashed_pen(self):
+        """Set the pen style to dashed."""
+        self.pen_style = "dashed"
+
+    def densely_dashed_pen(self):
+        """Set the pen style to densely dashed."""
+        self.pen_style = "densely dashed"
+
+    def densely_dash_dot_pen(self):
+        """Set the pen style to densely dash dot."""
+        self.pen_style = "densely dash dot"
+
+    # Backend interface
+
+    def begin(self):
+        """Writes the start of the picture."""
+        raise NotImplementedError
+
+    def end(self):
+        """Writes the end of the picture."""
+        raise NotImplementedError
+
+    def comment(self, comment, prefix_newline=True):
+        """Adds a comment to the output, if the format supports it."""
+        raise NotImplementedError
+
+    def clip(self, path=None):
+        """Context manager for clipping the enclosed drawing actions to the given path, or to the bounding box."""
+        raise NotImplementedError
+
+    def draw_line(self, line, delay_write=False):
+        raise NotImplementedError
+
+    def draw_polygon(self, polygon, cycle=False, delay_write=False):
+        raise NotImplementedError
+
+    def draw_polyline(self, polyline, delay_write=False):
+        raise NotImplementedError
+
+    def draw_rectangle(self, rectangle, delay_write=False):
+        raise NotImplementedError
+
+    def draw_circle(self, circle, delay_write=False):
+        raise NotImplementedError
+
+    def draw_arc(self, arc, delay_write=False):
+        raise NotImplementedError
+
+    def draw_label(self, label, delay_write=False):
+        raise NotImplementedError
+
+    def fill_circle(self, circle, delay_write=False):
+        raise NotImplementedError
+
+    def fill_rectangle(self, rectangle, delay_write=False):
+        raise NotImplementedError
+
+    # Shared drawing functions
+
+    def draw_interpolated_arc(self, arc, delay_write=False):
+        """Draw the given arc as a polygon using interpolated points.
+
+        Args:
+            arc: the arc to draw
+            delay_write:
+        """
+        self.open()
+        self.draw_polygon(Polygon(arc.interpolated_points()), delay_write=delay_write)
+
+    def fill_circles(self, xy, radii, color=None):
+        """Draw filled circles, like star symbols, in bulk.
+
+        Backends can override this with a faster implementation that avoids creating geometry objects.
+
+        Args:
+            xy (numpy.ndarray): (N, 2) array of circle centers
+            radii: the radius of all circles, or an array with the radius of every circle
+            color (str): the fill color, by default the current color
+        """
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), len(xy))
+        old_color = self.color
+        if color is not None:
+            self.color = color
+        for (x, y), radius in zip(xy.tolist(), radii.tolist()):
+            self.fill_circle(Circle(Point(x, y), radius))
+        self.color = old_color
+
+    def draw_polylines(self, polylines):
+        """Draw the given polylines in bulk.
+
+        Args:
+            polylines (list): the polylines, as Polyline objects or (N, 2) arrays
+        """
+        for polyline in polylines:
+            if not isinstance(polyline, Polyline):
+                polyline = Polyline(polyline)
+            self.draw_polyline(polyline)
+
+    def draw_bounding_box(self):
+        """Draw a bounding box around the picture."""
+        self.open()
+        old_linewidth = self.linewidth
+        self.linewidth = self.box_linewidth
+        self.draw_rectangle(self.bounding_box)
+        self.linewidth = old_linewidth
+
+
+class DocumentPicture(Picture):
+    """Picture that is drawn with the backend of the document it is added to.
+
+    Subclasses, like the MapArea, only use the drawing primitives of the Picture interface. When created, they are
+    combined with the picture class of the document, like the TikzPicture of a Tikz page or the SvgPicture of an
+    SvgDocument, so the same chart can be rendered by either backend.
+    """
+
+    def __new__(cls, document, *args, **kwargs):
+        return object.__new__(backend_class(cls, document.picture_class))
+
+
+@functools.lru_cache(maxsize=None)
+def backend_class(cls, backend):
+    """Returns the subclass of the given picture class that draws with the given backend picture class."""
+    if issubclass(cls, backend):
+        return cls
+    return type(cls.__name__, (cls, backend), {"__module__": cls.__module__})
@@ -0,0 +1,421 @@
+"""
+SVG drawing backend, for fast previews and web tiles.
+
+The SVG files are written directly, without XeLaTeX. Labels are written as plain text, so LaTeX markup in labels is
+only approximated.
+"""
+import io
+import os
+import re
+import math
+from contextlib import contextmanager
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from skymap.geometry import Point, Rectangle, Circle, Polygon, Polyline
+from skymap.tikz import PaperSize, FontSize, PaperMargin
+from skymap.tikz.picture import Picture, DrawError
+from skymap.tikz.tikz import TEX_OUTPUT_FOLDER
+
+
+# TeX points per millimeter
+MM_PER_POINT = 25.4 / 72.27
+
+# The TikZ dash patterns, as alternating on and off lengths in points. None stands for the line width.
+DASH_PATTERNS = {
+    "dotted": (None, 2),
+    "densely dotted": (None, 1),
+    "loosely dotted": (None, 4),
+    "dashed": (3, 3),
+    "densely dashed": (3, 2),
+    "loosely dashed": (3, 6),
+    "dash dot": (3, 2, None, 2),
+    "densely dash dot": (3, 1, None, 1),
+}
+
+# Text height and depth as a fraction of the font size, the same as in the TikZ template
+TEXT_HEIGHT = 0.75
+TEXT_DEPTH = 0.24
+
+LATEX_REPLACEMENTS = (
+    (re.compile(r"\\raisebox\{[^}]*\}"), ""),
+    (re.compile(r"\\textdegree\s*"), "\u00b0"),
+    (re.compile(r"--"), "\u2013"),
+    (re.compile(r"\\[,;:! ]"), ""),
+    (re.compile(r"\\[A-Za-z]+\*?\s*"), ""),
+    (re.compile(r"[{}$]"), ""),
+)
+
+
+def number(value):
+    """Formats the given number with a precision of a micrometer."""
+    s = f"{value:.3f}".rstrip("0").rstrip(".")
+    if s == "-0":
+        return "0"
+    return s
+
+
+def unit(angle):
+    """Returns the unit vector at the given angle in degrees."""
+    angle = math.radians(angle)
+    return Point(math.cos(angle), math.sin(angle))
+
+
+def plain_text(text):
+    """Returns the given LaTeX label text without markup."""
+    for pattern, replacement in LATEX_REPLACEMENTS:
+        text = pattern.sub(replacement, text)
+    return " ".join(text.split())
+
+
+class SvgDocument(object):
+    """SVG document class, with the same interface as the Tikz document.
+
+    Args:
+        name (str): the base name for the svg file
+        papersize (skymap.tikz.Papersize): PaperSize instance indicating the page dimensions
+        margins (skymap.tikz.PaperMargin): PaperMargin instance describing the margins to use
+        normalsize (int): the standard fontsize to use
+        output_folder (str): the folder to write the svg file to, if no other path is given
+    """
+
+    def __init__(
+        self,
+        name="none",
+        papersize=PaperSize(),
+        margins=PaperMargin(),
+        normalsize=11,
+        output_folder=TEX_OUTPUT_FOLDER,
+    ):
+        self.name = name
+        self.papersize = papersize
+        self.margins = margins
+        self.normalsize = normalsize
+        self.fontsizes = FontSize(normalsize)
+        self.output_folder = output_folder
+
+        # Landmark points
+        self.llcorner = Point(self.margins.l, self.margins.b)
+        self.ulcorner = Point(self.margins.l, self.papersize.height - self.margins.t)
+        self.urcorner = Point(
+            self.papersize.width - self.margins.r,
+            self.papersize.height - self.margins.t,
+        )
+        self.lrcorner = Point(self.papersize.width - self.margins.r, self.margins.b)
+        self.center = 0.5 * (self.llcorner + self.urcorner)
+
+        # Usable size
+        self.width = self.papersize.width - self.margins.l - self.margins.r
+        self.height = self.papersize.height - self.margins.b - self.margins.t
+
+        self.pictures = []
+        self.clip_paths = 0
+
+    @property
+    def picture_class(self):
+        """The backend of the DocumentPictures added to the document."""
+        return SvgPicture
+
+    def add(self, picture):
+        """Add the given picture to the document."""
+        if self.pictures and not self.pictures[-1].closed:
+            self.pictures[-1].close()
+
+        self.pictures.append(picture)
+
+    def new(self, name):
+        return SvgDocument(
+            name, self.papersize, self.margins, self.normalsize, self.output_folder
+        )
+
+    def new_clip_id(self):
+        """Returns a new unique id for a clip path."""
+        self.clip_paths += 1
+        return f"clip{self.clip_paths}"
+
+    def render(self, filepath=None):
+        """Writes the document to an SVG file.
+
+        Args:
+            filepath: where to save the SVG file, by default in the output folder
+
+        Returns:
+            str: the path of the SVG file
+        """
+        if self.pictures and not self.pictures[-1].opened:
+            self.pictures[-1].open()
+
+        if self.pictures and not self.pictures[-1].closed:
+            self.pictures[-1].close()
+
+        if filepath is None:
+            filepath = os.path.join(self.output_folder, f"{self.name}.svg")
+        folder = os.path.dirname(filepath)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        width = number(self.papersize.width)
+        height = number(self.papersize.height)
+        with io.open(filepath, mode="w", encoding="utf-8") as fp:
+            fp.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            fp.write(
+                '<svg xmlns="http://www.w3.org/2000/svg" '
+                f'width="{width}mm" height="{height}mm" viewBox="0 0 {width} {height}" '
+                'font-family="Myriad Pro SemiCondensed, sans-serif">\n'
+            )
+            for p in self.pictures:
+                p.write_to(fp)
+            fp.write("</svg>\n")
+
+        return filepath
+
+
+class SvgPicture(Picture):
+    """Part of the SVG page that can be used for drawing.
+
+    The picture uses the same coordinates as the TikzPicture, in millimeters with the y-axis pointing up. The SVG
+    coordinates are calculated when writing.
+
+    Args:
+        document (SvgDocument): the document to add the picture to
+        p1 (skymap.geometry.Point): the lower left corner of the picture, in paper coordinates
+        p2 (skymap.geometry.Point): the upper right corner of the picture, in paper coordinates
+        origin (skymap.geometry.Point): the location of the origin of the picture's coordinate
+            system, in paper coordinates
+        boxed (bool): whether to draw a box around the picture
+        box_linewidth (float): the linewidth of the box, in points
+    """
+
+    def __init__(self, document, p1, p2, origin=None, boxed=True, box_linewidth=0.5):
+        self.document = document
+        self.chunks = []
+        Picture.__init__(self, document, p1, p2, origin, boxed, box_linewidth)
+
+    @property
+    def svgstring(self):
+        """Returns the SVG code of the picture."""
+        return "".join(self.chunks)
+
+    def write(self, s):
+        """Adds the given SVG code to the picture."""
+        self.chunks.append(s)
+
+    def write_to(self, fp):
+        """Writes the SVG code of the picture to the given file."""
+        fp.writelines(self.chunks)
+
+    def svg_coordinates(self, p):
+        """Returns the SVG x and y coordinates of the given picture point, as strings."""
+        x = self.origin.x + p.x
+        y = self.document.papersize.height - self.origin.y - p.y
+        return number(x), number(y)
+
+    def svg_points(self, xy):
+        """Returns the SVG points attribute for the given (N, 2) array of picture coordinates."""
+        xy = np.asarray(xy, dtype=float)
+        x = self.origin.x + xy[:, 0]
+        y = self.document.papersize.height - self.origin.y - xy[:, 1]
+        return " ".join(
+            f"{number(a)},{number(b)}" for a, b in zip(x.tolist(), y.tolist())
+        )
+
+    def begin(self):
+        """Writes the start of the picture group."""
+        self.write("<g>\n")
+
+    def end(self):
+        """Writes the end of the picture group."""
+        self.write("</g>\n")
+
+    def comment(self, comment, prefix_newline=True):
+        """Adds a comment to the SVG file.
+
+        Args:
+            comment (str): the comment to add
+            prefix_newline (bool): whether to add a newline before the comment
+        """
+        if comment:
+            comment = comment.replace("--", "- -")
+            self.write(f"<!-- {comment} -->\n")
+
+    @contextmanager
+    def clip(self, path=None):
+        """
+        Context manager for clipping the enclosed drawing actions to the given shape.
+
+        Args:
+            path: the Rectangle, Circle, Polygon or Polyline to clip to, or None for the bounding box
+        """
+        self.open()
+        if path is None:
+            path = self.bounding_box
+        if isinstance(path, Rectangle):
+            shape = self.rectangle_element(path, "")
+        elif isinstance(path, Circle):
+            shape = self.circle_element(path, "")
+        elif isinstance(path, Polygon):
+            points = self.svg_points([tuple(p) for p in path.points])
+            shape = f'<polygon points="{points}"/>'
+        elif isinstance(path, Polyline):
+            shape = f'<polygon points="{self.svg_points(path.xy)}"/>'
+        else:
+            raise DrawError(f"Cannot clip an SVG picture to {path}")
+
+        clip_id = self.document.new_clip_id()
+        self.write(f'<clipPath id="{clip_id}">{shape}</clipPath>\n')
+        self.write(f'<g clip-path="url(#{clip_id})">\n')
+        yield
+        self.write("</g>\n")
+
+    # Draw options
+    def stroke_attributes(self):
+        """Returns the stroke attributes for the current pen."""
+        linewidth = self.linewidth * MM_PER_POINT
+        attributes = (
+            f'fill="none" stroke="{self.color}" stroke-width="{number(linewidth)}"'
+        )
+        pattern = DASH_PATTERNS.get(self.pen_style)
+        if pattern is not None:
+            dashes = [
+                linewidth if length is None else length * MM_PER_POINT
+                for length in pattern
+            ]
+            attributes += f' stroke-dasharray="{" ".join(number(d) for d in dashes)}"'
+        return attributes
+
+    def fill_attributes(self):
+        """Returns the fill attributes for the current color."""
+        return f'fill="{self.color}" stroke="none"'
+
+    def rectangle_element(self, rectangle, attributes):
+        x, y = self.svg_coordinates(Point(rectangle.p1.x, rectangle.p2.y))
+        width, height = rectangle.size
+        width, height = number(width), number(height)
+        element = f'<rect x="{x}" y="{y}" width="{width}" height="{height}"'
+        return f"{element} {attributes}".rstrip() + "/>"
+
+    def circle_element(self, circle, attributes):
+        x, y = self.svg_coordinates(circle.center)
+        element = f'<circle cx="{x}" cy="{y}" r="{number(circle.radius)}"'
+        return f"{element} {attributes}".rstrip() + "/>"
+
+    # Drawing primitives
+
+    def draw_line(self, line, delay_write=False):
+        """Draw the given line."""
+        self.open()
+        if not hasattr(line, "p1") or not hasattr(line, "p2"):
+            raise DrawError
+        x1, y1 = self.svg_coordinates(line.p1)
+        x2, y2 = self.svg_coordinates(line.p2)
+        attributes = self.stroke_attributes()
+        self.write(f'<line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" {attributes}/>\n')
+
+    def draw_polygon(self, polygon, cycle=False, delay_write=False):
+        """Draw a polygon connecting the given points."""
+        self.open()
+        if not polygon.points:
+            return
+        element = "polygon" if cycle else "polyline"
+        points = self.svg_points([tuple(p) for p in polygon.points])
+        self.write(f'<{element} points="{points}" {self.stroke_attributes()}/>\n')
+
+    def draw_polyline(self, polyline, delay_write=False):
+        """Draw the given polyline."""
+        self.open()
+        if len(polyline) < 2:
+            return
+        element = "polygon" if polyline.closed else "polyline"
+        points = self.svg_points(polyline.xy)
+        self.write(f'<{element} points="{points}" {self.stroke_attributes()}/>\n')
+
+    def draw_rectangle(self, rectangle, delay_write=False):
+        """Draw the given rectangle."""
+        self.open()
+        if not hasattr(rectangle, "p1") or not hasattr(rectangle, "p2"):
+            raise DrawError
+        self.write(self.rectangle_element(rectangle, self.stroke_attributes()) + "\n")
+
+    def draw_circle(self, circle, delay_write=False):
+        """Draw the given circle."""
+        self.open()
+        if not hasattr(circle, "center") or not hasattr(circle, "radius"):
+            raise DrawError
+        self.write(self.circle_element(circle, self.stroke_attributes()) + "\n")
+
+    def draw_arc(self, arc, delay_write=False):
+        """Draw the given arc, counterclockwise from the start angle to the stop angle."""
+        self.open()
+        if (
+            not hasattr(arc, "center")
+            or not hasattr(arc, "radius")
+            or not hasattr(arc, "start_angle")
+            or not hasattr(arc, "stop_angle")
+        ):
+            raise DrawError
+        if arc.radius > 2000:
+            self.draw_interpolated_arc(arc, delay_write)
+            return
+
+        sweep = arc.stop_angle - arc.start_angle
+        if abs(sweep) >= 360:
+            self.draw_circle(Circle(arc.center, arc.radius))
+            return
+
+        x1, y1 = self.svg_coordinates(arc.center + arc.radius * unit(arc.start_angle))
+        x2, y2 = self.svg_coordinates(arc.center + arc.radius * unit(arc.stop_angle))
+        r = number(arc.radius)
+
+        # The y-axis points down in SVG, so counterclockwise arcs have a sweep flag of 0
+        large_arc = int(abs(sweep) > 180)
+        sweep_flag = int(sweep < 0)
+        path = f"M {x1},{y1} A {r},{r} 0 {large_arc} {sweep_flag} {x2},{y2}"
+        self.write(f'<path d="{path}" {self.stroke_attributes()}/>\n')
+
+    def draw_label(self, label, delay_write=False):
+        """Draw the given label as plain text."""
+        self.open()
+
+        fontsize = self.document.fontsizes[label.fontsize] * MM_PER_POINT
+        position = label.position.split()
+
+        # Offset of the text anchor from the label point, before rotation
+        dx = 0
+        dy = -0.5 * (TEXT_HEIGHT - TEXT_DEPTH) * fontsize
+        anchor = "middle"
+        if "above" in position:
+            dy = label.distance + TEXT_DEPTH * fontsize
+        elif "below" in position:
+            dy = -label.distance - TEXT_HEIGHT * fontsize
+        if "left" in position:
+            dx = -label.distance
+            anchor = "end"
+        elif "right" in position:
+            dx = label.distance
+            anchor = "start"
+
+        x, y = self.svg_coordinates(label.point)
+        tx, ty = self.svg_coordinates(label.point + Point(dx, dy))
+        attributes = (
+            f'font-size="{number(fontsize)}" text-anchor="{anchor}" fill="{self.color}"'
+        )
+        if label.bold:
+            attributes += ' font-weight="bold"'
+        if label.angle:
+            attributes += f' transform="rotate({number(-label.angle)} {x} {y})"'
+
+        text = escape(plain_text(label.text))
+        self.write(f'<text x="{tx}" y="{ty}" {attributes}>{text}</text>\n')
+
+    def fill_circle(self, circle, delay_write=False):
+        """Draw the given circle and fill it."""
+        self.open()
+        if not hasattr(circle, "center") or not hasattr(circle, "radius"):
+            raise DrawError
+        self.write(self.circle_element(circle, self.fill_attributes()) + "\n")
+
+    def fill_rectangle(self, rectangle, delay_write=False):
+        """Draw the given rectangle and fill it."""
+        self.open()
+        self.write(self.rectangle_element(rectangle, self.fill_attributes()) + "\n")
@@ -9,17 +9,80 @@ import subprocess
 import shutil
 import jinja2
 import io
+import hashlib
+import tempfile
+import functools
+from concurrent.futures import ThreadPoolExecutor
 
 from skymap.geometry import Point
 from skymap.tikz import PaperSize, FontSize, PaperMargin
+from skymap.tikz.tikz_picture import TikzPicture
 
 BASEDIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 TEX_OUTPUT_FOLDER = os.path.join(BASEDIR, "temp")
 PDF_FOLDER = os.path.join(BASEDIR, "pdf")
 JINJA_TEMPLATE_FOLDER = os.path.join(BASEDIR, "skymap", "tikz", "templates")
+AUX_CACHE_FOLDER = os.path.join(BASEDIR, "cache", "aux")
+FORMAT_CACHE_FOLDER = os.path.join(BASEDIR, "cache", "formats")
+
+# Placeholder for the picture code in the rendered document
+CONTENT_MARKER = "%% SKYMAP CONTENT %%\n"
+
+# End of the part of the preamble that is stored in a precompiled format (see the mylatexformat package)
+ENDOFDUMP = "\\csname endofdump\\endcsname"
+
+# Rough estimate of the words of TeX main memory used by a single drawn element, like a circle or a line
+TEX_MEMORY_PER_ELEMENT = 200
+
+# The main memory of XeLaTeX (main_memory in the texmf.cnf of TeX Live), of which about half is left for the pictures
+# of a page after loading the packages and fonts
+TEX_MAIN_MEMORY = 5000000
+TEX_PICTURE_MEMORY = TEX_MAIN_MEMORY // 2
+
+# Precompiled formats that failed to build, which are not tried again by this process
+FAILED_FORMATS = set()
+
 if platform.system() == "Darwin":
     os.environ["PATH"] = "/Library/TeX/texbin:" + os.environ["PATH"]
 
+# Jinja2 environment shared by all documents, so the templates are only loaded and compiled once
+JINJA_ENVIRONMENT = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(JINJA_TEMPLATE_FOLDER), trim_blocks=True
+)
+
+
+@functools.lru_cache(maxsize=None)
+def document_template(template_name):
+    """
+    Returns the compiled template for documents based on the given template.
+
+    The picture code is written in place of the CONTENT_MARKER in the rendered template. The compiled template is
+    cached, so it is compiled only once per template name.
+
+    Args:
+        template_name (str): the name of the base template in the template folder
+
+    Returns:
+        jinja2.Template: the compiled template
+    """
+    source = (
+        f"{{% extends '{template_name}' %}}\n\n"
+        "{% block content %}\n"
+        "{{ super() }}\n"
+        f"{CONTENT_MARKER}"
+        "{% endblock %}\n"
+    )
+    return JINJA_ENVIRONMENT.from_string(source)
+
+
+@functools.lru_cache(maxsize=None)
+def xelatex_version():
+    """Returns the version banner of the installed XeLaTeX, or an empty string if it can not be run."""
+    try:
+        return subprocess.check_output(["xelatex", "--version"]).decode(errors="replace")
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return ""
+
 
 class Tikz(object):
     """
@@ -30,8 +93,20 @@ class Tikz(object):
         papersize (skymap.tikz.Papersize): PaperSize instance indicating the page dimensions
         margins (skymap.tikz.PaperMargin): PaperMargin instance describing the margins to use
         normalsize (int): the standard fontsize to use
+        template (str): the name of the base template
+        output_folder (str): the folder for the tex file and the XeLaTeX output
+        aux_cache_folder (str): the folder to cache the .aux files of compiled documents in, or None to not cache them
+        format_cache_folder (str): the folder to store the precompiled formats in, or None to not use them
+        precision (int): the number of decimals of the coordinates in millimeters, or None for full precision
+        max_layer_memory (int): the estimated TeX memory in words above which the page is rendered in layers, or
+            None to never split the page
+        layer_processes (int): the number of layers to compile in parallel, None for one per CPU; one by default, as
+            the atlas builder already renders pages in parallel, bounded by its limit on concurrent XeLaTeX runs
     """
 
+    # The backend of the DocumentPictures added to the document
+    picture_class = TikzPicture
+
     def __init__(
         self,
         name="none",
@@ -39,6 +114,12 @@ class Tikz(object):
         margins=PaperMargin(),
         normalsize=11,
         template=None,
+        output_folder=TEX_OUTPUT_FOLDER,
+        aux_cache_folder=AUX_CACHE_FOLDER,
+        format_cache_folder=FORMAT_CACHE_FOLDER,
+        precision=None,
+        max_layer_memory=TEX_PICTURE_MEMORY,
+        layer_processes=1,
     ):
         self.logger = logging.getLogger(__name__)
         logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
@@ -49,6 +130,12 @@ class Tikz(object):
         self.normalsize = normalsize
         self.fontsizes = FontSize(normalsize)
         self.template = template or "tikz_base.j2"
+        self.output_folder = output_folder
+        self.aux_cache_folder = aux_cache_folder
+        self.format_cache_folder = format_cache_folder
+        self.precision = precision
+        self.max_layer_memory = max_layer_memory
+        self.layer_processes = layer_processes
 
         # Landmark points
         self.llcorner = Point(self.margins.l, self.margins.b)
@@ -68,17 +155,7 @@ class Tikz(object):
         self.delayed = []
         self.pictures = []
 
-        # Header/footer
-        self.header = (
-            f"{{% extends '{self.template}' %}}\n\n"
-            "{% block content %}\n"
-            "{{ super() }}\n"
-        )
-        self.footer = "{% endblock %}\n"
-
-        self.j2_env = jinja2.Environment(
-            loader=jinja2.FileSystemLoader(JINJA_TEMPLATE_FOLDER), trim_blocks=True
-        )
+        self.j2_env = JINJA_ENVIRONMENT
 
     def add(self, picture):
         """Add the given picture to the document."""
@@ -88,17 +165,22 @@ class Tikz(object):
         self.pictures.append(picture)
 
     def new(self, name):
-        return Tikz(name, self.papersize, self.margins, self.normalsize, self.template)
-
-    def render(self, filepath=None, open_pdf=False, extra_context=None, verbose=False):
-        """Render the current document as a PDF file.
+        return Tikz(
+            name,
+            self.papersize,
+            self.margins,
+            self.normalsize,
+            self.template,
+            self.output_folder,
+            self.aux_cache_folder,
+            self.format_cache_folder,
+            self.precision,
+            self.max_layer_memory,
+            self.layer_processes,
+        )
 
-        Args:
-            filepath: where to save the PDF
-            open_pdf: whether to open the PDF when ready
-            extra_context: dictionary containing extra context items for the jinja2 template
-            verbose: whether to log all actions
-        """
+    def close_pictures(self):
+        """Closes the last picture, opening it first if nothing was drawn in it yet."""
         if self.pictures and not self.pictures[-1].opened:
             self.logger.info("Open")
             self.pictures[-1].open()
@@ -107,18 +189,49 @@ class Tikz(object):
             self.logger.info("Close")
             self.pictures[-1].close()
 
-        # Build the template souce string
-        texstring = self.header
-        for p in self.pictures:
-            texstring += p.texstring
-        texstring += self.footer
+    def estimated_memory(self):
+        """Returns a rough estimate of the TeX main memory needed for the pictures of the document, in words."""
+        elements = sum(p.element_count for p in self.pictures)
+        return elements * TEX_MEMORY_PER_ELEMENT
+
+    def write_texfile(self, extra_context=None):
+        """Writes the current document to the tex file in the output folder.
+
+        The template is rendered once, without the pictures. The code of the pictures is streamed straight to the file,
+        between the rendered header and footer, so it is neither concatenated nor parsed by Jinja2.
 
-        # Render template
-        if not os.path.exists(TEX_OUTPUT_FOLDER):
-            os.makedirs(TEX_OUTPUT_FOLDER)
+        Args:
+            extra_context: dictionary containing extra context items for the jinja2 template
+
+        Returns:
+            str: the path of the tex file
+        """
+        self.close_pictures()
 
-        template = self.j2_env.from_string(texstring)
+        # Render the template once, without the pictures
+        if not os.path.exists(self.output_folder):
+            os.makedirs(self.output_folder)
+
+        header, footer = self.render_template(extra_context)
+
+        texfile = os.path.join(self.output_folder, self.texfile_name)
+        with io.open(texfile, mode="w", encoding="utf-8") as fp:
+            fp.write(header)
+            for p in self.pictures:
+                p.write_to(fp)
+            fp.write(footer)
+
+        return texfile
+
+    def render_template(self, extra_context=None):
+        """Renders the document template, without the pictures.
+
+        Args:
+            extra_context: dictionary containing extra context items for the jinja2 template
 
+        Returns:
+            tuple: the rendered document before and after the pictures
+        """
         context = {
             "paperwidth": self.papersize.width,
             "paperheight": self.papersize.height,
@@ -128,65 +241,282 @@ class Tikz(object):
         if extra_context:
             context.update(extra_context)
 
-        rendered_template = template.render(context)
-        with io.open(
-            os.path.join(TEX_OUTPUT_FOLDER, self.texfile_name),
-            mode="w",
-            encoding="utf-8",
-        ) as fp:
-            fp.write(rendered_template)
+        template = document_template(self.template)
+        header, footer = template.render(context).split(CONTENT_MARKER)
+        return header, footer
 
-        # Run XeLaTeX
-        if verbose:
-            self.logger.info(
-                f"Rendering {filepath or os.path.join(TEX_OUTPUT_FOLDER, self.texfile_name)}"
-            )
+    def run_xelatex(self, format_file=None):
+        """Runs XeLaTeX once on the tex file in the output folder, optionally with the given precompiled format."""
+        options = []
+        if format_file is not None:
+            options.append(f"-fmt={format_file}")
+        subprocess.check_output(
+            [
+                "xelatex",
+                "-halt-on-error",
+                "-interaction",
+                "batchmode",
+                *options,
+                "-output-directory",
+                self.output_folder,
+                self.texfile_name,
+            ],
+            cwd=self.output_folder,
+        )
 
-        xelatex_error = False
+    def format_name(self, texfile):
+        """Returns the name of the precompiled format for the given tex file, or None if the document does not mark
+        the end of the part of the preamble that is stored in the format.
+
+        The name is a hash of that part of the preamble and of the XeLaTeX version, as a format can only be loaded by
+        the XeLaTeX version that built it."""
+        digest = hashlib.sha1()
+        digest.update(xelatex_version().encode("utf-8"))
+        with io.open(texfile, mode="r", encoding="utf-8") as fp:
+            for line in fp:
+                if line.startswith(ENDOFDUMP):
+                    return digest.hexdigest()
+                digest.update(line.encode("utf-8"))
+        return None
+
+    def precompiled_format(self, texfile):
+        """Returns the precompiled format for the preamble of the given tex file, building it if needed.
+
+        The packages are loaded into the format with the mylatexformat package, up to the end of dump marker in the
+        preamble. Fonts can not be stored in a XeLaTeX format, so they are loaded after the marker. When the format
+        is used, XeLaTeX skips the preamble up to the marker. When building the format fails, for example because
+        mylatexformat is not installed, the failure is remembered and the normal preamble is used from then on.
+
+        Args:
+            texfile (str): the path of the tex file
+
+        Returns:
+            str: the path of the format file without the extension, or None if no format can be used
+        """
+        if self.format_cache_folder is None:
+            return None
+
+        name = self.format_name(texfile)
+        if name is None:
+            return None
+
+        format_file = os.path.join(self.format_cache_folder, name)
+        if format_file in FAILED_FORMATS:
+            return None
+        if os.path.exists(f"{format_file}.fmt"):
+            return format_file
+
+        # Build the format in a temporary folder, so concurrent jobs never read a partial format
+        if not os.path.exists(self.format_cache_folder):
+            os.makedirs(self.format_cache_folder, exist_ok=True)
+        folder = tempfile.mkdtemp(dir=self.format_cache_folder)
         try:
             subprocess.check_output(
                 [
                     "xelatex",
+                    "-ini",
                     "-halt-on-error",
                     "-interaction",
                     "batchmode",
+                    f"-jobname={name}",
+                    "-output-directory",
+                    folder,
+                    "&xelatex",
+                    "mylatexformat.ltx",
                     self.texfile_name,
                 ],
-                cwd=TEX_OUTPUT_FOLDER,
-            )
-            subprocess.check_output(
-                [
-                    "xelatex",
-                    "-halt-on-error",
-                    "-interaction",
-                    "batchmode",
-                    self.texfile_name,
-                ],
-                cwd=TEX_OUTPUT_FOLDER,
+                cwd=self.output_folder,
             )
+            os.replace(os.path.join(folder, f"{name}.fmt"), f"{format_file}.fmt")
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            self.logger.warning("Building the precompiled format failed, not using it")
+            FAILED_FORMATS.add(format_file)
+            return None
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+        return format_file
+
+    def cached_aux_file(self, texfile):
+        """Returns the path of the cached .aux file for the given tex file, which is keyed on the tex file contents."""
+        with open(texfile, "rb") as fp:
+            digest = hashlib.sha1(fp.read()).hexdigest()
+        return os.path.join(self.aux_cache_folder, f"{digest}.aux")
+
+    def render(self, filepath=None, open_pdf=False, extra_context=None, verbose=False):
+        """Render the current document as a PDF file.
+
+        The positions of the remembered TikZ nodes are only known after a first XeLaTeX run, which writes them to the
+        .aux file. A second run is only done when the .aux file changed during the first run. The cached .aux file of an
+        earlier compilation of the same tex file is used as the starting point, if available, so unchanged documents
+        only need a single run. The preamble is loaded from a precompiled format, which is shared by all documents
+        with the same template and page settings.
+
+        Pages that would need more TeX memory than max_layer_memory are rendered in layers, see render_layers.
+
+        Args:
+            filepath: where to save the PDF
+            open_pdf: whether to open the PDF when ready
+            extra_context: dictionary containing extra context items for the jinja2 template
+            verbose: whether to log all actions
+        """
+        self.close_pictures()
+        if (
+            self.max_layer_memory is not None
+            and self.estimated_memory() > self.max_layer_memory
+        ):
+            return self.render_layers(filepath, open_pdf, extra_context, verbose)
+
+        texfile = self.write_texfile(extra_context)
+
+        # Run XeLaTeX
+        if verbose:
+            self.logger.info(f"Rendering {filepath or texfile}")
+
+        auxfile = os.path.join(self.output_folder, f"{self.name}.aux")
+        cached_auxfile = None
+        if self.aux_cache_folder is not None:
+            cached_auxfile = self.cached_aux_file(texfile)
+            if os.path.exists(cached_auxfile):
+                shutil.copyfile(cached_auxfile, auxfile)
+
+        format_file = self.precompiled_format(texfile)
+
+        xelatex_error = False
+        try:
+            previous_aux = read_file(auxfile)
+            self.run_xelatex(format_file)
+            if read_file(auxfile) != previous_aux:
+                if verbose:
+                    self.logger.info("Positions changed, running XeLaTeX again")
+                self.run_xelatex(format_file)
         except subprocess.CalledProcessError as exc:
             self.logger.error("XeLaTeX compilation failed")
             self.logger.error("=" * 60)
             xelatex_error = exc
 
         # Open log file
-        with open(os.path.join(TEX_OUTPUT_FOLDER, self.name + ".log"), "r") as fp:
+        with open(os.path.join(self.output_folder, self.name + ".log"), "r") as fp:
             output = fp.read()
         if xelatex_error:
             self.logger.debug(output)
             raise xelatex_error
 
+        # Cache the .aux file, writing to a temporary file first so concurrent jobs never read a partial file
+        if cached_auxfile is not None and os.path.exists(auxfile):
+            if not os.path.exists(self.aux_cache_folder):
+                os.makedirs(self.aux_cache_folder, exist_ok=True)
+            tempname = f"{cached_auxfile}.{os.getpid()}.tmp"
+            shutil.copyfile(auxfile, tempname)
+            os.replace(tempname, cached_auxfile)
+
         # Move output file
         if filepath:
             folder = os.path.dirname(filepath)
             if folder and not os.path.exists(folder):
                 os.makedirs(folder)
-            shutil.move(os.path.join(TEX_OUTPUT_FOLDER, f"{self.name}.pdf"), filepath)
+            shutil.move(os.path.join(self.output_folder, f"{self.name}.pdf"), filepath)
             if open_pdf:
                 subprocess.Popen(["open", filepath]).wait()
 
         return output
 
+    def split_layers(self):
+        """Splits the pictures of the document into layers that each fit in max_layer_memory.
+
+        Returns:
+            list: the TikzLayers, from bottom to top
+        """
+        max_elements = max(1, self.max_layer_memory // TEX_MEMORY_PER_ELEMENT)
+        layers = []
+        for p in self.pictures:
+            for chunks, elements in p.layers(max_elements):
+                if not layers or layers[-1].element_count + elements > max_elements:
+                    layers.append(TikzLayer())
+                layers[-1].add(chunks, elements)
+        return layers
+
+    def render_layers(
+        self, filepath=None, open_pdf=False, extra_context=None, verbose=False
+    ):
+        """Render the current document in layers, which are compiled in parallel and stacked on a single page.
+
+        TeX keeps a page in main memory until it is shipped out, so splitting a huge picture into several pictures on
+        the same page would not help. Instead every layer is compiled as a separate document with the same page
+        settings, and the layer PDFs are included on top of each other with \\includegraphics.
+
+        Args:
+            filepath: where to save the PDF
+            open_pdf: whether to open the PDF when ready
+            extra_context: dictionary containing extra context items for the jinja2 template
+            verbose: whether to log all actions
+        """
+        layers = self.split_layers()
+        if verbose:
+            self.logger.info(f"Rendering {self.name} in {len(layers)} layers")
+
+        documents = []
+        for i, layer in enumerate(layers, 1):
+            document = self.new(f"{self.name}-layer{i}")
+            document.max_layer_memory = None
+            document.pictures.append(layer)
+            documents.append(document)
+
+        # XeLaTeX runs in a subprocess, so threads are enough to compile the layers in parallel
+        if not os.path.exists(self.output_folder):
+            os.makedirs(self.output_folder, exist_ok=True)
+        with ThreadPoolExecutor(self.layer_processes or os.cpu_count()) as executor:
+            renders = [
+                executor.submit(d.render, None, False, extra_context, verbose)
+                for d in documents
+            ]
+            for result in renders:
+                result.result()
+
+        page = self.new(self.name)
+        page.max_layer_memory = None
+        with TikzPicture(
+            page,
+            Point(0, 0),
+            Point(self.papersize.width, self.papersize.height),
+            origin=Point(0, 0),
+            boxed=False,
+        ) as picture:
+            for document in documents:
+                picture.write(
+                    f"\\node[anchor=base west] at (0mm,0mm) {{\\includegraphics{{{document.name}.pdf}}}};\n",
+                    elements=1,
+                )
+        return page.render(filepath, open_pdf, extra_context, verbose)
+
+
+class TikzLayer(object):
+    """The code of one or more closed tikzpictures, which is compiled as a separate document when a page is rendered
+    in layers."""
+
+    def __init__(self):
+        self.chunks = []
+        self.element_count = 0
+        self.opened = True
+        self.closed = True
+
+    def add(self, chunks, elements):
+        """Adds the given TikZ code chunks, which draw the given number of elements, to the layer."""
+        self.chunks.extend(chunks)
+        self.element_count += elements
+
+    def write_to(self, fp):
+        """Writes the TikZ code of the layer to the given file."""
+        fp.writelines(self.chunks)
+
+
+def read_file(filename):
+    """Returns the contents of the given file, or None if it does not exist."""
+    if not os.path.exists(filename):
+        return None
+    with open(filename, "rb") as fp:
+        return fp.read()
+
 
 if __name__ == "__main__":
     from skymap.tikz import TikzPicture
@@ -1,17 +1,23 @@
-import math
 from contextlib import contextmanager
-from skymap.geometry import Point, Line, Rectangle, Circle, Arc, Polygon, Clipper
 
+import numpy as np
 
-class DrawError(Exception):
-    pass
+from skymap.geometry import Point, Polyline
+from skymap.tikz.picture import Picture, DrawError
 
 
-class TikzPicture(object):
+# Maximum number of elements merged into a single path, to keep the lines in the tex file short
+MAX_MERGED_ELEMENTS = 200
+
+
+class TikzPicture(Picture):
     """Part of the Tikz page that can be used for drawing.
 
     It is enclosed by an optional box, and has its own origin.
 
+    Coordinates are rounded to the precision of the Tikz document. Consecutive lines and circles drawn with the same
+    options are merged into a single path, which keeps the tex file small and saves TeX memory.
+
     Args:
         tikz (skymap.tikz.Tikz): the Tikz object to add the TikzPicture to
         p1 (skymap.geometry.Point): the lower left corner of the picture, in paper coordinates
@@ -22,83 +28,149 @@ class TikzPicture(object):
     """
 
     def __init__(self, tikz, p1, p2, origin=None, boxed=True, box_linewidth=0.5):
-        # Make sure the p1 is lower left and p2 is upper right
-        self.p1 = Point(min(p1.x, p2.x), min(p1.y, p2.y))
-        self.p2 = Point(max(p1.x, p2.x), max(p1.y, p2.y))
+        # The TikZ code is collected as a list of chunks, which are joined or written to file once at the end
+        self.chunks = []
+        self.precision = tikz.precision
+        self.merge_paths = True
+
+        # The path that later elements can still be merged into
+        self.path_command = None
+        self.path_elements = []
+        self.path_end = None
+
+        # The number of drawn elements, the headers of the open scopes, and the places between elements where the
+        # picture can be split, with the scopes open at that place
+        self.element_count = 0
+        self.scopes = []
+        self.breaks = []
+        self.body_start = None
+        self.body_end = None
+
+        Picture.__init__(self, tikz, p1, p2, origin, boxed, box_linewidth)
 
-        if origin is None:
-            self.set_origin(0.5 * (p1 + p2))
-        else:
-            self.set_origin(origin)
-
-        # Calculate the picture coordinates of the corners
-        self.llcorner = Point(self.minx, self.miny)
-        self.lrcorner = Point(self.maxx, self.miny)
-        self.urcorner = Point(self.maxx, self.maxy)
-        self.ulcorner = Point(self.minx, self.maxy)
-
-        # Construct the borders of the picture
-        self.bottom_border = Line(self.llcorner, self.lrcorner)
-        self.right_border = Line(self.lrcorner, self.urcorner)
-        self.top_border = Line(self.urcorner, self.ulcorner)
-        self.left_border = Line(self.ulcorner, self.llcorner)
-        self.borderdict = {
-            "left": self.left_border,
-            "top": self.top_border,
-            "right": self.right_border,
-            "bottom": self.bottom_border,
-        }
-
-        self.clipper = Clipper(self.borderdict)
-
-        self.boxed = boxed
-        self.box_linewidth = box_linewidth
-
-        self.width = p2.x - p1.x
-        self.height = p2.y - p1.y
-
-        self.texstring = ""
-        self.pen_style = None
-        # self._dotted = False
-        # self._dashed = False
-        self.linewidth = 0.5
-        self.color = "black"
-        self.opened = False
-        self.closed = False
-
-        tikz.add(self)
-
-    def set_origin(self, origin):
+    @property
+    def texstring(self):
+        """Returns the TikZ code of the picture."""
+        self.flush_path()
+        return "".join(self.chunks)
+
+    def write(self, s, elements=0):
+        """Adds the given TikZ code to the picture.
+
+        Args:
+            s (str): the TikZ code to add
+            elements (int): the number of elements drawn by the code
         """
-        Sets the location of the origin of the coordinate system for the picture.
-        The minimum and maximum x and y values for the picture, as well as the bounding box, are determined as well.
+        self.flush_path()
+        self.append_chunk(s, elements)
+
+    def append_chunk(self, s, elements):
+        """Appends the given TikZ code to the chunks, and keeps track of the drawn elements.
 
         Args:
-            origin (skymap.geometry.Point): the location in absolute paper coordinates
+            s (str): the TikZ code to add
+            elements (int): the number of elements drawn by the code
         """
-        self.origin = origin
-        self.minx = self.p1.x - self.origin.x
-        self.maxx = self.p2.x - self.origin.x
-        self.miny = self.p1.y - self.origin.y
-        self.maxy = self.p2.y - self.origin.y
-
-        self.bounding_box = Rectangle(
-            Point(self.minx, self.miny), Point(self.maxx, self.maxy)
-        )
+        self.chunks.append(s)
+        if elements:
+            self.element_count += elements
+            self.add_break()
+
+    def add_break(self):
+        """Marks the end of the chunks as a place where the picture can be split into layers."""
+        self.breaks.append((len(self.chunks), self.element_count, tuple(self.scopes)))
+
+    def write_to(self, fp):
+        """Writes the TikZ code of the picture to the given file.
+
+        Args:
+            fp: the file object to write to
+        """
+        self.flush_path()
+        fp.writelines(self.chunks)
+
+    def layers(self, max_elements):
+        """Splits the closed picture into layers of at most max_elements elements each.
+
+        Every layer is a complete tikzpicture with the same position, so the layers can be compiled separately and
+        stacked. The picture is split between elements. When that is inside a clipping scope, the scope is closed at
+        the end of the layer and opened again with the same clipping path at the start of the next layer.
+
+        Args:
+            max_elements (int): the maximum number of elements per layer
+
+        Returns:
+            list: tuples of the TikZ code chunks and the number of elements of every layer
+        """
+        if not self.closed:
+            raise RuntimeError("Only closed pictures can be split into layers")
+
+        cuts = [(self.body_start, 0, ())]
+        previous = cuts[0]
+        for brk in self.breaks:
+            count = brk[1]
+            if count - cuts[-1][1] > max_elements and previous[0] > cuts[-1][0]:
+                # Cut before the element that does not fit anymore
+                cuts.append(previous)
+            previous = brk
+        cuts.append((self.body_end, self.element_count, ()))
+
+        head = self.chunks[: self.body_start]
+        tail = self.chunks[self.body_end :]
+        layers = []
+        for (start, start_count, opened), (stop, stop_count, closed) in zip(
+            cuts[:-1], cuts[1:]
+        ):
+            chunks = (
+                head
+                + list(opened)
+                + self.chunks[start:stop]
+                + ["\\end{scope}\n"] * len(closed)
+                + tail
+            )
+            layers.append((chunks, stop_count - start_count))
+        return layers
 
-    def _picture_to_paper(self, p):
-        return self.origin + p
+    def add_to_path(self, command, start, element, end=None):
+        """Adds an element to the current path, or starts a new path if the command differs.
 
-    def _paper_to_picture(self, p):
-        return p - self.origin
+        An element that starts where the previous element ended continues that subpath, otherwise a new subpath is
+        started at the start point.
 
-    def open(self):
-        """Open the picture for writing."""
-        if self.opened:
+        Args:
+            command (str): the TikZ command including the options, like \\draw or \\fill
+            start (str): the TikZ coordinates of the start of the element
+            element (str): the TikZ path of the element after the start point
+            end (str): the TikZ coordinates of the end of the element, if other elements can continue from it
+        """
+        if (
+            command != self.path_command
+            or not self.merge_paths
+            or len(self.path_elements) >= MAX_MERGED_ELEMENTS
+        ):
+            self.flush_path()
+            self.path_command = command
+
+        if start is not None and start == self.path_end:
+            self.path_elements.append(element)
+        else:
+            self.path_elements.append(f" {start}{element}")
+        self.path_end = end
+
+    def flush_path(self):
+        """Writes the current path."""
+        if not self.path_elements:
             return
-        if self.closed:
-            raise RuntimeError("You cannot re-open a TikzPicture")
+        elements = "".join(self.path_elements)
+        self.append_chunk(
+            f"{self.path_command}{elements};\n", len(self.path_elements)
+        )
+        self.path_command = None
+        self.path_elements = []
+        self.path_end = None
 
+    def begin(self):
+        """Writes the start of the tikzpicture environment."""
         if self.origin != Point(0, 0):
             shift = (
                 "{([shift={"
@@ -108,32 +180,17 @@ class TikzPicture(object):
         else:
             shift = "{(current page.south west)}"
 
-        self.texstring += f"\\begin{{tikzpicture}}[remember picture, overlay, shift={shift}, every node/.style={{inner sep=0mm, outer sep=0mm, minimum size=0mm, text height=\\normaltextheight, text depth=\\normaltextdepth}}]\n"
-        self.opened = True
-
-        if self.boxed:
-            self.draw_bounding_box()
-
-    def close(self):
-        """Close the picture for writing.
-
-        Args:
-            add_to_tikz_string (callable): the function to call with the picture tex string as argument.
-        """
-        if not self.opened or self.closed:
-            return
+        self.write(
+            f"\\begin{{tikzpicture}}[remember picture, overlay, shift={shift}, every node/.style={{inner sep=0mm, outer sep=0mm, minimum size=0mm, text height=\\normaltextheight, text depth=\\normaltextdepth}}]\n"
+        )
+        self.body_start = len(self.chunks)
 
+    def end(self):
+        """Writes the end of the tikzpicture environment."""
+        self.flush_path()
+        self.body_end = len(self.chunks)
         self.comment("")
-        self.texstring += "\\end{tikzpicture}\n\n"
-
-        self.closed = True
-
-    def __enter__(self):
-        self.open()
-        return self
-
-    def __exit__(self, *args):
-        self.close()
+        self.write("\\end{tikzpicture}\n\n")
 
     @contextmanager
     def clip(self, path=None):
@@ -141,21 +198,25 @@ class TikzPicture(object):
         Context manager for clipping the enclosed drawing actions to the given path.
 
         Args:
-            path (str): the clipping path to use
+            path: the clipping path to use, as a TikZ path string or a geometry object like a Rectangle
         """
         self.open()
         if path is None:
             path = self.bounding_box.path
+        elif not isinstance(path, str):
+            path = path.path
+        header = f"\\begin{{scope}}\n\\clip {path};\n"
         self.comment("Clipping")
-        self.texstring += "\\begin{scope}\n"
-        self.texstring += f"\\clip {path};\n"
+        self.write(header)
+        self.scopes.append(header)
         yield
         self.comment("End clipping")
-        self.texstring += "\\end{scope}\n"
+        self.write("\\end{scope}\n")
+        self.scopes.pop()
+        self.add_break()
 
-    @staticmethod
-    def point_to_coordinates(p):
-        """Converts the given point to Tikz coordinates.
+    def point_to_coordinates(self, p):
+        """Converts the given point to Tikz coordinates, rounded to the precision of the picture.
 
         Args:
             p (skymap.geometry.Point): the point to convert
@@ -163,8 +224,8 @@ class TikzPicture(object):
         Returns:
             str: the Tikz point representation
         """
-        x = p.x
-        y = p.y
+        x = self.round(p.x)
+        y = self.round(p.y)
         if abs(x) < 1e-4:
             x = 0.0
         if abs(y) < 1e-4:
@@ -172,6 +233,31 @@ class TikzPicture(object):
 
         return f"({x}mm,{y}mm)"
 
+    def round(self, value):
+        """Rounds the given length in millimeters to the precision of the picture."""
+        if self.precision is None:
+            return value
+        return round(value, self.precision)
+
+    def coordinates_array(self, xy):
+        """Converts the given (N, 2) array of points to a list of Tikz coordinates, in a single pass."""
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        if self.precision is not None:
+            xy = np.round(xy, self.precision)
+        xy = np.where(np.abs(xy) < 1e-4, 0.0, xy)
+        return [f"({x}mm,{y}mm)" for x, y in xy.tolist()]
+
+    def write_paths(self, command, elements):
+        """Writes the given path elements with the given command, in paths of at most MAX_MERGED_ELEMENTS elements.
+
+        Args:
+            command (str): the TikZ command including the options, like \\draw or \\fill
+            elements (list): the TikZ paths of the elements, each starting with a space
+        """
+        for i in range(0, len(elements), MAX_MERGED_ELEMENTS):
+            chunk = elements[i : i + MAX_MERGED_ELEMENTS]
+            self.write(f"{command}{''.join(chunk)};\n", len(chunk))
+
     def path(self, points, cycle=True):
         """Builds a Tikz path from the given list of points.
 
@@ -199,41 +285,9 @@ class TikzPicture(object):
             s = ""
         if comment:
             s += f"% {comment}\n"
-        self.texstring += s
+        self.write(s)
 
     # Draw options
-    @property
-    def dotted(self):
-        return self.pen_style == "dotted"
-
-    @property
-    def dashed(self):
-        return self.pen_style == "dashed"
-
-    def solid_pen(self):
-        """Set the pen style to solid."""
-        self.pen_style = None
-
-    def dotted_pen(self):
-        """Set the pen style to dotted."""
-        self.pen_style = "dotted"
-
-    def densely_dotted_pen(self):
-        """Set the pen style to densely dotted."""
-        self.pen_style = "densely dotted"
-
-    def dashed_pen(self):
-        """Set the pen style to dashed."""
-        self.pen_style = "dashed"
-
-    def densely_dashed_pen(self):
-        """Set the pen style to densely dashed."""
-        self.pen_style = "densely dashed"
-
-    def densely_dash_dot_pen(self):
-        """Set the pen style to densely dash dot."""
-        self.pen_style = "densely dash dot"
-
     def draw_options(self):
         """Returns the draw options currently set as a TikZ string."""
         options = "["
@@ -259,7 +313,7 @@ class TikzPicture(object):
         p1 = self.point_to_coordinates(line.p1)
         p2 = self.point_to_coordinates(line.p2)
         opts = self.draw_options()
-        self.texstring += f"\\draw {opts} {p1}--{p2};\n"
+        self.add_to_path(f"\\draw {opts}", p1, f"--{p2}", p2)
 
     def draw_path(self, path, delay_write=False):
         """Draw the given path.
@@ -270,7 +324,7 @@ class TikzPicture(object):
         """
         self.open()
         opts = self.draw_options()
-        self.texstring += f"\\draw {opts} {path};\n"
+        self.write(f"\\draw {opts} {path};\n", elements=1)
 
     def draw_polygon(self, polygon, cycle=False, delay_write=False):
         """Draw a polygon connecting the given points.
@@ -284,15 +338,25 @@ class TikzPicture(object):
         #    self.draw_circle(Circle(p, 2))
         self.open()
         opts = self.draw_options()
-        cmd = f"\\draw {opts}"
-        for p in polygon.points:
-            cmd += self.point_to_coordinates(p)
-            cmd += "--"
+        path = "--".join(self.point_to_coordinates(p) for p in polygon.points)
         if cycle:
-            cmd += "cycle;\n"
-        else:
-            cmd = cmd[:-2] + ";\n"
-        self.texstring += cmd
+            path += "--cycle"
+        self.write(f"\\draw {opts}{path};\n", elements=1)
+
+    def draw_polyline(self, polyline, delay_write=False):
+        """Draw the given polyline.
+
+        Args:
+            polyline: the polyline to draw
+            delay_write:
+        """
+        self.open()
+        if len(polyline) < 2:
+            return
+        if self.precision is not None:
+            polyline = Polyline(np.round(polyline.xy, self.precision))
+        opts = self.draw_options()
+        self.write(f"\\draw {opts}{polyline.path};\n", elements=1)
 
     def draw_rectangle(self, rectangle, delay_write=False):
         """Draw the given rectangle.
@@ -307,7 +371,7 @@ class TikzPicture(object):
         p1 = self.point_to_coordinates(rectangle.p1)
         p2 = self.point_to_coordinates(rectangle.p2)
         opts = self.draw_options()
-        self.texstring += f"\\draw {opts} {p1} rectangle {p2};\n"
+        self.write(f"\\draw {opts} {p1} rectangle {p2};\n", elements=1)
 
     def draw_circle(self, circle, delay_write=False):
         """Draw the given circle.
@@ -321,7 +385,9 @@ class TikzPicture(object):
             raise DrawError
         c = self.point_to_coordinates(circle.center)
         opts = self.draw_options()
-        self.texstring += f"\\draw {opts} {c} circle ({circle.radius}mm);\n"
+        self.add_to_path(
+            f"\\draw {opts}", c, f" circle ({self.round(circle.radius)}mm)"
+        )
 
     def draw_arc(self, arc, delay_write=False):
         """Draw the given arc.
@@ -341,32 +407,14 @@ class TikzPicture(object):
         if arc.radius > 2000:
             self.draw_interpolated_arc(arc, delay_write)
             return
-        c = f"([shift=({arc.start_angle}:{arc.radius}mm)]"
+        radius = self.round(arc.radius)
+        c = f"([shift=({arc.start_angle}:{radius}mm)]"
         c += self.point_to_coordinates(arc.center)[1:]
         opts = self.draw_options()
-        self.texstring += f"\\draw {opts} {c} arc ({arc.start_angle}:{arc.stop_angle}:{arc.radius}mm);\n"
-
-    def draw_interpolated_arc(self, arc, delay_write=False):
-        """Draw the given arc as a polygon using interpolated points.
-
-        Args:
-            arc: the arc to draw
-            delay_write:
-        """
-        self.open()
-        self.draw_polygon(Polygon(arc.interpolated_points()), delay_write=delay_write)
-
-    def draw_bounding_box(self):
-        """Draw a bounding box around the picture.
-
-        Args:
-            linewidth: the linewidth to use
-        """
-        self.open()
-        old_linewidth = self.linewidth
-        self.linewidth = self.box_linewidth
-        self.draw_rectangle(self.bounding_box)
-        self.linewidth = old_linewidth
+        self.write(
+            f"\\draw {opts} {c} arc ({arc.start_angle}:{arc.stop_angle}:{radius}mm);\n",
+            elements=1,
+        )
 
     def draw_label(self, label, delay_write=False):
         """Draw the given label.
@@ -397,7 +445,7 @@ class TikzPicture(object):
         node_text = f"\\{label.fontsize} \\,{text}\\,"
 
         # self.fill_circle(Circle(label.point, 0.25))
-        self.texstring += f"\\draw {p} node[{node_options}] {{{node_text}}};\n"
+        self.write(f"\\draw {p} node[{node_options}] {{{node_text}}};\n", elements=1)
 
     def fill_circle(self, circle, delay_write=False):
         """Draw the given circle and fill it.
@@ -410,7 +458,44 @@ class TikzPicture(object):
         if not hasattr(circle, "center") or not hasattr(circle, "radius"):
             raise DrawError
         c = self.point_to_coordinates(circle.center)
-        self.texstring += f"\\fill [{self.color}] {c} circle ({circle.radius}mm);\n"
+        radius = self.round(circle.radius)
+        self.add_to_path(f"\\fill [{self.color}]", c, f" circle ({radius}mm)")
+
+    def fill_circles(self, xy, radii, color=None):
+        """Draw filled circles, like star symbols, in bulk.
+
+        The arrays are converted to TikZ code in a single pass, without creating geometry objects.
+
+        Args:
+            xy (numpy.ndarray): (N, 2) array of circle centers
+            radii: the radius of all circles, or an array with the radius of every circle
+            color (str): the fill color, by default the current color
+        """
+        self.open()
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), len(xy))
+        if self.precision is not None:
+            radii = np.round(radii, self.precision)
+        elements = [
+            f" {c} circle ({r}mm)"
+            for c, r in zip(self.coordinates_array(xy), radii.tolist())
+        ]
+        self.write_paths(f"\\fill [{color or self.color}]", elements)
+
+    def draw_polylines(self, polylines):
+        """Draw the given polylines in bulk, as subpaths of a single path with the current draw options.
+
+        Args:
+            polylines (list): the polylines, as Polyline objects or (N, 2) arrays
+        """
+        self.open()
+        elements = []
+        for polyline in polylines:
+            xy = polyline.xy if isinstance(polyline, Polyline) else polyline
+            coordinates = self.coordinates_array(xy)
+            if len(coordinates) > 1:
+                elements.append(" " + "--".join(coordinates))
+        self.write_paths(f"\\draw {self.draw_options()}", elements)
 
     def fill_rectangle(self, rectangle, delay_write=False):
         """Draw the given rectangle and fill it.
@@ -422,4 +507,4 @@ class TikzPicture(object):
         self.open()
         p1 = self.point_to_coordinates(rectangle.p1)
         p2 = self.point_to_coordinates(rectangle.p2)
-        self.texstring += f"\\fill [{self.color}] {p1} rectangle {p2};\n"
+        self.write(f"\\fill [{self.color}] {p1} rectangle {p2};\n", elements=1)
@@ -0,0 +1,121 @@
+import os
+import sys
+import unittest
+import tempfile
+import subprocess
+from unittest import mock
+
+from skymap.atlas.build import ChartJob, build_atlas, database_catalog_version
+
+
+class StubPage(object):
+    """Page that fails to render the given number of times, instead of running XeLaTeX."""
+
+    renders = {}
+
+    def __init__(self, name, output_folder, failures):
+        self.name = name
+        self.failures = failures
+        self.texfile_name = f"{name}.tex"
+        with open(os.path.join(output_folder, self.texfile_name), "w") as fp:
+            fp.write(name)
+
+    def render(self, filepath):
+        self.renders[self.name] = self.renders.get(self.name, 0) + 1
+        if self.renders[self.name] <= self.failures:
+            raise subprocess.CalledProcessError(1, "xelatex")
+        with open(filepath, "w") as fp:
+            fp.write(self.name)
+
+
+def build_stub(name, output_folder, failures=0):
+    return StubPage(name, output_folder, failures)
+
+
+class BuildAtlasTest(unittest.TestCase):
+    def setUp(self):
+        StubPage.renders.clear()
+        self.folder = tempfile.TemporaryDirectory()
+        self.output_folder = os.path.join(self.folder.name, "pdf")
+        self.work_folder = os.path.join(self.folder.name, "work")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_retries(self):
+        jobs = [
+            ChartJob("01", build_stub, (1,)),
+            ChartJob("02", build_stub, (5,)),
+            ChartJob("03", build_stub),
+        ]
+        with self.assertRaises(RuntimeError) as cm:
+            build_atlas(
+                jobs,
+                self.output_folder,
+                processes=1,
+                retries=1,
+                work_folder=self.work_folder,
+                cache_folder=None,
+            )
+
+        # Only the chart that keeps failing is reported, after all charts are done
+        self.assertIn("02", str(cm.exception))
+        self.assertNotIn("01", str(cm.exception))
+        self.assertEqual(StubPage.renders, {"01": 2, "02": 2, "03": 1})
+        self.assertTrue(os.path.exists(os.path.join(self.output_folder, "01.pdf")))
+        self.assertTrue(os.path.exists(os.path.join(self.output_folder, "03.pdf")))
+
+    def test_cache(self):
+        cache_folder = os.path.join(self.folder.name, "cache")
+
+        def build(jobs, version):
+            return build_atlas(
+                jobs,
+                self.output_folder,
+                processes=1,
+                work_folder=self.work_folder,
+                cache_folder=cache_folder,
+                catalog_version=version,
+            )
+
+        build([ChartJob("01", build_stub), ChartJob("02", build_stub)], "1")
+        self.assertEqual(StubPage.renders, {"01": 1, "02": 1})
+
+        # Unchanged charts are copied from the cache
+        os.remove(os.path.join(self.output_folder, "01.pdf"))
+        build([ChartJob("01", build_stub), ChartJob("02", build_stub)], "1")
+        self.assertEqual(StubPage.renders, {"01": 1, "02": 1})
+        self.assertTrue(os.path.exists(os.path.join(self.output_folder, "01.pdf")))
+
+        # Charts are rendered again when their arguments or the catalogs change
+        build([ChartJob("01", build_stub), ChartJob("02", build_stub, (0,))], "1")
+        self.assertEqual(StubPage.renders, {"01": 1, "02": 2})
+        build([ChartJob("01", build_stub)], "2")
+        self.assertEqual(StubPage.renders, {"01": 2, "02": 2})
+
+    def test_cache_without_catalogs(self):
+        cache_folder = os.path.join(self.folder.name, "cache")
+        jobs = [ChartJob("01", build_stub, catalogs=False)]
+
+        # The catalog version is not determined for charts that do not read the catalogs
+        with mock.patch("skymap.atlas.build.database_catalog_version") as version:
+            build_atlas(
+                jobs,
+                self.output_folder,
+                processes=1,
+                work_folder=self.work_folder,
+                cache_folder=cache_folder,
+            )
+        version.assert_not_called()
+        self.assertEqual(jobs[0].cache_key("1"), jobs[0].cache_key("2"))
+        self.assertNotEqual(
+            ChartJob("01", build_stub).cache_key("1"),
+            ChartJob("01", build_stub).cache_key("2"),
+        )
+
+    def test_database_unavailable(self):
+        database = mock.Mock()
+        database.SkyMapDatabase.side_effect = OSError("no database")
+        with mock.patch.dict(sys.modules, {"skymap.database": database}):
+            with self.assertLogs("skymap.atlas.build", "WARNING"):
+                self.assertIsNone(database_catalog_version())
@@ -59,6 +59,54 @@ class LineTest(unittest.TestCase):
         self.assertAlmostEqual(l.distance_point(Point(0, 0)), 0.5 * math.sqrt(2), 10)
 
 
+class PolylineTest(unittest.TestCase):
+    def test_polyline(self):
+        polyline = Polyline([Point(0, 0), Point(1, 0.001), Point(2, 0), Point(2, 1)])
+        self.assertEqual(len(polyline), 4)
+        self.assertEqual(polyline.p2, Point(2, 1))
+        self.assertAlmostEqual(polyline.rotate(90).p2.x, -1)
+        self.assertEqual(
+            polyline.path,
+            "(0.0mm,0.0mm)--(1.0mm,0.001mm)--(2.0mm,0.0mm)--(2.0mm,1.0mm)",
+        )
+
+        simplified = polyline.simplify(0.01)
+        self.assertEqual(simplified.points, [Point(0, 0), Point(2, 0), Point(2, 1)])
+
+    def test_adaptive(self):
+        def circle(t):
+            return np.column_stack([100 * np.cos(t), 100 * np.sin(t)])
+
+        polyline = Polyline.adaptive(circle, 0, 0.5 * math.pi, 0.05)
+        self.assertEqual(polyline.p1, Point(100, 0))
+        self.assertEqual(polyline.p2, Point(0, 100))
+        self.assertLess(len(polyline), 100)
+
+        # The largest distance between a chord and the arc is halfway the chord
+        midpoints = 0.5 * (polyline.xy[:-1] + polyline.xy[1:])
+        self.assertLess(np.max(100 - np.hypot(*midpoints.T)), 0.05)
+
+    def test_clip(self):
+        c = Clipper(
+            {
+                "left": Line(Point(0, 1), Point(0, 0)),
+                "top": Line(Point(2, 1), Point(0, 1)),
+                "right": Line(Point(2, 0), Point(2, 1)),
+                "bottom": Line(Point(0, 0), Point(2, 0)),
+            }
+        )
+        polyline = Polyline([(-1, 0.5), (0.5, 0.5), (1, 2), (1.5, 0.5), (1.8, 0.5)])
+        parts, borders = c.clip(polyline)
+        self.assertEqual(len(parts), 2)
+        self.assertEqual(
+            parts[0].points, [Point(0, 0.5), Point(0.5, 0.5), Point(2 / 3, 1)]
+        )
+        self.assertEqual(
+            parts[1].points, [Point(4 / 3, 1), Point(1.5, 0.5), Point(1.8, 0.5)]
+        )
+        self.assertEqual(borders, [("left", "top"), ("top", None)])
+
+
 class RotationTest(unittest.TestCase):
     def test_rotation(self):
         r = rotation_matrix((1, 0, 0), np.pi / 2)
@@ -121,3 +169,32 @@ class ClipperTest(unittest.TestCase):
         self.assertEqual(len(borders), 1)
         self.assertEqual(borders[0][0], None)
         self.assertEqual(borders[0][1], "right")
+
+    def test_clip_segments(self):
+        c = Clipper(
+            {
+                "left": Line(Point(0, 1), Point(0, 0)),
+                "top": Line(Point(2, 1), Point(0, 1)),
+                "right": Line(Point(2, 0), Point(2, 1)),
+                "bottom": Line(Point(0, 0), Point(2, 0)),
+            }
+        )
+        segments = [
+            (0.5, 0.5, 1.5, 0.5),
+            (-1, 0.5, 3, 0.5),
+            (1, 0.5, 1, 2),
+            (3, 0, 3, 1),
+            (-1, 0.5, 0, 0.5),
+        ]
+        clipped, keep = c.clip_segments(segments)
+        self.assertEqual(keep.tolist(), [True, True, True, False, False])
+        self.assertTrue(
+            np.allclose(
+                clipped[keep], [(0.5, 0.5, 1.5, 0.5), (0, 0.5, 2, 0.5), (1, 0.5, 1, 1)]
+            )
+        )
+        borders = c.point_borders(clipped[keep, 2], clipped[keep, 3])
+        self.assertEqual(borders.tolist(), [None, "right", "top"])
+
+        area = c.clip_polygon_area([(-1, -1), (1, -1), (1, 0.5), (-1, 0.5)])
+        self.assertTrue(np.allclose(area, [(1, 0), (1, 0.5), (0, 0.5), (0, 0)]))
@@ -1,9 +1,46 @@
+import os
 import unittest
+import tempfile
 from rtree.index import Index
 import random
 import timeit
 
-from skymap.labeling.label_size import calculate_label_sizes
+from skymap.labeling.label_size import (
+    calculate_label_sizes,
+    estimate_label_sizes,
+    LabelSizeCache,
+    label_font,
+    label_font_family,
+)
+from skymap.labeling.common import (
+    Point,
+    BoundingBox,
+    RandomLabeler,
+    evaluate,
+    evaluate_labels,
+    POINT_RADIUS,
+)
+from skymap.labeling.arrays import LabelCandidateArrays, build_conflict_graph
+from skymap.labeling.annealing import SimulatedAnnealingLabeler
+from skymap.labeling.genetic import CachedGeneticLabeler
+from skymap.labeling.greedy import AdvancedGreedyLabeler
+from skymap.labeling.grasp import GraspLabeler
+from skymap.labeling.partition import PartitionedLabeler, conflict_components
+from skymap.labeling.benchmark import LabelingProblem, run_benchmark
+from skymap.labeling.warmstart import LabelingSolution, WarmStartLabeler
+
+
+def random_points(npoints, nlabels, mapwidth, mapheight, seed=1):
+    rng = random.Random(seed)
+    points = []
+    for i in range(npoints):
+        x = mapwidth * rng.random()
+        y = mapheight * rng.random()
+        if rng.random() < float(nlabels) / npoints:
+            points.append(Point(x, y, POINT_RADIUS, f"Label for point {i}", 0))
+        else:
+            points.append(Point(x, y, POINT_RADIUS))
+    return points
 
 
 class Box(object):
@@ -104,10 +141,311 @@ class RTreeTest(unittest.TestCase):
 class LabelSizeTest(unittest.TestCase):
     def test_label_size(self):
         star_names = {1: "Albireo", 2: "Alcor", 3: u"Proxima Centauri \u03B1"}
-        result = calculate_label_sizes(star_names, normalsize=11, fontsize="Large")
+        result = calculate_label_sizes(
+            star_names, normalsize=11, fontsize="Large", cache_file=None
+        )
         self.assertIn(1, result.keys())
         self.assertIn(2, result.keys())
         self.assertIn(3, result.keys())
 
         self.assertAlmostEqual(result[1]["label_width"], 14.15, places=0)
         self.assertAlmostEqual(result[1]["label_height"], 3.75, places=0)
+
+    def test_estimated_label_size(self):
+        star_names = {1: "Albireo", 2: "Alcor", 3: u"Proxima Centauri \u03B1"}
+        result = estimate_label_sizes(star_names, normalsize=11, fontsize="Large")
+        self.assertEqual(set(result.keys()), {1, 2, 3})
+
+        self.assertAlmostEqual(result[1]["label_width"], 14.15, places=1)
+        self.assertAlmostEqual(result[1]["label_height"], 3.75, places=1)
+        self.assertGreater(result[3]["label_width"], result[1]["label_width"])
+
+        # The estimate uses the font of the template that calculate_label_sizes compiles
+        self.assertEqual(label_font_family(), "Myriad Pro SemiCondensed")
+
+    def test_cached_label_size(self):
+        with tempfile.TemporaryDirectory() as folder:
+            cache_file = os.path.join(folder, "label_sizes.json")
+            cache = LabelSizeCache(cache_file)
+            cache.set("Albireo", label_font(), "Large", 11, 14.15, 3.75)
+            cache.save()
+
+            result = calculate_label_sizes(
+                {1: "Albireo", 2: "Albireo"},
+                normalsize=11,
+                fontsize="Large",
+                cache_file=cache_file,
+            )
+            self.assertEqual(result[1]["label_width"], 14.15)
+            self.assertEqual(result[2]["label_height"], 3.75)
+
+
+class SimulatedAnnealingLabelerTest(unittest.TestCase):
+    def test_energy(self):
+        bounding_box = BoundingBox(0, 0, 1000, 1000)
+        points = random_points(500, 100, 1000, 1000)
+        labeler = SimulatedAnnealingLabeler(points, bounding_box, seed=1)
+        labeler.run()
+        self.assertAlmostEqual(labeler.energy(), evaluate(points, bounding_box))
+
+    def test_improves_on_random(self):
+        bounding_box = BoundingBox(0, 0, 1000, 1000)
+        points = random_points(500, 100, 1000, 1000)
+        random.seed(1)
+        RandomLabeler(points, bounding_box).run()
+        random_penalty = evaluate(points, bounding_box)
+
+        SimulatedAnnealingLabeler(points, bounding_box, seed=1).run()
+        self.assertLess(evaluate(points, bounding_box), random_penalty)
+
+    def test_extra_candidates(self):
+        bounding_box = BoundingBox(0, 0, 1000, 1000)
+        points = random_points(500, 100, 1000, 1000)
+        labeler = SimulatedAnnealingLabeler(
+            points, bounding_box, seed=1, extra_candidates=True
+        )
+        labeler.run()
+        self.assertAlmostEqual(labeler.energy(), evaluate(points, bounding_box))
+
+        extended = [p for p in points if p.extended]
+        self.assertGreater(len(extended), 0)
+        self.assertLess(len(extended), 100)
+        for p in points:
+            if p.text:
+                self.assertEqual(p.label.candidate_index, p.label_index)
+
+    def test_warm_start_extra_candidates(self):
+        bounding_box = BoundingBox(0, 0, 1000, 1000)
+        points = random_points(500, 100, 1000, 1000)
+        labeled_points = [p for p in points if p.text]
+        assignment = {p.key: 8 + i % 12 for i, p in enumerate(labeled_points)}
+
+        labeler = SimulatedAnnealingLabeler(
+            points,
+            bounding_box,
+            seed=1,
+            initial_assignment=assignment,
+            free_points=labeled_points[:10],
+        )
+        labeler.run()
+        self.assertAlmostEqual(labeler.energy(), evaluate(points, bounding_box))
+        for p in labeled_points[10:]:
+            self.assertEqual(p.label_index, assignment[p.key])
+
+    def test_drop_labels(self):
+        bounding_box = BoundingBox(0, 0, 500, 500)
+        points = random_points(500, 100, 500, 500)
+        for i, p in enumerate(points):
+            p.priority = 1 if i % 2 else 10
+
+        labeler = SimulatedAnnealingLabeler(
+            points, bounding_box, seed=1, drop_penalty=100
+        )
+        labeler.run()
+        dropped = [p for p in points if p.text and not p.label]
+        self.assertGreater(len(dropped), 0)
+        self.assertGreater(
+            len([p for p in dropped if p.priority == 1]),
+            len([p for p in dropped if p.priority == 10]),
+        )
+        self.assertAlmostEqual(
+            labeler.best_energy, evaluate(points, bounding_box, drop_penalty=100)
+        )
+
+    def test_time_budget(self):
+        bounding_box = BoundingBox(0, 0, 1000, 1000)
+        points = random_points(500, 100, 1000, 1000)
+        labeler = SimulatedAnnealingLabeler(points, bounding_box, time_budget=0)
+        labeler.run()
+        self.assertTrue(all(p.label for p in points if p.text))
+
+
+class CachedGeneticLabelerTest(unittest.TestCase):
+    def test_seed_extra_candidates(self):
+        bounding_box = BoundingBox(0, 0, 1000, 1000)
+        points = random_points(200, 40, 1000, 1000)
+        labeled_points = [p for p in points if p.text]
+        assignment = {p.key: 8 + i % 12 for i, p in enumerate(labeled_points[:20])}
+
+        labeler = CachedGeneticLabeler(
+            points, bounding_box, nindividuals=10, initial_assignment=assignment
+        )
+        population = labeler.toolbox.population(n=10)
+        labeler.seed_population(population)
+        for p, label_index in zip(labeled_points, population[0]):
+            self.assertLess(label_index, len(p.label_candidates))
+            if p.key in assignment:
+                self.assertEqual(label_index, assignment[p.key])
+        self.assertLess(labeler.evaluate_fitness(population[0])[0], 0)
+
+    def test_extra_candidates(self):
+        bounding_box = BoundingBox(0, 0, 1000, 1000)
+        points = random_points(200, 40, 1000, 1000)
+        labeled_points = [p for p in points if p.text]
+        assignment = {p.key: 8 for p in labeled_points[:20]}
+
+        # Random and mutated individuals also use the extra candidates
+        labeler = CachedGeneticLabeler(
+            points, bounding_box, nindividuals=10, initial_assignment=assignment
+        )
+        individual = labeler.toolbox.individual()
+        for i in range(50):
+            individual = labeler.toolbox.mutate(individual)[0]
+            for p, label_index in zip(labeled_points, individual):
+                self.assertLess(label_index, len(p.label_candidates))
+            if any(label_index >= 8 for label_index in individual):
+                break
+        else:
+            self.fail("No extra candidate used")
+
+
+class GraspLabelerTest(unittest.TestCase):
+    def test_deterministic(self):
+        bounding_box = BoundingBox(0, 0, 1000, 1000)
+        points = random_points(300, 60, 1000, 1000)
+        GraspLabeler(points, bounding_box, restarts=4, processes=1, seed=3).run()
+        result1 = [p.label_index for p in points]
+
+        GraspLabeler(points, bounding_box, restarts=4, processes=2, seed=3).run()
+        result2 = [p.label_index for p in points]
+
+        self.assertEqual(result1, result2)
+        self.assertTrue(all(p.label for p in points if p.text))
+
+
+class AdvancedGreedyLabelerTest(unittest.TestCase):
+    def test_all_labeled(self):
+        bounding_box = BoundingBox(0, 0, 1000, 1000)
+        points = random_points(500, 100, 1000, 1000)
+        AdvancedGreedyLabeler(points, bounding_box).run()
+        self.assertTrue(all(p.label for p in points if p.text))
+
+
+class LabelCandidateArraysTest(unittest.TestCase):
+    def test_penalties(self):
+        bounding_box = BoundingBox(0, 0, 1000, 1000)
+        points = random_points(1000, 300, 1000, 1000)
+        label_candidates = [lc for p in points for lc in p.label_candidates]
+
+        expected = evaluate_labels(label_candidates, points, bounding_box)
+        penalties = LabelCandidateArrays(label_candidates, points, bounding_box).penalties()
+        for p1, p2 in zip(expected, penalties):
+            self.assertAlmostEqual(p1, p2)
+
+    def test_extend_conflict_graph(self):
+        bounding_box = BoundingBox(0, 0, 1000, 1000)
+        points = random_points(1000, 300, 1000, 1000)
+        labeled_points = [p for p in points if p.text]
+        label_candidates = [lc for p in labeled_points for lc in p.label_candidates]
+
+        # Extending the graph twice gives the same conflicts as building it at once
+        graph = build_conflict_graph(label_candidates, points, bounding_box)
+        for batch in (labeled_points[:50], labeled_points[50:100]):
+            graph.extend([lc for p in batch for lc in p.extend_labels()])
+        self.assertEqual(len(graph.batches), 3)
+        extended = {
+            lc: dict(lc.conflicts) for p in labeled_points for lc in p.label_candidates
+        }
+
+        all_candidates = [lc for p in labeled_points for lc in p.label_candidates]
+        build_conflict_graph(all_candidates, points, bounding_box)
+        for lc in all_candidates:
+            self.assertEqual(extended[lc].keys(), lc.conflicts.keys())
+            for other, overlap in lc.conflicts.items():
+                self.assertAlmostEqual(extended[lc][other], overlap)
+
+
+class PartitionedLabelerTest(unittest.TestCase):
+    def test_components(self):
+        bounding_box = BoundingBox(0, 0, 1000, 1000)
+        points = random_points(500, 100, 1000, 1000)
+        components = conflict_components(points, bounding_box)
+        labeled_points = [p for c in components for p in c.labeled_points]
+        self.assertEqual(len(labeled_points), len([p for p in points if p.text]))
+        self.assertEqual(len(set(labeled_points)), len(labeled_points))
+
+    def test_all_labeled(self):
+        bounding_box = BoundingBox(0, 0, 1000, 1000)
+        points = random_points(500, 100, 1000, 1000)
+        random.seed(1)
+        RandomLabeler(points, bounding_box).run()
+        random_penalty = evaluate(points, bounding_box)
+
+        labeler = PartitionedLabeler(
+            points, bounding_box, labeler_kwargs={"seed": 1}, processes=1
+        )
+        labeler.run()
+        self.assertTrue(all(p.label for p in points if p.text))
+        self.assertLess(evaluate(points, bounding_box), random_penalty)
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_problem_file(self):
+        problem = LabelingProblem.synthetic(20, 20000)
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, "problem.json")
+            problem.save(filename)
+            loaded = LabelingProblem.load(filename)
+        self.assertEqual(loaded.bounding_box, problem.bounding_box)
+        self.assertEqual(loaded.point_data, problem.point_data)
+
+    def test_report(self):
+        problem = LabelingProblem.synthetic(50, 5000)
+        report = run_benchmark([problem], ["random", "advanced_greedy", "annealing"])
+        results = {r["labeler"]: r for r in report["results"]}
+        self.assertEqual(len(results), 3)
+        for result in results.values():
+            self.assertEqual(result["labeled"], 50)
+            self.assertGreater(result["peak_memory"], 0)
+        self.assertGreater(results["annealing"]["evaluations"], 0)
+        self.assertLess(results["annealing"]["penalty"], results["random"]["penalty"])
+
+
+class WarmStartLabelerTest(unittest.TestCase):
+    def setUp(self):
+        self.bounding_box = BoundingBox(0, 0, 1000, 1000)
+        points = random_points(500, 100, 1000, 1000)
+        SimulatedAnnealingLabeler(points, self.bounding_box, seed=1).run()
+        self.assignment = [p.label_index for p in points]
+
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, "solution.json")
+            LabelingSolution.from_points(points).save(filename)
+            self.solution = LabelingSolution.load(filename)
+
+    def test_unchanged(self):
+        points = random_points(500, 100, 1000, 1000)
+        labeler = WarmStartLabeler(points, self.bounding_box, self.solution)
+        self.assertEqual(len(labeler.free_points), 0)
+        labeler.run()
+        self.assertEqual([p.label_index for p in points], self.assignment)
+
+    def test_changed(self):
+        points = random_points(500, 100, 1000, 1000)
+        new_point = Point(500, 500, POINT_RADIUS, "New point", 0)
+        points.append(new_point)
+
+        labeler = WarmStartLabeler(points, self.bounding_box, self.solution)
+        self.assertIn(new_point, labeler.free_points)
+        self.assertLess(len(labeler.free_points), 20)
+
+        labeler.run()
+        self.assertTrue(all(p.label for p in points if p.text))
+        for p, label_index in zip(points, self.assignment):
+            if p not in labeler.free_points:
+                self.assertEqual(p.label_index, label_index)
+
+    def test_duplicate_texts(self):
+        points = [
+            Point(100, 100, POINT_RADIUS, "\\alpha", 0),
+            Point(500, 500, POINT_RADIUS, "\\alpha", 0),
+        ]
+        points[0].label_candidates[2].select()
+        points[1].label_candidates[5].select()
+        solution = LabelingSolution.from_points(points)
+        self.assertEqual(sorted(solution.assignment.values()), [2, 5])
+
+        for p in points:
+            p.label_index = None
+        WarmStartLabeler(points, self.bounding_box, solution).run()
+        self.assertEqual([p.label_index for p in points], [2, 5])
@@ -1,4 +1,6 @@
+import os
 import unittest
+import tempfile
 from skymap.atlas.cambridge_star_atlas import (
     CambridgeStarAtlasPage,
     CambridgeStarAtlasLegend,
@@ -7,41 +9,54 @@ from skymap.atlas.cambridge_star_atlas import (
 
 
 class MapInterfaceTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache.cleanup()
+
+    def page(self, name):
+        """Returns a chart page that caches its .aux files and formats in a temporary folder."""
+        page = CambridgeStarAtlasPage(name)
+        page.aux_cache_folder = os.path.join(self.cache.name, "aux")
+        page.format_cache_folder = os.path.join(self.cache.name, "formats")
+        return page
+
     def test_interface_conic(self):
         chart_number = 2
-        c = CambridgeStarAtlasPage("map_test1")
+        c = self.page("map_test1")
         CambridgeStarAtlasLegend(c, chart_number)
         CambridgeStarAtlasMap(c, chart_number)
         c.render()
 
         chart_number = 15
-        c = CambridgeStarAtlasPage("map_test2")
+        c = self.page("map_test2")
         CambridgeStarAtlasLegend(c, chart_number)
         CambridgeStarAtlasMap(c, chart_number)
         c.render()
 
     def test_interface_cylindrical(self):
         chart_number = 8
-        c = CambridgeStarAtlasPage("map_test3")
+        c = self.page("map_test3")
         CambridgeStarAtlasLegend(c, chart_number)
         CambridgeStarAtlasMap(c, chart_number)
         c.render()
 
         chart_number = 13
-        c = CambridgeStarAtlasPage("map_test4")
+        c = self.page("map_test4")
         CambridgeStarAtlasLegend(c, chart_number)
         CambridgeStarAtlasMap(c, chart_number)
         c.render()
 
     def test_interface_azimuthal(self):
         chart_number = 1
-        c = CambridgeStarAtlasPage("map_test5")
+        c = self.page("map_test5")
         CambridgeStarAtlasLegend(c, chart_number)
         CambridgeStarAtlasMap(c, chart_number)
         c.render()
 
         chart_number = 20
-        c = CambridgeStarAtlasPage("map_test6")
+        c = self.page("map_test6")
         CambridgeStarAtlasLegend(c, chart_number)
         CambridgeStarAtlasMap(c, chart_number)
         c.render()
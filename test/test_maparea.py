@@ -1,11 +1,65 @@
+import os
 import unittest
-from skymap.tikz import Tikz
-from skymap.geometry import Point
+import tempfile
+import numpy
+from skymap.tikz import Tikz, TikzPicture, SvgDocument, SvgPicture
+from skymap.geometry import Point, SkyCoordDeg
 from skymap.map import MapArea
+from skymap.atlas.cambridge_star_atlas import (
+    CambridgeStarAtlasPage,
+    CambridgeStarAtlasLegend,
+    chart_configs,
+)
+from skymap.map.coordinate_grid import (
+    Equator,
+    GALACTIC_FRAME,
+    ECLIPTIC_FRAME,
+)
 
 
 class MapAreaTest(unittest.TestCase):
     def test_picture(self):
-        t = Tikz("maparea_test1")
-        m = MapArea(t, Point(20, 20), Point(190, 277))
-        t.render()
+        with tempfile.TemporaryDirectory() as cache:
+            t = Tikz(
+                "maparea_test1",
+                aux_cache_folder=os.path.join(cache, "aux"),
+                format_cache_folder=os.path.join(cache, "formats"),
+            )
+            m = MapArea(t, Point(20, 20), Point(190, 277))
+            t.render()
+
+
+class BackendTest(unittest.TestCase):
+    def test_svg(self):
+        chart_number, config = next(iter(chart_configs()))
+        with tempfile.TemporaryDirectory() as folder:
+            page = CambridgeStarAtlasPage("maparea_test2", folder)
+            document = SvgDocument(
+                "maparea_test2",
+                page.papersize,
+                page.margins,
+                page.normalsize,
+                output_folder=folder,
+            )
+
+            # The same chart is drawn with the backend of the page
+            self.assertIsInstance(MapArea(page, config), TikzPicture)
+            legend = CambridgeStarAtlasLegend(document, chart_number)
+            area = MapArea(document, config)
+            self.assertIsInstance(legend, SvgPicture)
+            self.assertIsInstance(area, SvgPicture)
+            self.assertIsInstance(area, MapArea)
+
+            with open(document.render()) as fp:
+                svg = fp.read()
+            self.assertIn("<polyline", svg)
+            self.assertIn("<text", svg)
+
+
+class EquatorTest(unittest.TestCase):
+    def test_latitudes(self):
+        for frame in (GALACTIC_FRAME, ECLIPTIC_FRAME):
+            longitudes = numpy.arange(0, 360, 15)
+            c = SkyCoordDeg(longitudes, 0, frame=frame).icrs
+            latitudes = Equator(frame).latitudes(c.ra.degree)
+            numpy.testing.assert_allclose(latitudes, c.dec.degree, atol=1e-9)
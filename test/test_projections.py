@@ -211,6 +211,16 @@ class TestEquidistantConicProjection(unittest.TestCase):
             self.p.backproject(self.p.project(SkyCoordDeg(29, 32))), SkyCoordDeg(29, 32)
         )
 
+    def test_project_coordinates(self):
+        longitudes = [0, 15, -15, 29, 200]
+        latitudes = [45, 50, 35, 32, -10]
+        for projection in (self.p, self.p1, self.p2):
+            points = projection.project_coordinates(longitudes, latitudes)
+            for (x, y), longitude, latitude in zip(points, longitudes, latitudes):
+                self.assertEqual(
+                    Point(x, y), projection.project(SkyCoordDeg(longitude, latitude))
+                )
+
     # def test_north_south_projections(self):
     #     sp1 = self.p1.backproject(Point(-126, -92))
     #     sp2 = self.p2.backproject(Point(-126, 92))
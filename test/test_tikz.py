@@ -1,11 +1,32 @@
+import os
 import unittest
-from skymap.tikz import Tikz, TikzPicture
-from skymap.geometry import Point, Circle, Arc, Rectangle
+import tempfile
+import subprocess
+from unittest import mock
+import numpy as np
+import xml.etree.ElementTree as ET
+from skymap.tikz import Tikz, TikzPicture, PaperSize, SvgDocument, SvgPicture
+from skymap.tikz.tikz import document_template, TEX_MEMORY_PER_ELEMENT
+from skymap.geometry import Point, Circle, Arc, Rectangle, Line, Label
 
 
 class TikzTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.cache.cleanup()
+
+    def tikz(self, name, **kwargs):
+        """Returns a Tikz document that caches its .aux files and formats in a temporary folder."""
+        kwargs.setdefault("aux_cache_folder", os.path.join(self.cache.name, "aux"))
+        kwargs.setdefault(
+            "format_cache_folder", os.path.join(self.cache.name, "formats")
+        )
+        return Tikz(name, **kwargs)
+
     def test_picture(self):
-        t = Tikz("tizk_test1")
+        t = self.tikz("tizk_test1")
         p = TikzPicture(t, Point(20, 20), Point(190, 277))
 
         p.draw_circle(Circle(Point(85, 128.5), 30))
@@ -14,7 +35,7 @@ class TikzTest(unittest.TestCase):
         t.render()
 
     def test_multiple_pictures(self):
-        t = Tikz("tikz_test2")
+        t = self.tikz("tikz_test2")
         p1 = TikzPicture(t, Point(20, 20), Point(190, 138.5))
         p1.draw_circle(Circle(Point(85, 59.25), 30))
         p1.draw_rectangle(Rectangle(Point(55, 29.25), Point(115, 89.25)))
@@ -32,7 +53,7 @@ class TikzTest(unittest.TestCase):
         t.render()
 
     def test_pythagoras(self):
-        t = Tikz("tikz_test3")
+        t = self.tikz("tikz_test3")
         with TikzPicture(t, Point(20, 20), Point(190, 277)) as p:
             p1 = Point(55, 98.5)
             p2 = Point(115, 98.5)
@@ -49,10 +70,186 @@ class TikzTest(unittest.TestCase):
         t.render()
 
     def test_arc(self):
-        t = Tikz("tikz_test4")
+        t = self.tikz("tikz_test4")
         with TikzPicture(t, Point(20, 20), Point(190, 277)) as p:
             p.draw_arc(Arc(Point(0, 0), 50, 0, 45))
             p.draw_arc(Arc(Point(0, 0), 46, -45, 45))
             p.draw_arc(Arc(Point(0, 0), 42, 270, 45))
             p.draw_arc(Arc(Point(0, 0), 38, 45, 270))
         t.render()
+
+    def test_texfile(self):
+        t = self.tikz("tikz_test5")
+        with TikzPicture(t, Point(20, 20), Point(190, 277)) as p:
+            p.draw_circle(Circle(Point(85, 128.5), 30))
+            p.comment("{{ not a template }}")
+
+        with open(t.write_texfile()) as fp:
+            tex = fp.read()
+        self.assertTrue(tex.startswith("\\documentclass"))
+        self.assertTrue(tex.rstrip().endswith("\\end{document}"))
+        self.assertIn(p.texstring, tex)
+        self.assertIn("% {{ not a template }}", tex)
+
+        # The document template is compiled once and reused
+        self.assertIs(document_template(t.template), document_template(t.template))
+
+    def test_format_name(self):
+        t1 = self.tikz("tikz_test6")
+        t2 = self.tikz("tikz_test7")
+        t3 = self.tikz("tikz_test8", papersize=PaperSize(width=300, height=200))
+        with TikzPicture(t2, Point(20, 20), Point(190, 277)) as p:
+            p.draw_circle(Circle(Point(85, 128.5), 30))
+
+        # The format only depends on the preamble
+        names = [t.format_name(t.write_texfile()) for t in (t1, t2, t3)]
+        self.assertIsNotNone(names[0])
+        self.assertEqual(names[0], names[1])
+        self.assertNotEqual(names[0], names[2])
+
+        # A format can only be loaded by the XeLaTeX version that built it
+        texfile = t1.write_texfile()
+        versions = ("XeTeX 3.141592653-2.6-0.999995", "XeTeX 3.141592653-2.6-0.999996")
+        version_names = []
+        for version in versions:
+            with mock.patch("skymap.tikz.tikz.xelatex_version", return_value=version):
+                version_names.append(t1.format_name(texfile))
+        self.assertNotEqual(version_names[0], version_names[1])
+
+    def test_failed_format(self):
+        t = self.tikz("tikz_test14")
+        texfile = t.write_texfile()
+
+        # A format that fails to build is not tried again
+        error = subprocess.CalledProcessError(1, "xelatex")
+        with mock.patch("skymap.tikz.tikz.xelatex_version", return_value="XeTeX"):
+            with mock.patch("subprocess.check_output", side_effect=error) as run:
+                self.assertIsNone(t.precompiled_format(texfile))
+                self.assertIsNone(t.precompiled_format(texfile))
+        self.assertEqual(run.call_count, 1)
+
+    def test_aux_cache(self):
+        with tempfile.TemporaryDirectory() as folder:
+            t = Tikz(
+                "tikz_test12",
+                output_folder=folder,
+                aux_cache_folder=os.path.join(folder, "aux"),
+                format_cache_folder=None,
+            )
+            with TikzPicture(t, Point(20, 20), Point(190, 277)) as p:
+                p.draw_circle(Circle(Point(85, 128.5), 30))
+
+            def run_xelatex(format_file=None):
+                for extension in ("aux", "log", "pdf"):
+                    path = os.path.join(folder, f"tikz_test12.{extension}")
+                    with open(path, "w") as fp:
+                        fp.write("\\relax\n")
+
+            with mock.patch.object(t, "run_xelatex", side_effect=run_xelatex) as run:
+                # Without an .aux file, the positions change in the first run
+                t.render()
+                self.assertEqual(run.call_count, 2)
+
+                # The cached .aux file does not change, so a single run is enough
+                os.remove(os.path.join(folder, "tikz_test12.aux"))
+                t.render()
+                self.assertEqual(run.call_count, 3)
+
+    def test_compact_output(self):
+        t = self.tikz("tikz_test9", precision=2)
+        with TikzPicture(t, Point(20, 20), Point(190, 277), boxed=False) as p:
+            p.draw_line(Line(Point(0, 0), Point(1.23456, 1)))
+            p.draw_line(Line(Point(1.23456, 1), Point(2, 0)))
+            p.draw_line(Line(Point(5, 5), Point(6, 6)))
+            p.fill_circle(Circle(Point(1, 1), 0.5))
+            p.fill_circle(Circle(Point(2, 1), 0.5))
+            p.dashed_pen()
+            p.draw_line(Line(Point(0, 0), Point(1, 1)))
+
+        lines = [l for l in p.texstring.splitlines() if l.startswith("\\")][1:-1]
+        self.assertEqual(
+            lines,
+            [
+                "\\draw [line width=0.5pt,black] (0.0mm,0.0mm)--(1.23mm,1mm)--(2mm,0.0mm) (5mm,5mm)--(6mm,6mm);",
+                "\\fill [black] (1mm,1mm) circle (0.5mm) (2mm,1mm) circle (0.5mm);",
+                "\\draw [line width=0.5pt,black,dashed] (0.0mm,0.0mm)--(1mm,1mm);",
+            ],
+        )
+
+    def test_bulk_drawing(self):
+        t = self.tikz("tikz_test10")
+        with TikzPicture(t, Point(20, 20), Point(190, 277), boxed=False) as p:
+            p.fill_circles(np.array([[0, 0], [1.5, 2]]), np.array([0.5, 0.25]))
+            p.draw_polylines([np.array([[0, 0], [1, 1], [2, 0]]), np.array([[3, 3]])])
+
+        lines = [l for l in p.texstring.splitlines() if l.startswith("\\")][1:-1]
+        self.assertEqual(
+            lines,
+            [
+                "\\fill [black] (0.0mm,0.0mm) circle (0.5mm) (1.5mm,2.0mm) circle (0.25mm);",
+                "\\draw [line width=0.5pt,black] (0.0mm,0.0mm)--(1.0mm,1.0mm)--(2.0mm,0.0mm);",
+            ],
+        )
+
+    def test_layers(self):
+        t = self.tikz("tikz_test11", max_layer_memory=3 * TEX_MEMORY_PER_ELEMENT)
+        with TikzPicture(t, Point(20, 20), Point(190, 277), boxed=False) as p:
+            p.draw_rectangle(Rectangle(Point(0, 0), Point(5, 5)))
+            with p.clip():
+                p.fill_circles(np.array([[0, 0], [1, 1], [2, 2]]), 0.5)
+                p.draw_line(Line(Point(0, 0), Point(1, 1)))
+            p.draw_line(Line(Point(0, 0), Point(2, 2)))
+            p.draw_circle(Circle(Point(0, 0), 1))
+
+        self.assertEqual(t.estimated_memory(), 7 * TEX_MEMORY_PER_ELEMENT)
+        layers = t.split_layers()
+
+        # The clipping scope is split, and opened again in the next layer
+        self.assertEqual([l.element_count for l in layers], [1, 3, 3])
+        for layer in layers:
+            code = "".join(layer.chunks)
+            self.assertTrue(code.startswith("\\begin{tikzpicture}"))
+            self.assertTrue(code.endswith("\\end{tikzpicture}\n\n"))
+            self.assertEqual(code.count("\\begin{scope}"), code.count("\\end{scope}"))
+        self.assertIn("\\clip", "".join(layers[2].chunks))
+
+    def test_clipped_layers(self):
+        t = self.tikz("tikz_test13", max_layer_memory=300 * TEX_MEMORY_PER_ELEMENT)
+        with TikzPicture(t, Point(20, 20), Point(190, 277), boxed=False) as p:
+            with p.clip(Rectangle(Point(0, 0), Point(50, 50))):
+                p.fill_circles(np.random.RandomState(1).uniform(0, 50, (1000, 2)), 0.1)
+
+        # A chart drawn inside a single clipping scope is still split into layers that fit in memory
+        layers = t.split_layers()
+        self.assertEqual(len(layers), 5)
+        for layer in layers:
+            self.assertLessEqual(layer.element_count, 300)
+            code = "".join(layer.chunks)
+            self.assertEqual(code.count("\\begin{scope}"), 1)
+            self.assertEqual(code.count("\\end{scope}"), 1)
+            self.assertLess(code.index("\\clip"), code.index("\\fill"))
+
+    def test_svg(self):
+        d = SvgDocument("svg_test1")
+        with SvgPicture(d, Point(20, 20), Point(190, 277), boxed=False) as p:
+            p.draw_line(Line(Point(0, 0), Point(10, 10)))
+            p.dashed_pen()
+            p.draw_arc(Arc(Point(0, 0), 20, 0, 90))
+            with p.clip():
+                p.fill_circle(Circle(Point(5, 5), 1))
+            p.draw_label(Label(Point(0, 0), "+30\\textdegree", "small"))
+
+        root = ET.parse(d.render()).getroot()
+        ns = {"svg": "http://www.w3.org/2000/svg"}
+
+        # The y-axis points down in SVG
+        line = root.find(".//svg:line", ns)
+        self.assertEqual(line.get("x1"), "105")
+        self.assertEqual(line.get("y1"), "148.5")
+        self.assertEqual(line.get("y2"), "138.5")
+
+        arc = root.find(".//svg:path", ns)
+        self.assertEqual(arc.get("d"), "M 125,148.5 A 20,20 0 0 0 105,128.5")
+        self.assertIsNotNone(arc.get("stroke-dasharray"))
+        self.assertIsNotNone(root.find(".//svg:g[@clip-path]/svg:circle", ns))
+        self.assertEqual(root.find(".//svg:text", ns).text, "+30\u00b0")